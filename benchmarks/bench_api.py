@@ -0,0 +1,211 @@
+"""
+Benchmarks catalog refresh, installer download and 7-Zip install throughput against a local Legacy Games API stand-in.
+
+    python benchmarks/bench_api.py [--games 2000] [--products 200] [--latency 0.005] [--installer-size 128MB] [--repeat 3] [--check]
+
+Every run is appended to benchmarks/results/bench_api.jsonl (see --results). Each benchmark is compared
+with the median of the last five runs on the same host with the same parameters, and reported as a
+regression when it is more than --threshold slower. With --check the exit status is 1 on a regression.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Run from a checkout: the repository root provides the heirloom package, tests/ the API stand-in.
+sys.path[:0] = [str(Path(__file__).resolve().parent.parent), str(Path(__file__).resolve().parent.parent / 'tests')]
+
+from legacy_api_stub import LegacyApiStub  # noqa: E402
+
+from heirloom.heirloom import Heirloom  # noqa: E402
+from heirloom.progress import format_bytes, parse_size  # noqa: E402
+
+
+DEFAULT_RESULTS = Path(__file__).resolve().parent / 'results' / 'bench_api.jsonl'
+BASELINE_RUNS = 5
+MB = 1024 * 1024
+
+
+def client(stub, workdir, **kwargs):
+    return Heirloom(
+        'bench@example.com',
+        'password',
+        workdir / 'games',
+        api_url=stub.url,
+        temp_dir=workdir / 'downloads',
+        log_dir=workdir / 'logs',
+        min_free_space=0,
+        quiet=True,
+        **kwargs,
+    )
+
+
+def best_of(repeat, func, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bench_refresh(args, workdir):
+    with LegacyApiStub(giveaway_count=args.games, products=args.products, latency=args.latency) as stub:
+        heirloom = client(stub, workdir)
+        seconds = best_of(args.repeat, heirloom.refresh_games_list)
+        games = len(heirloom.games)
+    return seconds, games / seconds, 'games/s'
+
+
+def bench_download(args, workdir):
+    size = parse_size(args.installer_size)
+    with LegacyApiStub(installer_bytes=size, installed_size=args.installer_size, latency=args.latency) as stub:
+        heirloom = client(stub, workdir)
+        heirloom.refresh_games_list()
+        downloads = workdir / 'downloads'
+        seconds = best_of(
+            args.repeat,
+            lambda: heirloom.download_game('Game 1'),
+            setup=lambda: shutil.rmtree(downloads, ignore_errors=True),
+        )
+    return seconds, size / MB / seconds, 'MB/s'
+
+
+def build_archive(seven_zip, workdir, size):
+    """Half random and half repetitive data, so the archive decompresses at a realistic rate."""
+    source = workdir / 'archive-source'
+    source.mkdir()
+    files = 16
+    for index in range(files):
+        half = size // files // 2
+        (source / f'data{index}.pak').write_bytes(os.urandom(half) + bytes(index % 256 for index in range(half)))
+    archive = workdir / 'installer.7z'
+    subprocess.run([seven_zip, 'a', '-y', '-mx1', str(archive), f'{source}/*'], capture_output=True, check=True)
+    shutil.rmtree(source)
+    return archive
+
+
+def bench_install_7z(args, workdir):
+    seven_zip = shutil.which('7z')
+    if not seven_zip:
+        return None
+    size = parse_size(args.installer_size)
+    archive = build_archive(seven_zip, workdir, size)
+    with LegacyApiStub(installer_file=archive, installed_size=args.installer_size, latency=args.latency) as stub:
+        heirloom = client(stub, workdir, **{'7zip_path': seven_zip})
+        heirloom.refresh_games_list()
+
+        def install():
+            result = heirloom.install_game('Game 1', '7zip')
+            if result['status'] != 'success':
+                raise RuntimeError(f'7-Zip install failed: {result["stderr"]}')
+
+        seconds = best_of(args.repeat, install, setup=lambda: shutil.rmtree(workdir / 'games', ignore_errors=True))
+    return seconds, size / MB / seconds, 'MB/s'
+
+
+BENCHMARKS = {
+    'refresh': bench_refresh,
+    'download': bench_download,
+    'install_7z': bench_install_7z,
+}
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=Path(__file__).parent)
+    except OSError:
+        return ''
+    return result.stdout.strip()
+
+
+def load_results(path):
+    if not path.exists():
+        return []
+    with path.open() as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline(history, record):
+    previous = [
+        r['seconds'] for r in history
+        if (r['benchmark'], r['host'], r['params']) == (record['benchmark'], record['host'], record['params'])
+    ][-BASELINE_RUNS:]
+    return statistics.median(previous) if previous else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, default=2000, help='giveaway games in the catalog')
+    parser.add_argument('--products', type=int, default=200, help='purchased products in the catalog')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds the server adds to every answer')
+    parser.add_argument('--installer-size', default='128 MB')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', choices=sorted(BENCHMARKS), action='append')
+    parser.add_argument('--results', type=Path, default=DEFAULT_RESULTS)
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.15, help='slowdown reported as a regression')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 on a regression')
+    args = parser.parse_args()
+
+    params = {
+        'games': args.games,
+        'products': args.products,
+        'latency': args.latency,
+        'installer_size': parse_size(args.installer_size),
+    }
+    history = load_results(args.results)
+    records = []
+    regressions = 0
+    print(f'{args.games} giveaways, {args.products} products, {args.latency * 1000:.0f} ms latency, '
+          f'{format_bytes(params["installer_size"])} installers')
+    for name in args.only or BENCHMARKS:
+        with tempfile.TemporaryDirectory(prefix='heirloom-bench-') as tmpdir:
+            measured = BENCHMARKS[name](args, Path(tmpdir))
+        if measured is None:
+            print(f'{name:12} skipped (7z not found)')
+            continue
+        seconds, throughput, unit = measured
+        record = {
+            'benchmark': name,
+            'seconds': round(seconds, 4),
+            'throughput': round(throughput, 2),
+            'unit': unit,
+            'params': params,
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        line = f'{name:12} {seconds * 1000:9.1f} ms  {throughput:9.1f} {unit}'
+        reference = baseline(history, record)
+        if reference:
+            change = seconds / reference - 1
+            line += f'  {change:+.1%} vs median of previous runs'
+            if change > args.threshold:
+                line += '  REGRESSION'
+                regressions += 1
+        print(line)
+        records.append(record)
+
+    if not args.no_save and records:
+        args.results.parent.mkdir(parents=True, exist_ok=True)
+        with args.results.open('a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
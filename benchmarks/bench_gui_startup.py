@@ -0,0 +1,151 @@
+"""
+Measures how long the GUI takes to show a populated game grid, offscreen, against a local Legacy Games API stand-in.
+
+    python benchmarks/bench_gui_startup.py [--games 300] [--latency 0.02] [--check]
+
+Two starts are timed in a throwaway home directory. The cold start has no games.db, so the grid waits for login,
+the catalog and artwork. The warm start has the games.db and artwork the cold start left behind, so the grid is
+filled from disk before the catalog is fetched again. For each start it reports time to first grid (the first
+frame with games in the grid) and time until the library has been revalidated against the API. Results are
+saved and compared like bench_api.py.
+"""
+import argparse
+import configparser
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Everything Heirloom keeps under the home directory is resolved at import time, so it has to be redirected first.
+HOME = tempfile.TemporaryDirectory(prefix='heirloom-bench-gui-')
+os.environ['HOME'] = HOME.name
+os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+os.environ['QT_QUICK_BACKEND'] = 'software'
+os.environ['PYTHON_KEYRING_BACKEND'] = 'keyring.backends.fail.Keyring'
+
+# Run from a checkout: the repository root provides the heirloom package, tests/ the API stand-in.
+sys.path[:0] = [str(Path(__file__).resolve().parent.parent), str(Path(__file__).resolve().parent.parent / 'tests')]
+
+from bench_api import baseline, git_commit, load_results  # noqa: E402
+from legacy_api_stub import LegacyApiStub  # noqa: E402
+from PySide6.QtCore import QEvent, QObject  # noqa: E402
+from PySide6.QtGui import QGuiApplication  # noqa: E402
+
+from heirloom.gui.app import load_window  # noqa: E402
+from heirloom.gui.backend import CONFIG_DIR, CONFIG_FILE, GuiController  # noqa: E402
+from heirloom.password_functions import encrypt_password, get_encryption_key, set_encryption_key  # noqa: E402
+
+
+DEFAULT_RESULTS = Path(__file__).resolve().parent / 'results' / 'bench_gui_startup.jsonl'
+TIMEOUT = 600
+
+
+def write_config(stub):
+    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    if not get_encryption_key():
+        set_encryption_key()
+    parser = configparser.ConfigParser()
+    parser['HeirloomGM'] = {
+        'user': 'bench@example.com',
+        'password': encrypt_password('password').decode('utf-8'),
+        'base_install_dir': str(Path(HOME.name) / 'Games'),
+        'api_url': stub.url,
+    }
+    with CONFIG_FILE.open('w') as f:
+        parser.write(f)
+
+
+def wait_for(app, condition, what):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            raise RuntimeError(f'Timed out waiting for {what}')
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def start(app):
+    """One GUI start: (seconds to the first frame with games in the grid, seconds until revalidated)."""
+    started = time.perf_counter()
+    controller = GuiController()
+    engine = load_window(app, controller)
+    window = engine.rootObjects()[0]
+    grid = window.findChild(QObject, 'gamesGrid')
+    frames = []
+    window.frameSwapped.connect(lambda: frames.append(time.perf_counter()))
+    controller.bootstrap()
+
+    wait_for(app, lambda: grid.property('count') > 0, 'the first games')
+    shown = len(frames)
+    wait_for(app, lambda: len(frames) > shown, 'a frame with games')
+    first_grid = frames[shown] - started
+    wait_for(app, lambda: not controller.busy, 'the library refresh')
+    revalidated = time.perf_counter() - started
+    if controller.errorMessage:
+        raise RuntimeError(controller.errorMessage)
+
+    controller.shutdown()
+    window.close()
+    engine.deleteLater()
+    # Delete the engine while the controller it binds to is still alive.
+    app.sendPostedEvents(None, QEvent.DeferredDelete)
+    return first_grid, revalidated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, default=300, help='giveaway games in the catalog')
+    parser.add_argument('--products', type=int, default=30, help='purchased products in the catalog')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds the server adds to every answer')
+    parser.add_argument('--results', type=Path, default=DEFAULT_RESULTS)
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.15, help='slowdown reported as a regression')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 on a regression')
+    args = parser.parse_args()
+
+    params = {'games': args.games, 'products': args.products, 'latency': args.latency}
+    history = load_results(args.results)
+    app = QGuiApplication([sys.argv[0]])
+    print(f'{args.games} giveaways, {args.products} products, {args.latency * 1000:.0f} ms latency')
+    records = []
+    regressions = 0
+    with LegacyApiStub(giveaway_count=args.games, products=args.products, latency=args.latency) as stub:
+        write_config(stub)
+        for name in ('cold', 'warm'):
+            first_grid, revalidated = start(app)
+            for benchmark, seconds in ((f'{name}_first_grid', first_grid), (f'{name}_revalidated', revalidated)):
+                record = {
+                    'benchmark': benchmark,
+                    'seconds': round(seconds, 4),
+                    'params': params,
+                    'host': platform.node(),
+                    'python': platform.python_version(),
+                    'commit': git_commit(),
+                    'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                }
+                line = f'{benchmark:18} {seconds * 1000:9.1f} ms'
+                reference = baseline(history, record)
+                if reference:
+                    change = seconds / reference - 1
+                    line += f'  {change:+.1%} vs median of previous runs'
+                    if change > args.threshold:
+                        line += '  REGRESSION'
+                        regressions += 1
+                print(line)
+                records.append(record)
+
+    if not args.no_save:
+        args.results.parent.mkdir(parents=True, exist_ok=True)
+        with args.results.open('a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmarks the binary VDF codec on synthetic shortcuts.vdf files.
+
+    python benchmarks/bench_vdf.py [--shortcuts 2000] [--repeat 5]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Run from a checkout: the repository root provides the heirloom package.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from heirloom.integrations import (  # noqa: E402
+    VdfFloat,
+    VdfUInt64,
+    read_binary_vdf,
+    steam_shortcut_fields,
+    write_binary_vdf_object,
+)
+
+
+def synthetic_shortcuts(count, seed=0):
+    rng = random.Random(seed)
+    config = {'wine_runner': 'native', 'wine_path': '/usr/bin/wine'}
+    shortcuts = {}
+    for index in range(count):
+        name = f'Synthetic Game {index} ' + ''.join(rng.choice('abcdefghij') for _ in range(12))
+        shortcut = steam_shortcut_fields(
+            name,
+            config,
+            f'Z:\\home\\deck\\Games\\LegacyGames\\Game{index}\\Game{index}.exe',
+            start_dir=f'/home/deck/Games/LegacyGames/Game{index}',
+            icon_path=f'/home/deck/.config/heirloom/artwork/{index}.jpg',
+        )
+        shortcut['FlatpakAppID'] = ''
+        shortcut['sortas'] = VdfFloat(rng.random())
+        shortcut['LastPlayTime64'] = VdfUInt64(rng.randrange(2 ** 40))
+        shortcuts[str(index)] = shortcut
+    return {'shortcuts': shortcuts}
+
+
+def best_of(repeat, func, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--shortcuts', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data = synthetic_shortcuts(args.shortcuts)
+    encoded = write_binary_vdf_object(data)
+    size_mb = len(encoded) / (1024 * 1024)
+    read_time = best_of(args.repeat, read_binary_vdf, encoded)
+    write_time = best_of(args.repeat, write_binary_vdf_object, data)
+    print(f'{args.shortcuts} shortcuts, {size_mb:.2f} MB')
+    print(f'read:  {read_time * 1000:8.2f} ms  ({size_mb / read_time:7.1f} MB/s)')
+    print(f'write: {write_time * 1000:8.2f} ms  ({size_mb / write_time:7.1f} MB/s)')
+
+
+if __name__ == '__main__':
+    main()
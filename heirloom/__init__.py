@@ -1 +1,9 @@
-from .heirloom import Heirloom
+def __getattr__(name):
+    # The clients pull in requests and aiohttp; importing a submodule such as heirloom.cli should not.
+    if name == 'Heirloom':
+        from .heirloom import Heirloom
+        return Heirloom
+    if name == 'AsyncHeirloom':
+        from .async_heirloom import AsyncHeirloom
+        return AsyncHeirloom
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,233 @@
+import asyncio
+from pathlib import Path
+
+try:
+    import aiohttp
+except ModuleNotFoundError:
+    aiohttp = None
+
+from .catalog import (
+    API_URL,
+    api_headers,
+    endpoint_urls,
+    find_game,
+    find_game_by_uuid,
+    find_product,
+    giveaway_download_params,
+    giveaway_games,
+    join_catalog,
+    parse_download_url,
+    parse_user_email,
+    parse_user_id,
+    product_games,
+    purchase_download_params,
+    purchased_products,
+    url_filename,
+)
+from .diskspace import DEFAULT_MIN_FREE_SPACE, InsufficientSpace, find_shortfalls
+from .errors import OperationCancelled
+from .progress import DOWNLOAD, ProgressReporter, parse_size
+
+
+DEFAULT_CONNECTION_LIMIT = 100
+DOWNLOAD_CHUNK_BYTES = 1024 * 128
+
+
+class AsyncHeirloom(object):
+    """
+    The asyncio counterpart of Heirloom for the catalog and download side of the API: logging in,
+    refreshing the game list, and fetching download links, installers and artwork. It shares the URL and
+    catalog-join logic with Heirloom (see catalog.py), so both see the same games. Installing stays with
+    Heirloom, which owns Wine and the install directories.
+
+    All requests go through one aiohttp session whose connector caps open connections at
+    connection_limit, so callers can gather hundreds of requests on one event loop without a thread each.
+    Use it as an async context manager, or call close() when done.
+    """
+    def __init__(self, user, password, base_install_dir=None, **kwargs) -> None:
+        if aiohttp is None:
+            raise RuntimeError('AsyncHeirloom needs aiohttp; install it with "pip install aiohttp".')
+        self._headers = api_headers(user, password)
+        self._api_url = kwargs.get('api_url') or API_URL
+        self._urls = endpoint_urls(self._api_url)
+        self._request_timeout = kwargs.get('request_timeout', 30)
+        self._connection_limit = int(kwargs.get('connection_limit') or DEFAULT_CONNECTION_LIMIT)
+        self._tmp_dir = Path(kwargs.get('temp_dir', '~/.heirloom.tmp/')).expanduser()
+        min_free_space = kwargs.get('min_free_space')
+        self._min_free_space = parse_size(min_free_space) if min_free_space not in (None, '') else DEFAULT_MIN_FREE_SPACE
+        self._session = None
+        self._login_lock = None
+        self._catalog_lock = None
+        self._user_id = None
+        self.games = []
+
+
+    async def __aenter__(self):
+        self._ensure_session()
+        return self
+
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+    def _ensure_session(self):
+        if self._session is None or self._session.closed:
+            # Sessions bind to the running loop, so they are only created from coroutines.
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._connection_limit),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self._request_timeout, sock_read=self._request_timeout),
+            )
+        return self._session
+
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+    async def _get_json(self, url, **kwargs):
+        session = self._ensure_session()
+        async with session.get(url, headers=kwargs.pop('headers', self._headers), **kwargs) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+
+    async def login(self):
+        self._user_id = parse_user_id(await self._get_json(self._urls['login']))
+        return self._user_id
+
+
+    async def _ensure_login(self):
+        if self._login_lock is None:
+            self._login_lock = asyncio.Lock()
+        # Concurrent callers share a single login request.
+        async with self._login_lock:
+            if not self._user_id:
+                await self.login()
+        return self._user_id
+
+
+    async def get_user_email(self):
+        user_id = await self._ensure_login()
+        return parse_user_email(await self._get_json(self._urls['profile'], params={'userId': user_id}), user_id)
+
+
+    async def get_product_catalog(self):
+        await self._ensure_login()
+        return await self._get_json(self._urls['product_catalog'])
+
+
+    async def get_purchased_products(self):
+        user_id = await self._ensure_login()
+        product_catalog, downloads = await asyncio.gather(
+            self.get_product_catalog(),
+            self._get_json(self._urls['purchased_games'], params={'userId': user_id}),
+        )
+        return purchased_products(product_catalog, downloads)
+
+
+    async def get_purchased_games(self):
+        return product_games(await self.get_purchased_products())
+
+
+    async def get_giveaway_games(self):
+        email = await self.get_user_email()
+        return giveaway_games(await self._get_json(self._urls['giveaway_catalog'], params={'email': email}))
+
+
+    async def refresh_games_list(self):
+        await self._ensure_login()
+        purchased, giveaway = await asyncio.gather(self.get_purchased_games(), self.get_giveaway_games())
+        self.games = join_catalog(purchased, giveaway)
+        return self.games
+
+
+    async def _ensure_games(self):
+        if self._catalog_lock is None:
+            self._catalog_lock = asyncio.Lock()
+        # Concurrent callers share a single catalog refresh.
+        async with self._catalog_lock:
+            if not self.games:
+                await self.refresh_games_list()
+        return self.games
+
+
+    async def find_game(self, game_name):
+        return find_game(await self._ensure_games(), game_name)
+
+
+    async def get_game_from_uuid(self, uuid):
+        return find_game_by_uuid(await self._ensure_games(), uuid)['game_name']
+
+
+    async def get_download_url(self, game_name):
+        game = await self.find_game(game_name)
+        if game['amazonprime_giveaway']:
+            params = giveaway_download_params(game)
+            response_json = await self._get_json(self._urls['giveaway_download'], params=params)
+        else:
+            params = purchase_download_params(find_product(await self.get_purchased_products(), game), game)
+            response_json = await self._get_json(self._urls['purchase_download'], params=params)
+        return parse_download_url(response_json, params)
+
+
+    async def _download_file(self, url, output_dir, description, progress_callback=None, cancel_event=None):
+        output_path = Path(output_dir).expanduser()
+        output_path.mkdir(parents=True, exist_ok=True)
+        filename = url_filename(url)
+        destination = output_path / filename
+        session = self._ensure_session()
+        async with session.get(url) as response:
+            response.raise_for_status()
+            total_size = response.content_length or 0
+            if total_size:
+                shortfalls = find_shortfalls([(output_path, total_size, False)], min_free=self._min_free_space)
+                if shortfalls:
+                    raise InsufficientSpace(shortfalls)
+            reporter = ProgressReporter(progress_callback, DOWNLOAD, total_size, description)
+            try:
+                with destination.open('wb') as f:
+                    async for data in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                        if cancel_event is not None and cancel_event.is_set():
+                            raise OperationCancelled('Operation cancelled.')
+                        f.write(data)
+                        reporter.advance(len(data))
+            except BaseException:
+                destination.unlink(missing_ok=True)
+                raise
+            reporter.finish()
+        return filename
+
+
+    async def download_game(self, game_name, output_dir=None, progress_callback=None, cancel_event=None):
+        game = await self.find_game(game_name)
+        return await self._download_file(
+            await self.get_download_url(game_name),
+            output_dir or self._tmp_dir,
+            f'Downloading {game["game_name"]} ({game["game_installed_size"]})',
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+        )
+
+
+    async def download_artwork(self, game_name, output_dir=None):
+        game = await self.find_game(game_name)
+        return await self._download_file(
+            game['game_coverart'],
+            output_dir or self._tmp_dir,
+            f'Downloading artwork for {game["game_name"]}',
+        )
+
+
+    async def download_artworks(self, game_names, output_dir=None):
+        """
+        Fetches the cover art of several games at once. Returns a dict of game name to filename, or to the
+        exception that game's download raised, so one broken link does not lose the rest.
+        """
+        results = await asyncio.gather(
+            *(self.download_artwork(name, output_dir) for name in game_names),
+            return_exceptions=True,
+        )
+        return dict(zip(game_names, results))
@@ -0,0 +1,151 @@
+import base64
+import hashlib
+import json
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+
+from .game import Game
+from .progress import parse_size
+
+
+API_URL = 'https://api.legacygames.com'
+
+# Keys that front ends add to game dicts locally; they are not part of the catalog.
+LOCAL_GAME_KEYS = frozenset({'install_dir', 'executable', 'wine_prefix', 'coverart_local', 'is_new'})
+
+ENDPOINTS = {
+    'login': '/users/login',
+    'giveaway_catalog': '/users/getgiveawaycatalogbyemail',
+    'giveaway_download': '/products/giveawaydownload',
+    'product_catalog': '/products/catalog',
+    'purchased_games': '/users/downloads',
+    'purchase_download': '/products/download',
+    'profile': '/users/profile',
+}
+
+
+def endpoint_urls(api_url=API_URL):
+    api_url = api_url.rstrip('/')
+    return {name: api_url + path for name, path in ENDPOINTS.items()}
+
+
+def api_headers(user, password):
+    encoded_password = base64.b64encode(f'{user}:{password}'.encode('utf-8')).decode('utf-8')
+    return {
+        'accept': 'application/json',
+        'accept-encoding': 'gzip,deflate',
+        'authorization': '?token?',
+        'content-type': 'application/json',
+        'usertoken': f'Basic {encoded_password}',
+    }
+
+
+def parse_user_id(response_json):
+    data = response_json.get('data')
+    if data and type(data) == dict and data.get('userId'):
+        return data['userId']
+    raise AssertionError('Did not find userId in login response!')
+
+
+def parse_user_email(response_json, user_id):
+    if response_json.get('data') and response_json['data'].get('email'):
+        return response_json['data']['email']
+    raise AssertionError(f'Could not get user profile for userId {user_id}!')
+
+
+def purchased_products(product_catalog, downloads_json):
+    data = downloads_json.get('data')
+    if not data:
+        return []
+    product_ids = {d['product_id'] for d in data}
+    return [p for p in product_catalog if 'product_id' in p and p['product_id'] in product_ids]
+
+
+def product_games(products):
+    games = []
+    for product in products:
+        games += product['games']
+    return games
+
+
+def giveaway_games(response_json):
+    games = []
+    seen = set()
+    for data in response_json['data']:
+        for each_game in data['games']:
+            if each_game['game_name'] not in seen:
+                seen.add(each_game['game_name'])
+                games.append(each_game)
+    return games
+
+
+def join_catalog(purchased_games, giveaway_games):
+    """
+    Merges purchased and giveaway games into one list of Game records; a game that was both bought and
+    given away is listed once, as a purchase.
+    """
+    purchased_names = {p['game_name'] for p in purchased_games}
+    games = [Game(each, amazonprime_giveaway=False) for each in purchased_games]
+    games += [Game(each, amazonprime_giveaway=True) for each in giveaway_games if each['game_name'] not in purchased_names]
+    for each in games:
+        each['installed_size'] = parse_size(each.get('game_installed_size'))
+    return games
+
+
+def find_game(games, game_name):
+    try:
+        return next((g for g in games if g['game_name'].lower() == game_name.lower()))
+    except StopIteration:
+        raise AssertionError(f'Unable to find game with name "{game_name}"')
+
+
+def find_game_by_uuid(games, uuid):
+    try:
+        return next((g for g in games if g.get('installer_uuid').lower() == uuid.lower()))
+    except StopIteration:
+        raise AssertionError(f'Unable to find game with UUID "{uuid}"')
+
+
+def find_product(products, game):
+    try:
+        return next((p for p in products if 'games' in p and game['game_name'] in [n['game_name'] for n in p['games']]))
+    except StopIteration:
+        raise AssertionError(f'Unable to find game with name "{game["game_name"]}"')
+
+
+def giveaway_download_params(game):
+    return {'installerUuid': game['installer_uuid']}
+
+
+def purchase_download_params(product, game):
+    return {'productId': product['product_id'], 'gameId': game['game_id']}
+
+
+def parse_download_url(response_json, params):
+    if not response_json.get('data') or type(response_json.get('data')) != dict:
+        raise AssertionError(f'Got invalid data back from download request!\n{response_json.get("data")}\nParams:\n{params}')
+    return response_json['data']['file']
+
+
+def url_filename(url):
+    filename = unquote(Path(urlparse(url).path).name)
+    if not filename:
+        raise AssertionError(f'Unable to determine filename from URL: {url}')
+    return filename
+
+
+def catalog_payload(game):
+    """A game's catalog entry as canonical JSON, without the keys front ends add locally."""
+    return json.dumps({key: value for key, value in game.items() if key not in LOCAL_GAME_KEYS}, sort_keys=True, separators=(',', ':'))
+
+
+def fingerprint_payload(payload):
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def catalog_fingerprint(fingerprints):
+    """Fingerprint of a whole catalog from its {uuid: game fingerprint} dict; independent of game order."""
+    digest = hashlib.blake2b(digest_size=16)
+    for uuid in sorted(fingerprints):
+        digest.update(f'{uuid}:{fingerprints[uuid]}\n'.encode('utf-8'))
+    return digest.hexdigest()
@@ -1,20 +1,30 @@
 import atexit
+import cProfile
 import os
+import shlex
 import shutil
-import subprocess
 from enum import Enum
 from pathlib import Path
+from typing import List
 
 import rich
 import typer
-from InquirerPy import inquirer
 from typing_extensions import Annotated
 
 from ..config import *
 from ..database_functions import *
-from ..heirloom import Heirloom
-from ..integrations import add_installed_game_integrations
+from ..dedupe import dedupe_after_install, dedupe_files
+from ..diskspace import InsufficientSpace
+from ..history import estimate_seconds, summarize_operations
+from ..integrations import (
+    add_installed_games_integrations,
+    remove_installed_game_integrations,
+    sync_installed_game_integrations,
+)
 from ..password_functions import *
+from .. import profiling
+from ..progress import format_bytes, format_duration, parse_size
+from .completion import game_completer
 
 
 console = rich.console.Console()
@@ -24,6 +34,15 @@ config_dir = os.path.expanduser('~/.config/heirloom/')
 config_file = Path(config_dir).expanduser() / 'config.ini'
 config = None
 heirloom = None
+games_db_path = Path(config_dir) / 'games.db'
+complete_game = game_completer(games_db_path)
+complete_uuid = game_completer(games_db_path, 'uuid')
+complete_installed_game = game_completer(games_db_path, installed=True)
+complete_installed_uuid = game_completer(games_db_path, 'uuid', installed=True)
+complete_not_installed_game = game_completer(games_db_path, installed=False)
+complete_not_installed_uuid = game_completer(games_db_path, 'uuid', installed=False)
+# Operations that finished before games.db was opened, written out once it is.
+pending_operations = []
 
 
 class InstallationMethod(str, Enum):
@@ -31,6 +50,12 @@ class InstallationMethod(str, Enum):
     sevenzip = '7zip'
 
 
+class DedupeMode(str, Enum):
+    auto = 'auto'
+    reflink = 'reflink'
+    hardlink = 'hardlink'
+
+
 def reset_runtime_context():
     global config, heirloom
     if config and config.get('db'):
@@ -58,10 +83,24 @@ def configure_app(
             help='Delete the saved configuration and prompt for Legacy Games credentials and install settings.',
         ),
     ] = False,
+    profile: Annotated[
+        bool,
+        typer.Option('--profile', help='Print a breakdown of where the time went when the command finishes.'),
+    ] = False,
+    profile_trace: Annotated[
+        Path,
+        typer.Option('--profile-trace', help='Write the timings as a Chrome trace (JSON) for Perfetto or speedscope. Implies --profile.'),
+    ] = None,
+    profile_cprofile: Annotated[
+        Path,
+        typer.Option('--profile-cprofile', help='Run cProfile and write its stats to this file for snakeviz or flameprof. Implies --profile.'),
+    ] = None,
 ):
     """
     Manage Legacy Games from Linux.
     """
+    if profile or profile_trace or profile_cprofile:
+        start_profiling(ctx, profile_trace, profile_cprofile)
     if not reconfigure:
         return
 
@@ -72,6 +111,35 @@ def configure_app(
         raise typer.Exit()
 
 
+def start_profiling(ctx, trace_path=None, cprofile_path=None):
+    """
+    Times the command as a tree of spans (see heirloom.profiling) and prints it, on stderr, once the command
+    has finished or failed.
+    """
+    profiling.reset()
+    profiling.enable()
+    profiler = cProfile.Profile() if cprofile_path else None
+    command = profiling.span(' '.join(filter(None, ['heirloom-gm', ctx.invoked_subcommand])))
+    command.__enter__()
+    if profiler:
+        profiler.enable()
+
+    def finish():
+        if profiler:
+            profiler.disable()
+        command.__exit__(None, None, None)
+        profiling.disable()
+        err_console = rich.console.Console(stderr=True)
+        err_console.print(profiling.format_report(), markup=False, highlight=False)
+        if trace_path:
+            err_console.print(f'Trace written to {profiling.write_trace(trace_path)}', markup=False, highlight=False)
+        if profiler:
+            profiler.dump_stats(Path(cprofile_path).expanduser())
+            err_console.print(f'cProfile stats written to {Path(cprofile_path).expanduser()}', markup=False, highlight=False)
+
+    ctx.call_on_close(finish)
+
+
 def get_context(refresh=True):
     global config, heirloom
     if config and heirloom:
@@ -80,9 +148,12 @@ def get_context(refresh=True):
     if not get_encryption_key():
         set_encryption_key()
 
+    from ..heirloom import Heirloom
     configparser = get_config(config_dir)
     config = dict(configparser['HeirloomGM'])
     heirloom = Heirloom(**config)
+    heirloom.operation_recorder = record_cli_operation
+    heirloom.purge_trash()
 
     try:
         with console.status('Logging in to Legacy Games...'):
@@ -95,21 +166,38 @@ def get_context(refresh=True):
     if refresh:
         refresh_library()
     else:
-        config['db'] = init_games_db(config_dir, [])
+        config['db'] = open_games_db(config_dir)
     return config, heirloom
 
 
+def record_cli_operation(operation):
+    pending_operations.append(operation)
+    if config and config.get('db'):
+        flush_operations()
+
+
+def flush_operations():
+    while pending_operations:
+        record_operation(config['db'], **pending_operations.pop(0))
+
+
 def refresh_library():
     get_context(refresh=False)
     with console.status('Refreshing games list...'):
         heirloom.refresh_games_list()
-    with console.status('Initializing database...'):
-        existing_db = config.get('db')
-        if existing_db:
-            existing_db.close()
-        config['db'] = init_games_db(config_dir, heirloom.games)
+    with console.status('Updating database...'):
+        if not config.get('db'):
+            config['db'] = open_games_db(config_dir)
+        changes = sync_catalog(config['db'], heirloom.games)
+    flush_operations()
+    if changes['added'] and not changes['initial']:
+        added = set(changes['added'])
+        console.print(':sparkles: New in your library: ' + ', '.join(
+            g['game_name'] for g in heirloom.games if g['installer_uuid'] in added
+        ))
     refresh_game_installation_status(config['db'])
     merge_game_data_with_db()
+    sync_installed_game_integrations(config['db'], config, library_uuids={g['installer_uuid'] for g in heirloom.games})
 
 
 def select_from_games_list(installed_only=False):
@@ -121,6 +209,7 @@ def select_from_games_list(installed_only=False):
         choices = [g['game_name'] for g in games]
     if not choices:
         raise typer.BadParameter('No matching games found.')
+    from InquirerPy import inquirer
     return inquirer.select(message='Select a game: ', choices=choices).execute()
 
 
@@ -145,6 +234,8 @@ def list_games(installed: Annotated[bool, typer.Option('--installed', help='Only
         installed = False
         not_installed = False
 
+    import rich.box
+    import rich.table
     table = rich.table.Table(title='Legacy Games', box=rich.box.ROUNDED, show_lines=True)
     table.add_column('Game Name', justify='left', style='yellow')
     table.add_column('UUID', justify='center', style='green')
@@ -167,8 +258,8 @@ def list_games(installed: Annotated[bool, typer.Option('--installed', help='Only
 
 
 @app.command('download')
-def download(game: Annotated[str, typer.Option(help='Game name to download, will be prompted if not provided')] = None,
-             uuid: Annotated[str, typer.Option(help='UUID of game to download, will be prompted for game name if not provided')] = None):
+def download(game: Annotated[str, typer.Option(help='Game name to download, will be prompted if not provided', autocompletion=complete_game)] = None,
+             uuid: Annotated[str, typer.Option(help='UUID of game to download, will be prompted for game name if not provided', autocompletion=complete_uuid)] = None):
     """
     Downloads a game from the Legacy Games library and saves the installation file to the current folder.
     """
@@ -181,33 +272,30 @@ def download(game: Annotated[str, typer.Option(help='Game name to download, will
     console.print(f'Successfully downloaded [bold blue]{game}[/bold blue] setup executable as [green]{fn}[/green]')
 
 
-@app.command('install')
-def install(game: Annotated[str, typer.Option(help='Game name to install, will be prompted if not provided')] = None,
-            uuid: Annotated[str, typer.Option(help='UUID of game to install, will be prompted for game name if not provided')] = None,
-            install_method: Annotated[InstallationMethod, typer.Option(case_sensitive=False)] = None):
-    """
-    Installs a game from the Legacy Games library.
-    """
-    get_context()
-    if not os.path.isdir(os.path.expanduser(config['base_install_dir'])):
-        os.makedirs(os.path.expanduser(config['base_install_dir']))
-    if not game and not uuid:
-        game = select_from_games_list()
-        uuid = heirloom.get_uuid_from_name(game)
-    if uuid and not game:
-        game = heirloom.get_game_from_uuid(uuid)
-    if game and not uuid:
-        uuid = heirloom.get_uuid_from_name(game)
-
-    if install_method:
-        result = heirloom.install_game(game, installation_method=install_method.value)
-    else:
-        result = heirloom.install_game(game)
+def install_single_game(game, install_method=None):
+    uuid = heirloom.get_uuid_from_name(game)
+    method = install_method.value if install_method else config.get('default_installation_method', 'wine')
+    estimate = estimate_seconds(
+        read_operations(config['db'], kind='install'),
+        'install',
+        parse_size(heirloom.dump_game_data(game).get('game_installed_size')),
+        method,
+    )
+    if estimate:
+        console.print(f'Installing [blue]{game}[/blue], which should take about [yellow]{format_duration(estimate)}[/yellow] going by previous installs.')
+    try:
+        if install_method:
+            result = heirloom.install_game(game, installation_method=install_method.value)
+        else:
+            result = heirloom.install_game(game)
+    except InsufficientSpace as e:
+        console.print(f':exclamation: Not installing [blue]{game}[/blue]: {e}')
+        return None
 
     if result.get('status') != 'success':
         console.print(result)
-        console.print('[bold]Installation was [red italic]unsuccessful[/red italic]!')
-        raise typer.Exit(1)
+        console.print(f'[bold]Installation of [blue]{game}[/blue] was [red italic]unsuccessful[/red italic]!')
+        return None
 
     console.print(f'Installation to [green]{result["install_path"]}[/green] successful!')
     executable = NOT_INSTALLED
@@ -217,21 +305,68 @@ def install(game: Annotated[str, typer.Option(help='Game name to install, will b
         executable = f'{result.get("install_path")}\\{executable_file}'
     elif len(executable_files) > 1:
         console.print(':exclamation: Ambiguous executable detected!')
+        from InquirerPy import inquirer
         answer = inquirer.select('Select the executable used to launch the game: ', choices=executable_files).execute()
         executable_file = answer.split('/')[-1]
         executable = f'{result.get("install_path")}\\{executable_file}'
     else:
         console.print(':warning: No launchable executable was detected.')
 
+    wine_prefix = result.get('wine_prefix', '')
     if executable != NOT_INSTALLED:
-        console.print(f'To start game, run: [yellow]{config["wine_path"]} {executable}[/yellow]')
-    write_game_record(config['db'], name=game, uuid=uuid, install_dir=result['install_path'], executable=executable)
-    add_installed_game_integrations(game, config, executable, install_dir=result.get('unix_install_path', ''))
+        console.print(f'To start game, run: [yellow]{shlex.join(heirloom.launch_command(executable, wine_prefix))}[/yellow]')
+    write_game_record(config['db'], name=game, uuid=uuid, install_dir=result['install_path'], executable=executable, wine_prefix=wine_prefix)
+    with console.status('Looking for files shared with other games...'):
+        stats = dedupe_after_install(config['db'], config, result.get('unix_install_path', ''))
+    if stats and stats.get('unavailable'):
+        console.print(f':warning: Did not look for files shared with other games: {stats["unavailable"]}.')
+    elif stats and stats['linked']:
+        console.print(f'Shared [green]{stats["linked"]}[/green] files with other games, saving [green]{format_bytes(stats["saved_bytes"])}[/green].')
+    return {'game_name': game, 'executable': executable, 'install_dir': result.get('unix_install_path', ''), 'wine_prefix': wine_prefix}
+
+
+@app.command('install')
+def install(game: Annotated[List[str], typer.Option(help='Game name to install, repeat to install several games; will be prompted if not provided', autocompletion=complete_not_installed_game)] = None,
+            uuid: Annotated[List[str], typer.Option(help='UUID of game to install, repeat to install several games; will be prompted for game name if not provided', autocompletion=complete_not_installed_uuid)] = None,
+            install_method: Annotated[InstallationMethod, typer.Option(case_sensitive=False)] = None):
+    """
+    Installs one or more games from the Legacy Games library.
+    """
+    get_context()
+    if not os.path.isdir(os.path.expanduser(config['base_install_dir'])):
+        os.makedirs(os.path.expanduser(config['base_install_dir']))
+    games = list(game or []) + [heirloom.get_game_from_uuid(each_uuid) for each_uuid in uuid or []]
+    if not games:
+        games = [select_from_games_list()]
+
+    games = list(dict.fromkeys(games))
+    installed = []
+    failed = []
+    if len(games) > 1:
+        games, skipped = heirloom.plan_installs(games)
+        for each_game, reason in skipped:
+            console.print(f':warning: [yellow]{each_game}[/yellow] will not fit: {reason}')
+            failed.append(each_game)
+        if games:
+            console.print(f'Installing in this order: {", ".join(games)}')
+    with heirloom.wineserver_session():
+        for each_game in games:
+            entry = install_single_game(each_game, install_method)
+            if entry:
+                installed.append(entry)
+            else:
+                failed.append(each_game)
+    add_installed_games_integrations(installed, config)
+    if len(installed) + len(failed) > 1:
+        console.print(f'Installed [green]{len(installed)}[/green] of {len(installed) + len(failed)} games.')
+    if failed:
+        console.print(f'[bold]Installation was [red italic]unsuccessful[/red italic] for:[/bold] {", ".join(failed)}')
+        raise typer.Exit(1)
 
 
 @app.command('info')
-def info(game: Annotated[str, typer.Option(help='Game name to inspect, will be prompted if not provided')] = None,
-         uuid: Annotated[str, typer.Option(help='UUID of game to inspect, will be prompted for game name if not provided')] = None):
+def info(game: Annotated[str, typer.Option(help='Game name to inspect, will be prompted if not provided', autocompletion=complete_game)] = None,
+         uuid: Annotated[str, typer.Option(help='UUID of game to inspect, will be prompted for game name if not provided', autocompletion=complete_uuid)] = None):
     """
     Prints a JSON blob representing a game from the Legacy Games API.
     """
@@ -244,8 +379,8 @@ def info(game: Annotated[str, typer.Option(help='Game name to inspect, will be p
 
 
 @app.command('uninstall')
-def uninstall(game: Annotated[str, typer.Option(help='Game name to uninstall, will be prompted if not provided')] = None,
-              uuid: Annotated[str, typer.Option(help='UUID of game to uninstall, will be prompted for game name if not provided')] = None,
+def uninstall(game: Annotated[str, typer.Option(help='Game name to uninstall, will be prompted if not provided', autocompletion=complete_installed_game)] = None,
+              uuid: Annotated[str, typer.Option(help='UUID of game to uninstall, will be prompted for game name if not provided', autocompletion=complete_installed_uuid)] = None,
               yes: Annotated[bool, typer.Option('--yes', '-y', help='Do not prompt before removing the install directory')] = False):
     """
     Uninstalls a game by removing its managed installation directory.
@@ -265,19 +400,22 @@ def uninstall(game: Annotated[str, typer.Option(help='Game name to uninstall, wi
         raise typer.Exit(1)
 
     if not yes:
+        from InquirerPy import inquirer
         confirmed = inquirer.confirm(f'Remove {record["install_dir"]}?', default=False).execute()
         if not confirmed:
             console.print('Uninstall cancelled.')
             raise typer.Exit()
 
-    result = heirloom.uninstall_game(game, record['install_dir'])
+    result = heirloom.uninstall_game(game, record['install_dir'], wine_prefix=record['wine_prefix'])
     delete_game_record(config['db'], uuid=uuid)
+    remove_installed_game_integrations(game, config)
+    sync_installed_game_integrations(config['db'], config)
     console.print(f'Uninstallation of [bold blue]{result["game"]}[/bold blue] successful.')
 
 
 @app.command('launch')
-def launch(game: Annotated[str, typer.Option(help='Game name to launch, will be prompted if not provided')] = None,
-           uuid: Annotated[str, typer.Option(help='UUID of game to launch, will be prompted for game name if not provided')] = None):
+def launch(game: Annotated[str, typer.Option(help='Game name to launch, will be prompted if not provided', autocompletion=complete_installed_game)] = None,
+           uuid: Annotated[str, typer.Option(help='UUID of game to launch, will be prompted for game name if not provided', autocompletion=complete_installed_uuid)] = None):
     """
     Launches an installed game.
     """
@@ -294,12 +432,95 @@ def launch(game: Annotated[str, typer.Option(help='Game name to launch, will be
         console.print(f'[yellow]{game}[/yellow] does not have a recorded executable.')
         raise typer.Exit(1)
 
-    cmd = heirloom.launch_command(record['executable'])
     with console.status(f'Launching [yellow]{game}[/yellow]...'):
-        subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        heirloom.launch_game(record['executable'], record['wine_prefix'])
     console.print(f'Launched [bold blue]{game}[/bold blue].')
 
 
+@app.command('dedupe')
+def dedupe(mode: Annotated[DedupeMode, typer.Option(case_sensitive=False, help='reflink and auto share data copy-on-write and stop on filesystems without reflinks; hardlink shares the files themselves and must be asked for')] = None,
+           dry_run: Annotated[bool, typer.Option('--dry-run', help='Only report how much space would be saved')] = False):
+    """
+    Replaces identical files across installed games with reflinks or hardlinks.
+    """
+    get_context(refresh=False)
+    mode = mode.value if mode else 'auto'
+    with console.status(f'Scanning [yellow]{config["base_install_dir"]}[/yellow] for duplicate files...'):
+        try:
+            stats = dedupe_files(config['db'], config['base_install_dir'], mode=mode, dry_run=dry_run)
+        except OSError as e:
+            console.print(f':exclamation: Deduplication stopped: {e}')
+            raise typer.Exit(1)
+    action = 'Would share' if dry_run else f'Shared ({stats["mode"]})'
+    console.print(
+        f'Scanned [blue]{stats["scanned"]}[/blue] files, fully hashed [blue]{stats["hashed"]}[/blue]. '
+        f'{action} [green]{stats["linked"]}[/green] duplicate files, saving [green]{format_bytes(stats["saved_bytes"])}[/green].'
+    )
+
+
+def format_rate(value):
+    return f'{value / (1024 * 1024):.1f} MB/s' if value else '-'
+
+
+def format_seconds(value):
+    if value is None:
+        return '-'
+    return f'{value:.1f} s' if value < 60 else format_duration(value)
+
+
+@app.command('stats')
+def stats(game: Annotated[str, typer.Option(help='Only show the history of this game', autocompletion=complete_game)] = None):
+    """
+    Summarizes recorded download, extraction, install and refresh performance.
+    """
+    import rich.box
+    import rich.table
+    db = open_games_db(config_dir)
+    try:
+        operations = read_operations(db, name=game)
+    finally:
+        db.close()
+    if not operations:
+        console.print('No operations recorded yet.')
+        return
+    summary = summarize_operations(operations)
+
+    table = rich.table.Table(title='Performance', box=rich.box.ROUNDED)
+    table.add_column('Operation', style='yellow')
+    table.add_column('Runs', justify='right')
+    table.add_column('p50', justify='right', style='green')
+    table.add_column('p95', justify='right')
+    download = summary['download']
+    table.add_row('Download rate', str(download['count']), format_rate(download['p50']), format_rate(download['p95']))
+    refresh = summary['refresh']
+    table.add_row('Library refresh', str(refresh['count']), format_seconds(refresh['p50']), format_seconds(refresh['p95']))
+    for kind, label in (('install', 'Install'), ('extract', 'Installer run')):
+        for method, entry in summary[kind].items():
+            table.add_row(
+                f'{label} ({method})',
+                f'{entry["successes"]}/{entry["attempts"]}',
+                format_seconds(entry['p50']),
+                format_seconds(entry['p95']),
+            )
+    console.print(table)
+
+    games = rich.table.Table(title='Games', box=rich.box.ROUNDED)
+    games.add_column('Game Name', style='yellow')
+    games.add_column('Installs', justify='right')
+    games.add_column('Last Install')
+    games.add_column('Install Time (p50)', justify='right')
+    games.add_column('Download Rate (p50)', justify='right')
+    for name, entry in summary['games'].items():
+        games.add_row(
+            name,
+            str(entry['installs']),
+            entry['last_outcome'] or '-',
+            format_seconds(entry['install_p50']),
+            format_rate(entry['download_p50']),
+        )
+    console.print(games)
+
+
 def main():
     app()
 
@@ -0,0 +1,46 @@
+"""
+Shell completion of game names and UUIDs. Candidates are read straight from games.db, opened read-only,
+so completing never logs in, touches the network or imports the API clients.
+"""
+import sqlite3
+from pathlib import Path
+
+from ..database_functions import NOT_INSTALLED
+
+
+def games_from_db(db_path, installed=None):
+    """
+    (name, uuid) pairs from games.db ordered by name; installed=True or False keeps only games recorded as
+    installed or not installed. Empty when there is no database yet or it cannot be read.
+    """
+    db_path = Path(db_path).expanduser()
+    if not db_path.is_file():
+        return []
+    sql = 'SELECT name, uuid FROM games'
+    params = ()
+    if installed is not None:
+        sql += ' WHERE install_dir != ?' if installed else ' WHERE install_dir = ?'
+        params = (NOT_INSTALLED,)
+    try:
+        db = sqlite3.connect(f'{db_path.as_uri()}?mode=ro', uri=True)
+        try:
+            return db.execute(sql + ' ORDER BY name COLLATE NOCASE', params).fetchall()
+        finally:
+            db.close()
+    except sqlite3.Error:
+        return []
+
+
+def game_completer(db_path, field='name', installed=None):
+    """
+    A Typer autocompletion callback offering game names (field='name') or UUIDs (field='uuid') that start
+    with what has been typed. Each candidate carries the other field as its help text.
+    """
+    def complete(incomplete: str):
+        candidates = []
+        for name, uuid in games_from_db(db_path, installed):
+            value, help_text = (name, uuid) if field == 'name' else (uuid, name)
+            if value.startswith(incomplete):
+                candidates.append((value, help_text))
+        return candidates
+    return complete
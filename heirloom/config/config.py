@@ -5,8 +5,10 @@ from rich.console import Console
 from configparser import ConfigParser
 
 from ..password_functions import *
+from ..profiling import timed
 
 
+@timed()
 def get_config(config_dir):
     console = Console()
     config_path = Path(config_dir).expanduser()
@@ -1,18 +1,50 @@
+import json
 import os
 import sqlite3
+import threading
 from pathlib import Path
 from rich.console import Console
 
+from ..catalog import catalog_fingerprint, catalog_payload, fingerprint_payload
+from ..game import Game
 from ..path_functions import *
+from ..profiling import timed
+from ..progress import parse_size
 
 
 NOT_INSTALLED = 'Not Installed'
+GAME_RECORD_FIELDS = ('name', 'uuid', 'install_dir', 'executable', 'wine_prefix', 'installed_size')
+GAME_RECORD_COLUMNS = ', '.join(GAME_RECORD_FIELDS)
+# Columns added after the original schema, applied to existing databases by init_games_db.
+GAME_COLUMN_MIGRATIONS = (
+    ('wine_prefix', "TEXT NOT NULL DEFAULT ''"),
+    ('installed_size', 'INTEGER NOT NULL DEFAULT 0'),
+    ('fingerprint', "TEXT NOT NULL DEFAULT ''"),
+    ('catalog', "TEXT NOT NULL DEFAULT ''"),
+)
+FILE_HASH_COLUMN_MIGRATIONS = (
+    ('linked_to', "TEXT NOT NULL DEFAULT ''"),
+)
+CATALOG_FINGERPRINT_KEY = 'catalog_fingerprint'
+OPERATION_FIELDS = ('id', 'kind', 'name', 'uuid', 'method', 'started_at', 'finished_at', 'bytes', 'throughput', 'outcome', 'detail')
 
 
-def init_games_db(config_dir: str, games_list: list):
-    config_path = Path(config_dir).expanduser()
-    config_path.mkdir(parents=True, exist_ok=True)
-    db = sqlite3.connect(config_path / 'games.db')
+def migrate_table_columns(db, table, columns):
+    existing = {row[1] for row in db.execute(f'PRAGMA table_info({table})')}
+    for name, definition in columns:
+        if name not in existing:
+            db.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+
+def _game_record(row):
+    return dict(zip(GAME_RECORD_FIELDS, row)) if row else None
+
+
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def _create_schema(db):
     db.execute('''
     CREATE TABLE IF NOT EXISTS games(
         name TEXT NOT NULL,
@@ -21,62 +53,261 @@ def init_games_db(config_dir: str, games_list: list):
         executable TEXT NOT NULL DEFAULT 'Not Installed'
     )
     ''')
-    sql = '''
-    INSERT INTO games(name, uuid, install_dir, executable)
-    VALUES(?, ?, ?, ?)
-    ON CONFLICT(uuid) DO UPDATE SET name=excluded.name
-    '''
-    db.executemany(
-        sql,
-        [
-            (
-                each_game['game_name'],
-                each_game['installer_uuid'],
-                NOT_INSTALLED,
-                NOT_INSTALLED,
-            )
-            for each_game in games_list
-            if each_game.get('game_name') and each_game.get('installer_uuid')
-        ],
+    migrate_table_columns(db, 'games', GAME_COLUMN_MIGRATIONS)
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS file_hashes(
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        inode INTEGER NOT NULL,
+        partial_hash TEXT,
+        full_hash TEXT
+    )
+    ''')
+    migrate_table_columns(db, 'file_hashes', FILE_HASH_COLUMN_MIGRATIONS)
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS operations(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        name TEXT,
+        uuid TEXT,
+        method TEXT,
+        started_at REAL NOT NULL,
+        finished_at REAL NOT NULL,
+        bytes INTEGER,
+        throughput REAL,
+        outcome TEXT NOT NULL,
+        detail TEXT
     )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS operations_by_kind ON operations(kind, started_at)')
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS metadata(
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    ''')
+    # One row per game, moved to a new, higher seq by every write to that game from any process, so another
+    # process can ask which games changed since the last seq it saw.
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS game_changes(
+        uuid TEXT PRIMARY KEY,
+        seq INTEGER NOT NULL
+    )
+    ''')
+    db.execute('CREATE UNIQUE INDEX IF NOT EXISTS game_changes_by_seq ON game_changes(seq)')
+    # The writing statement's conflict policy would override INSERT OR REPLACE here, so this is an upsert.
+    for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS games_after_{event.lower()} AFTER {event} ON games
+        BEGIN
+            INSERT INTO game_changes(uuid, seq) VALUES({row}.uuid, (SELECT COALESCE(MAX(seq), 0) + 1 FROM game_changes))
+            ON CONFLICT(uuid) DO UPDATE SET seq = excluded.seq;
+        END
+        ''')
     db.commit()
+
+
+@timed()
+def open_games_db(config_dir):
+    """
+    Connects to games.db, creating or migrating the schema the first time this process opens that file.
+    """
+    config_path = Path(config_dir).expanduser()
+    config_path.mkdir(parents=True, exist_ok=True)
+    db_path = config_path / 'games.db'
+    key = str(db_path.resolve())
+    with _schema_lock:
+        fresh = key not in _schema_ready or not db_path.exists()
+        db = sqlite3.connect(db_path)
+        if fresh:
+            _create_schema(db)
+            _schema_ready.add(key)
     return db
 
 
-def write_game_record(db, name=None, uuid=None, install_dir=None, executable=None):
+@timed()
+def init_games_db(config_dir: str, games_list: list):
+    db = open_games_db(config_dir)
+    if games_list:
+        sync_catalog(db, games_list)
+    return db
+
+
+def read_metadata(db, key):
+    row = db.execute("SELECT value FROM metadata WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+@timed()
+def sync_catalog(db, games_list):
+    """
+    Brings the games table in line with a freshly fetched catalog. Each game's catalog entry is stored
+    with a fingerprint, and the whole catalog's fingerprint is kept in the metadata table: when it matches
+    the last sync nothing is read or written. Otherwise only new and changed games are upserted, in one
+    transaction. Returns the uuids that were added and changed, how many were unchanged, and whether this
+    was the first sync (when every game counts as added).
+    """
+    payloads = {}
+    for each_game in games_list:
+        if each_game.get('game_name') and each_game.get('installer_uuid'):
+            payload = catalog_payload(each_game)
+            payloads[each_game['installer_uuid']] = (each_game, payload, fingerprint_payload(payload))
+    fingerprint = catalog_fingerprint({uuid: entry[2] for uuid, entry in payloads.items()})
+    previous = read_metadata(db, CATALOG_FINGERPRINT_KEY)
+    changes = {'added': [], 'changed': [], 'unchanged': 0, 'initial': previous is None}
+    if previous == fingerprint:
+        changes['unchanged'] = len(payloads)
+        return changes
+
+    stored = dict(db.execute("SELECT uuid, fingerprint FROM games"))
+    rows = []
+    for uuid, (each_game, payload, game_fingerprint) in payloads.items():
+        if uuid not in stored:
+            changes['added'].append(uuid)
+        elif stored[uuid] != game_fingerprint:
+            changes['changed'].append(uuid)
+        else:
+            changes['unchanged'] += 1
+            continue
+        rows.append((
+            each_game['game_name'],
+            uuid,
+            NOT_INSTALLED,
+            NOT_INSTALLED,
+            parse_size(each_game.get('game_installed_size')),
+            game_fingerprint,
+            payload,
+        ))
+    sql = '''
+    INSERT INTO games(name, uuid, install_dir, executable, installed_size, fingerprint, catalog)
+    VALUES(?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(uuid) DO UPDATE SET
+        name=excluded.name,
+        installed_size=excluded.installed_size,
+        fingerprint=excluded.fingerprint,
+        catalog=excluded.catalog
+    '''
+    with db:
+        db.executemany(sql, rows)
+        db.execute(
+            "INSERT INTO metadata(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+            (CATALOG_FINGERPRINT_KEY, fingerprint),
+        )
+    return changes
+
+
+def _catalog_game(catalog, install_dir, executable):
+    game = Game(json.loads(catalog))
+    game['install_dir'] = install_dir
+    game['executable'] = executable
+    return game
+
+
+@timed()
+def read_catalog(db):
+    """
+    The library as of the last sync_catalog, in the order games were first seen, with each game's recorded
+    install directory and executable. Lets a front end show the library before the network answers.
+    """
+    rows = db.execute("SELECT catalog, install_dir, executable FROM games WHERE catalog != '' ORDER BY rowid")
+    return [_catalog_game(*row) for row in rows]
+
+
+def read_change_seq(db):
+    """The seq of the latest write to the games table; 0 before the first."""
+    return db.execute("SELECT COALESCE(MAX(seq), 0) FROM game_changes").fetchone()[0]
+
+
+@timed()
+def read_game_changes(db, since):
+    """
+    Games written since the change seq since, as read_catalog returns them, and the seq to pass next time.
+    Games that were removed, or that have no catalog entry yet, are left out.
+    """
+    rows = db.execute('''
+    SELECT game_changes.seq, games.catalog, games.install_dir, games.executable
+    FROM game_changes LEFT JOIN games ON games.uuid = game_changes.uuid
+    WHERE game_changes.seq > ?
+    ORDER BY game_changes.seq
+    ''', (since,)).fetchall()
+    games = [_catalog_game(catalog, install_dir, executable) for _, catalog, install_dir, executable in rows if catalog]
+    return (rows[-1][0] if rows else since), games
+
+
+class GameChanges(object):
+    """
+    Follows writes that other connections, including other processes, make to the games table. poll() first
+    asks SQLite for PRAGMA data_version, which only changes after another connection commits and costs no
+    read of the database file, so it is cheap enough to call every second. Use it from one thread.
+    """
+    def __init__(self, config_dir):
+        self.db = open_games_db(config_dir)
+        self.data_version = self._data_version()
+        self.seq = read_change_seq(self.db)
+
+    def _data_version(self):
+        return self.db.execute('PRAGMA data_version').fetchone()[0]
+
+    def poll(self):
+        """The games written since the last poll; [] when nothing was committed."""
+        data_version = self._data_version()
+        if data_version == self.data_version:
+            return []
+        self.data_version = data_version
+        self.seq, games = read_game_changes(self.db, self.seq)
+        return games
+
+    def close(self):
+        self.db.close()
+
+
+@timed()
+def write_game_record(db, name=None, uuid=None, install_dir=None, executable=None, wine_prefix=None):
     sql = """
-    INSERT INTO games(name, uuid, install_dir, executable)
-    VALUES(?, ?, ?, ?)
+    INSERT INTO games(name, uuid, install_dir, executable, wine_prefix)
+    VALUES(?, ?, ?, ?, ?)
     ON CONFLICT(uuid) DO UPDATE SET
         name=excluded.name,
         install_dir=excluded.install_dir,
-        executable=excluded.executable
+        executable=excluded.executable,
+        wine_prefix=excluded.wine_prefix
     """
-    db.execute(sql, (name, uuid, install_dir or NOT_INSTALLED, executable or NOT_INSTALLED))
+    db.execute(sql, (name, uuid, install_dir or NOT_INSTALLED, executable or NOT_INSTALLED, wine_prefix or ''))
     db.commit()
  
 
+@timed()
 def read_game_record(db, name=None, uuid=None):
     if name:
-        sql = "SELECT name, uuid, install_dir, executable FROM games WHERE name = ?"
+        sql = f"SELECT {GAME_RECORD_COLUMNS} FROM games WHERE name = ?"
         params = (name,)
     elif uuid:
-        sql = "SELECT name, uuid, install_dir, executable FROM games WHERE uuid = ?"
+        sql = f"SELECT {GAME_RECORD_COLUMNS} FROM games WHERE uuid = ?"
         params = (uuid,)
     else:
         Console().print(f':exclamation: Must specify name or UUID for game!')
         return None
     result = db.execute(sql, params)
-    record = result.fetchone()
-    return dict(zip(('name', 'uuid', 'install_dir', 'executable'), record)) if record else None
+    return _game_record(result.fetchone())
    
 
+@timed()
+def read_installed_game_records(db):
+    sql = f"SELECT {GAME_RECORD_COLUMNS} FROM games WHERE install_dir != ? AND executable != ?"
+    return [_game_record(record) for record in db.execute(sql, (NOT_INSTALLED, NOT_INSTALLED)).fetchall()]
+
+
+@timed()
 def delete_game_record(db, name=None, uuid=None):
+    record = read_game_record(db, name=name, uuid=uuid) if name or uuid else None
+    if record and record['install_dir'] != NOT_INSTALLED:
+        delete_file_hashes(db, convert_to_unix_path(record['install_dir']), commit=False)
     if uuid:
-        sql = "UPDATE games SET install_dir = ?, executable = ? WHERE uuid = ?"
+        sql = "UPDATE games SET install_dir = ?, executable = ?, wine_prefix = '' WHERE uuid = ?"
         params = (NOT_INSTALLED, NOT_INSTALLED, uuid)
     elif name:
-        sql = "UPDATE games SET install_dir = ?, executable = ? WHERE name = ?"
+        sql = "UPDATE games SET install_dir = ?, executable = ?, wine_prefix = '' WHERE name = ?"
         params = (NOT_INSTALLED, NOT_INSTALLED, name)
     else:
         Console().print(':exclamation: Must specify name or UUID for game!')
@@ -85,6 +316,83 @@ def delete_game_record(db, name=None, uuid=None):
     db.commit()
 
 
+def _path_range(root):
+    # Every path below root sorts between 'root/' and 'root0' ('0' follows '/').
+    root = str(root).rstrip('/')
+    return root + '/', root + '0'
+
+
+@timed()
+def read_file_hashes(db, root):
+    sql = "SELECT path, size, mtime_ns, inode, partial_hash, full_hash, linked_to FROM file_hashes WHERE path >= ? AND path < ?"
+    return {
+        path: {'size': size, 'mtime_ns': mtime_ns, 'inode': inode, 'partial_hash': partial_hash, 'full_hash': full_hash, 'linked_to': linked_to}
+        for (path, size, mtime_ns, inode, partial_hash, full_hash, linked_to) in db.execute(sql, _path_range(root)).fetchall()
+    }
+
+
+@timed()
+def write_file_hashes(db, rows):
+    sql = """
+    INSERT INTO file_hashes(path, size, mtime_ns, inode, partial_hash, full_hash, linked_to)
+    VALUES(:path, :size, :mtime_ns, :inode, :partial_hash, :full_hash, :linked_to)
+    ON CONFLICT(path) DO UPDATE SET
+        size=excluded.size,
+        mtime_ns=excluded.mtime_ns,
+        inode=excluded.inode,
+        partial_hash=excluded.partial_hash,
+        full_hash=excluded.full_hash,
+        linked_to=excluded.linked_to
+    """
+    db.executemany(sql, rows)
+    db.commit()
+
+
+@timed()
+def delete_file_hashes(db, root, paths=None, commit=True):
+    """
+    Forgets the hash index below root, or only the given paths when paths is not None.
+    """
+    if paths is None:
+        db.execute("DELETE FROM file_hashes WHERE path >= ? AND path < ?", _path_range(root))
+    else:
+        db.executemany("DELETE FROM file_hashes WHERE path = ?", [(path,) for path in paths])
+    if commit:
+        db.commit()
+
+
+@timed()
+def record_operation(db, kind, started_at, finished_at, outcome, name=None, uuid=None, method=None, size=None, detail=None):
+    """
+    Adds one finished refresh, download, extraction, install or uninstall to the operation history.
+    Throughput is stored in bytes per second when the size is known.
+    """
+    duration = finished_at - started_at
+    throughput = size / duration if size and duration > 0 else None
+    db.execute(
+        f"INSERT INTO operations({', '.join(OPERATION_FIELDS[1:])}) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (kind, name, uuid, method, started_at, finished_at, size, throughput, outcome, detail),
+    )
+    db.commit()
+
+
+@timed()
+def read_operations(db, kind=None, name=None, uuid=None):
+    """
+    Returns the operation history, oldest first, optionally only one kind of operation or one game.
+    """
+    clauses = []
+    params = []
+    for column, value in (('kind', kind), ('name', name), ('uuid', uuid)):
+        if value is not None:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = db.execute(f"SELECT {', '.join(OPERATION_FIELDS)} FROM operations{where} ORDER BY started_at, id", params)
+    return [dict(zip(OPERATION_FIELDS, row), duration=row[6] - row[5]) for row in rows]
+
+
+@timed()
 def refresh_game_installation_status(db):
     """
     This function is used to detect manual uninstallations. If the installation directory isn't found,
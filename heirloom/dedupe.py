@@ -0,0 +1,231 @@
+import hashlib
+import os
+import shutil
+from collections import defaultdict
+from pathlib import Path
+
+from .database_functions import delete_file_hashes, read_file_hashes, write_file_hashes
+from .integrations import truthy
+from .prefixes import UNSUPPORTED_REFLINK_ERRORS, reflink_file
+from .profiling import timed
+from .trash import TRASH_DIR_NAME
+
+
+DEDUPE_AUTO = 'auto'
+DEDUPE_REFLINK = 'reflink'
+DEDUPE_HARDLINK = 'hardlink'
+DEDUPE_MODES = (DEDUPE_AUTO, DEDUPE_REFLINK, DEDUPE_HARDLINK)
+
+# Small files are mostly configs and saves that games rewrite; they are not worth sharing.
+DEDUPE_MIN_SIZE = 1024 * 1024
+PARTIAL_HASH_BYTES = 64 * 1024
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class ReflinkUnavailable(OSError):
+    """The filesystem cannot make reflinks, and hardlinks were not asked for."""
+
+
+class FileEntry(object):
+    __slots__ = ('path', 'size', 'mtime_ns', 'inode', 'device', 'partial_hash', 'full_hash', 'linked_to')
+
+    def __init__(self, path, stat):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.inode = stat.st_ino
+        self.device = stat.st_dev
+        self.partial_hash = None
+        self.full_hash = None
+        # The canonical path this file was last replaced with a link to; reflinks keep their own inode, so
+        # this is how a later run knows the file is already shared.
+        self.linked_to = ''
+
+    def row(self):
+        return {
+            'path': self.path,
+            'size': self.size,
+            'mtime_ns': self.mtime_ns,
+            'inode': self.inode,
+            'partial_hash': self.partial_hash,
+            'full_hash': self.full_hash,
+            'linked_to': self.linked_to,
+        }
+
+
+def scan_files(root, min_size=DEDUPE_MIN_SIZE):
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != TRASH_DIR_NAME:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        if stat.st_size >= min_size:
+                            yield FileEntry(entry.path, stat)
+        except OSError:
+            continue
+
+
+def partial_hash(path, size):
+    digest = hashlib.blake2b(str(size).encode('ascii'))
+    with open(path, 'rb') as f:
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+        if size > 2 * PARTIAL_HASH_BYTES:
+            f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+    return digest.hexdigest()
+
+
+def full_hash(path):
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _replace_with_link(canonical, duplicate, mode):
+    staging = os.path.join(os.path.dirname(duplicate), f'.{os.path.basename(duplicate)}.heirloom-dedupe')
+    if os.path.lexists(staging):
+        os.unlink(staging)
+    try:
+        if mode == DEDUPE_HARDLINK:
+            os.link(canonical, staging)
+        else:
+            reflink_file(canonical, staging)
+            shutil.copymode(duplicate, staging)
+        os.replace(staging, duplicate)
+    except BaseException:
+        if os.path.lexists(staging):
+            os.unlink(staging)
+        raise
+
+
+@timed()
+def dedupe_files(db, root, mode=DEDUPE_AUTO, min_size=DEDUPE_MIN_SIZE, only=None, dry_run=False):
+    """
+    Replaces identical files below root with reflinks (copy-on-write, safe if a game later rewrites one)
+    or, only when mode is hardlink, hardlinks. In auto and reflink mode a filesystem without reflinks stops
+    the run with ReflinkUnavailable: hardlinked files share their contents, so a game that patches one in
+    place would change it for every other game. Files are bucketed by size, then compared by a hash of
+    their first and last 64 KB, and only then fully hashed. Hashes are kept in games.db keyed by path,
+    size, mtime and inode, along with the file each duplicate was linked to, so later runs only hash and
+    link what changed. With only set, just the size buckets containing files below that directory are
+    considered, which is what a post-install run needs.
+    """
+    if mode not in DEDUPE_MODES:
+        raise ValueError(f'Invalid dedupe mode ("{mode}"); valid modes are: {list(DEDUPE_MODES)}')
+    root = str(Path(root).expanduser())
+    only = str(Path(only).expanduser()).rstrip('/') + '/' if only else None
+    index = read_file_hashes(db, root)
+    files = list(scan_files(root, min_size))
+    stats = {'scanned': len(files), 'hashed': 0, 'linked': 0, 'saved_bytes': 0}
+
+    for entry in files:
+        cached = index.get(entry.path)
+        if cached and (cached['size'], cached['mtime_ns'], cached['inode']) == (entry.size, entry.mtime_ns, entry.inode):
+            entry.partial_hash = cached['partial_hash']
+            entry.full_hash = cached['full_hash']
+            entry.linked_to = cached['linked_to']
+
+    buckets = defaultdict(list)
+    for entry in files:
+        buckets[(entry.device, entry.size)].append(entry)
+
+    link_mode = DEDUPE_REFLINK if mode == DEDUPE_AUTO else mode
+    try:
+        _link_duplicates(buckets, only, link_mode, dry_run, stats)
+    except OSError as exc:
+        if link_mode != DEDUPE_REFLINK or exc.errno not in UNSUPPORTED_REFLINK_ERRORS:
+            raise
+        unavailable = exc
+    else:
+        unavailable = None
+
+    # Keep the hashes of this run even when it stopped early, so the next one does not repeat them.
+    seen = {entry.path for entry in files}
+    delete_file_hashes(db, root, paths=[path for path in index if path not in seen], commit=False)
+    write_file_hashes(db, [entry.row() for entry in files])
+    if unavailable is not None:
+        raise ReflinkUnavailable(
+            unavailable.errno,
+            'Reflinks unavailable on this filesystem; run "heirloom-gm dedupe --mode hardlink" to share files with hardlinks instead',
+        ) from unavailable
+    stats['mode'] = link_mode
+    return stats
+
+
+def _link_duplicates(buckets, only, link_mode, dry_run, stats):
+    for bucket in buckets.values():
+        if only and not any(entry.path.startswith(only) for entry in bucket):
+            continue
+        by_inode = defaultdict(list)
+        for entry in bucket:
+            by_inode[entry.inode].append(entry)
+        if len(by_inode) < 2:
+            continue
+
+        # Hash one path per inode; paths that already share an inode share its hashes.
+        inodes = list(by_inode.values())
+        by_partial = defaultdict(list)
+        for paths in inodes:
+            first = paths[0]
+            if first.partial_hash is None:
+                first.partial_hash = partial_hash(first.path, first.size)
+            by_partial[first.partial_hash].append(paths)
+        by_full = defaultdict(list)
+        for group in by_partial.values():
+            if len(group) < 2:
+                continue
+            for paths in group:
+                first = paths[0]
+                if first.full_hash is None:
+                    first.full_hash = full_hash(first.path)
+                    stats['hashed'] += 1
+                by_full[first.full_hash].append(paths)
+        for paths_list in inodes:
+            for entry in paths_list[1:]:
+                entry.partial_hash = paths_list[0].partial_hash
+                entry.full_hash = paths_list[0].full_hash
+
+        for group in by_full.values():
+            if len(group) < 2:
+                continue
+            group.sort(key=lambda paths: (-len(paths), paths[0].path))
+            canonical = group[0][0]
+            for paths in group[1:]:
+                if all(entry.linked_to == canonical.path for entry in paths):
+                    continue
+                if dry_run:
+                    stats['linked'] += len(paths)
+                    stats['saved_bytes'] += canonical.size
+                    continue
+                for entry in paths:
+                    _replace_with_link(canonical.path, entry.path, link_mode)
+                    stat = os.stat(entry.path, follow_symlinks=False)
+                    entry.inode = stat.st_ino
+                    entry.mtime_ns = stat.st_mtime_ns
+                    entry.linked_to = canonical.path
+                    stats['linked'] += 1
+                stats['saved_bytes'] += canonical.size
+
+
+def dedupe_after_install(db, config, install_dir):
+    """
+    The optional post-install hook (auto_dedupe): deduplicates the new game against the rest of the library,
+    with reflinks only; hardlinks are never made without being asked for on the command line. It is best
+    effort: when the filesystem has no reflinks the install is left as it is and the returned stats say why
+    under 'unavailable'.
+    """
+    if not truthy(config.get('auto_dedupe')) or not install_dir:
+        return None
+    try:
+        return dedupe_files(db, config.get('base_install_dir') or install_dir, mode=DEDUPE_AUTO, only=install_dir)
+    except ReflinkUnavailable as exc:
+        return {'linked': 0, 'saved_bytes': 0, 'unavailable': exc.strerror}
+    except OSError:
+        return None
@@ -0,0 +1,103 @@
+import os
+import shutil
+from collections import defaultdict
+from pathlib import Path
+
+from .progress import format_bytes
+
+
+DEFAULT_MIN_FREE_SPACE = 512 * 1024 * 1024
+
+
+class InsufficientSpace(Exception):
+    def __init__(self, shortfalls):
+        self.shortfalls = shortfalls
+        super().__init__('Not enough free disk space: ' + '; '.join(describe_shortfall(s) for s in shortfalls))
+
+
+def existing_ancestor(path):
+    path = Path(path).expanduser().absolute()
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+def filesystem_of(path):
+    return os.stat(existing_ancestor(path)).st_dev
+
+
+def free_space(path):
+    return shutil.disk_usage(existing_ancestor(path)).free
+
+
+def describe_shortfall(shortfall):
+    return f'{shortfall["path"]} needs {format_bytes(shortfall["required"])} but has {format_bytes(shortfall["free"])} free'
+
+
+def space_requirements(installed_size, tmp_dir, install_dir, download_size=None):
+    """
+    What installing a game costs, as (path, bytes, persistent) items: the installer in tmp_dir is deleted
+    once the install finishes, the installed files are not. Without a known download size the installed
+    size is used, which overestimates for compressed installers.
+    """
+    download_size = installed_size if download_size is None else download_size
+    return [(Path(tmp_dir), download_size, False), (Path(install_dir), installed_size, True)]
+
+
+def _by_filesystem(requirements):
+    totals = defaultdict(int)
+    paths = {}
+    for path, size, _ in requirements:
+        device = filesystem_of(path)
+        totals[device] += size
+        paths.setdefault(device, path)
+    return totals, paths
+
+
+def find_shortfalls(requirements, reserved=None, min_free=DEFAULT_MIN_FREE_SPACE):
+    """
+    Checks requirements against the free space of each filesystem involved, after min_free and any space
+    already reserved (by device) for installs that are still running.
+    """
+    totals, paths = _by_filesystem(requirements)
+    shortfalls = []
+    for device, size in totals.items():
+        required = size + (reserved or {}).get(device, 0) + min_free
+        free = free_space(paths[device])
+        if required > free:
+            shortfalls.append({'path': paths[device], 'required': required, 'free': free})
+    return shortfalls
+
+
+def plan_installs(candidates, tmp_dir, install_dir, min_free=DEFAULT_MIN_FREE_SPACE):
+    """
+    Orders a batch of (name, installed_size) candidates smallest first, so as many games as possible fit,
+    and simulates installing them in turn: each install needs its download and its files at once, and
+    leaves only its files behind. Returns (planned, skipped) where skipped holds (name, reason) pairs.
+    Games of unknown size are planned last; the download is checked again once its real size is known.
+    """
+    free = {}
+    committed = defaultdict(int)
+    planned = []
+    skipped = []
+    known = sorted((c for c in candidates if c[1]), key=lambda c: c[1])
+    unknown = [c for c in candidates if not c[1]]
+    for name, size in known:
+        requirements = space_requirements(size, tmp_dir, install_dir)
+        totals, paths = _by_filesystem(requirements)
+        for device, path in paths.items():
+            free.setdefault(device, free_space(path))
+        shortfalls = [
+            {'path': paths[device], 'required': committed[device] + total + min_free, 'free': free[device]}
+            for device, total in totals.items()
+            if committed[device] + total + min_free > free[device]
+        ]
+        if shortfalls:
+            skipped.append((name, '; '.join(describe_shortfall(s) for s in shortfalls)))
+            continue
+        planned.append(name)
+        for path, size, persistent in requirements:
+            if persistent:
+                committed[filesystem_of(path)] += size
+    planned.extend(name for name, _ in unknown)
+    return planned, skipped
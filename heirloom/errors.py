@@ -0,0 +1,2 @@
+class OperationCancelled(Exception):
+    """Raised when a download, install or uninstall stops because its cancel event was set."""
@@ -0,0 +1,124 @@
+import functools
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from .profiling import timed
+
+
+_VERSION = re.compile(r'7-Zip[^\d]*(\d+)\.(\d+)')
+
+
+class SevenZipCapabilities(object):
+    __slots__ = ('version', 'multithreading', 'progress')
+
+    def __init__(self, version, multithreading, progress):
+        self.version = version
+        self.multithreading = multithreading
+        self.progress = progress
+
+    def __repr__(self):
+        return f'SevenZipCapabilities(version={self.version}, multithreading={self.multithreading}, progress={self.progress})'
+
+
+def _run_7zip(path, *args):
+    try:
+        return subprocess.run([path, *args], stdin=subprocess.DEVNULL, capture_output=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+@timed()
+def probe_7zip(path):
+    """
+    Works out once per binary which switches it accepts, by packing a tiny archive and testing it with
+    -mmt (multithreaded decoding) and -bsp1 (progress on stdout). p7zip and the 7-Zip 9.x builds still
+    shipped by some distributions reject one or both.
+    """
+    banner = _run_7zip(path)
+    match = _VERSION.search(banner.stdout.decode('utf-8', errors='replace')) if banner else None
+    version = (int(match.group(1)), int(match.group(2))) if match else None
+    with tempfile.TemporaryDirectory(prefix='heirloom-7z-') as tmpdir:
+        sample = Path(tmpdir) / 'probe.txt'
+        sample.write_text('heirloom')
+        archive = Path(tmpdir) / 'probe.7z'
+        created = _run_7zip(path, 'a', '-y', str(archive), str(sample))
+        if not created or created.returncode != 0:
+            return SevenZipCapabilities(version, False, False)
+
+        def accepts(switch):
+            result = _run_7zip(path, 't', '-y', switch, str(archive))
+            return bool(result) and result.returncode == 0
+
+        return SevenZipCapabilities(version, accepts('-mmt2'), accepts('-bsp1'))
+
+
+def seven_zip_extract_command(path, archive, output_dir, threads=None, capabilities=None):
+    capabilities = capabilities or probe_7zip(path)
+    cmd = [path, 'x', f'-o{output_dir}', '-y']
+    if capabilities.progress:
+        cmd.append('-bsp1')
+    if threads and capabilities.multithreading:
+        cmd.append(f'-mmt{threads}')
+    cmd.append(str(archive))
+    return cmd
+
+
+def extraction_thread_budget(value=None):
+    try:
+        threads = int(value or 0)
+    except (TypeError, ValueError):
+        threads = 0
+    return threads if threads > 0 else (os.cpu_count() or 1)
+
+
+class ExtractionScheduler(object):
+    """
+    Shares a fixed budget of CPU threads (extraction_threads, default os.cpu_count()) between concurrent
+    extractions. An extraction that has the CPU to itself takes the whole budget. Once another extraction is
+    running or waiting, it takes what is free, split with anyone waiting and capped at half the budget so
+    the games share it; when the budget is spent, newcomers wait.
+    """
+    def __init__(self, budget=None, poll_interval=0.2):
+        self.budget = extraction_thread_budget(budget)
+        self._poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._in_use = 0
+        self._waiting = 0
+
+    @property
+    def in_use(self):
+        with self._condition:
+            return self._in_use
+
+    @contextmanager
+    def reserve(self, max_threads=None, should_stop=None):
+        threads = self._acquire(max_threads, should_stop)
+        try:
+            yield threads
+        finally:
+            with self._condition:
+                self._in_use -= threads
+                self._condition.notify_all()
+
+    def _acquire(self, max_threads, should_stop):
+        with self._condition:
+            self._waiting += 1
+            try:
+                while self._in_use >= self.budget:
+                    if should_stop:
+                        should_stop()
+                    self._condition.wait(self._poll_interval)
+            finally:
+                self._waiting -= 1
+            free = self.budget - self._in_use
+            if self._waiting or self._in_use:
+                free = min(free // (self._waiting + 1), self.budget // 2 or 1)
+            threads = max(1, min(free, max_threads or self.budget))
+            self._in_use += threads
+            return threads
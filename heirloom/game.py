@@ -0,0 +1,87 @@
+import sys
+from collections.abc import MutableMapping
+
+
+# Strings up to this length are interned: sizes, flags and ids repeat across a library, descriptions do not.
+INTERN_MAX_LENGTH = 64
+
+
+def _intern(value):
+    if type(value) is str and len(value) <= INTERN_MAX_LENGTH:
+        return sys.intern(value)
+    return value
+
+
+class Game(MutableMapping):
+    """
+    One game in the library. The catalog fields and the local state front ends add are kept in slots rather
+    than a per-game dict; keys the API adds that are not listed here go to a small overflow dict. Behaves as
+    a mapping, so code written against the API's JSON dicts keeps working, and dict(game) gives a plain copy.
+    """
+    FIELDS = (
+        'game_name',
+        'game_id',
+        'installer_uuid',
+        'game_description',
+        'game_installed_size',
+        'game_coverart',
+        'amazonprime_giveaway',
+        'installed_size',
+        'install_dir',
+        'executable',
+        'wine_prefix',
+        'coverart_local',
+        'is_new',
+    )
+    __slots__ = FIELDS + ('_extra',)
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, fields=(), **kwargs):
+        self._extra = None
+        self.update(fields, **kwargs)
+
+    def __getitem__(self, key):
+        if key in Game._FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        value = _intern(value)
+        if key in Game._FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[sys.intern(key)] = value
+
+    def __delitem__(self, key):
+        if key in Game._FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in Game.FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'Game({dict(self)!r})'
+
+    def copy(self):
+        return Game(self)
@@ -6,13 +6,16 @@ from PySide6.QtCore import QCoreApplication, QUrl
 from PySide6.QtGui import QGuiApplication, QIcon
 from PySide6.QtQml import QQmlApplicationEngine
 
-from .backend import CONFIG_FILE, GuiController
+from .backend import CACHE_DIR, CONFIG_FILE, GuiController
+from .images import PROVIDER_ID, CoverImageProvider
+from .watchdog import WATCHDOG_OPTION, StallWatchdog, watchdog_threshold
 
 
 def main():
     os.environ.setdefault('QSG_RHI_BACKEND', 'opengl')
     reconfigure = '--reconfigure' in sys.argv
-    qt_argv = [arg for arg in sys.argv if arg != '--reconfigure']
+    watchdog_ms = watchdog_threshold(sys.argv, os.environ)
+    qt_argv = [arg for arg in sys.argv if arg != '--reconfigure' and arg.split('=', 1)[0] != WATCHDOG_OPTION]
 
     QCoreApplication.setApplicationName('Heirloom Games Manager')
     QCoreApplication.setOrganizationName('HeirloomGM')
@@ -21,26 +24,37 @@ def main():
         CONFIG_FILE.unlink()
 
     app = QGuiApplication(qt_argv)
+    if watchdog_ms:
+        watchdog = StallWatchdog(watchdog_ms, parent=app)
+        watchdog.start()
+        app.aboutToQuit.connect(watchdog.stop)
     controller = GuiController()
+    engine = load_window(app, controller)
+    if not engine.rootObjects():
+        return 1
+
+    app.aboutToQuit.connect(controller.shutdown)
+    controller.bootstrap()
+    return app.exec()
+
 
+def load_window(app, controller):
     logo_path = resources.files('heirloom.gui') / 'assets' / 'heirloom.png'
     spinner_path = resources.files('heirloom.gui') / 'assets' / 'heirloom_spinner.png'
     if logo_path.is_file():
         app.setWindowIcon(QIcon(str(logo_path)))
 
     engine = QQmlApplicationEngine()
+    engine.addImageProvider(PROVIDER_ID, CoverImageProvider(CACHE_DIR))
     engine.rootContext().setContextProperty('controller', controller)
     engine.rootContext().setContextProperty('gamesModel', controller.filtered_games)
+    engine.rootContext().setContextProperty('jobsModel', controller.jobs.model)
     engine.rootContext().setContextProperty('logoPath', QUrl.fromLocalFile(str(logo_path)).toString())
     engine.rootContext().setContextProperty('spinnerPath', QUrl.fromLocalFile(str(spinner_path)).toString())
 
     qml_path = resources.files('heirloom.gui') / 'qml' / 'Main.qml'
     engine.load(QUrl.fromLocalFile(str(qml_path)))
-    if not engine.rootObjects():
-        return 1
-
-    controller.bootstrap()
-    return app.exec()
+    return engine
 
 
 if __name__ == '__main__':
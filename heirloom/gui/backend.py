@@ -1,12 +1,12 @@
 import os
 import shutil
-import subprocess
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from configparser import ConfigParser
 from pathlib import Path
 from urllib.parse import urlparse
 
-import requests
 from PySide6.QtCore import (
     QAbstractListModel,
     QObject,
@@ -14,6 +14,7 @@ from PySide6.QtCore import (
     Property,
     QSortFilterProxyModel,
     Qt,
+    QTimer,
     Signal,
     Slot,
 )
@@ -21,20 +22,50 @@ from PySide6.QtCore import (
 from ..config import get_config
 from ..database_functions import (
     NOT_INSTALLED,
+    GameChanges,
     delete_game_record,
-    init_games_db,
+    open_games_db,
+    read_catalog,
     read_game_record,
+    record_operation,
     refresh_game_installation_status,
+    sync_catalog,
     write_game_record,
 )
+from ..dedupe import dedupe_after_install
 from ..heirloom import Heirloom
-from ..integrations import add_installed_game_integrations
+from ..integrations import (
+    add_installed_game_integrations,
+    remove_installed_game_integrations,
+    sync_installed_game_integrations,
+)
 from ..password_functions import decrypt_password, encrypt_password, get_encryption_key, set_encryption_key
+from ..progress import DOWNLOAD, EXTRACT, REGISTER, format_progress
+from ..transport import build_session, transport_settings
+from .images import cover_url
+from .jobs import CANCELLED, FAILED, LIBRARY_JOB_KEY, JobManager
 
 
 CONFIG_DIR = Path('~/.config/heirloom/').expanduser()
 CONFIG_FILE = CONFIG_DIR / 'config.ini'
 CACHE_DIR = CONFIG_DIR / 'artwork'
+LIBRARY_CACHE_TTL = 30 * 60
+# How often games.db is checked for installs and uninstalls made by the CLI or another window.
+DATABASE_POLL_MS = 1000
+# (config.ini key, GuiController attribute, SectionProxy getter) for the settings shown in the settings form.
+PUBLIC_SETTINGS = (
+    ('user', '_config_user', 'get'),
+    ('base_install_dir', '_config_base_install_dir', 'get'),
+    ('wine_runner', '_config_wine_runner', 'get'),
+    ('wine_path', '_config_wine_path', 'get'),
+    ('flatpak_path', '_config_flatpak_path', 'get'),
+    ('wine_flatpak_app', '_config_wine_flatpak_app', 'get'),
+    ('7zip_path', '_config_sevenzip_path', 'get'),
+    ('default_installation_method', '_config_default_installation_method', 'get'),
+    ('auto_add_steam', '_config_auto_add_steam', 'getboolean'),
+    ('auto_add_kde', '_config_auto_add_kde', 'getboolean'),
+    ('library_cache_ttl', '_library_cache_ttl', 'getint'),
+)
 
 
 class GamesModel(QAbstractListModel):
@@ -46,10 +77,13 @@ class GamesModel(QAbstractListModel):
     InstallDirRole = Qt.UserRole + 6
     ExecutableRole = Qt.UserRole + 7
     SizeRole = Qt.UserRole + 8
+    ActiveRole = Qt.UserRole + 9
+    NewRole = Qt.UserRole + 10
 
     def __init__(self):
         super().__init__()
         self._games = []
+        self._active = set()
 
     def rowCount(self, parent=QModelIndex()):
         if parent.isValid():
@@ -67,7 +101,8 @@ class GamesModel(QAbstractListModel):
         if role == self.DescriptionRole:
             return game.get('game_description', '')
         if role == self.CoverArtRole:
-            return game.get('coverart_local', '') or game.get('game_coverart', '')
+            local = game.get('coverart_local')
+            return cover_url(local) if local else game.get('game_coverart', '')
         if role == self.InstalledRole:
             return game.get('install_dir') != NOT_INSTALLED
         if role == self.InstallDirRole:
@@ -76,6 +111,10 @@ class GamesModel(QAbstractListModel):
             return game.get('executable', NOT_INSTALLED)
         if role == self.SizeRole:
             return game.get('game_installed_size', '')
+        if role == self.ActiveRole:
+            return game.get('installer_uuid') in self._active
+        if role == self.NewRole:
+            return bool(game.get('is_new'))
         return None
 
     def roleNames(self):
@@ -88,6 +127,8 @@ class GamesModel(QAbstractListModel):
             self.InstallDirRole: b'installDir',
             self.ExecutableRole: b'executable',
             self.SizeRole: b'installedSize',
+            self.ActiveRole: b'active',
+            self.NewRole: b'isNew',
         }
 
     def game_by_uuid(self, uuid):
@@ -98,6 +139,79 @@ class GamesModel(QAbstractListModel):
         self._games = list(games)
         self.endResetModel()
 
+    def merge_games(self, games):
+        """
+        Brings the model in line with games without a reset, so views keep their delegates and scroll position:
+        rows whose game left the library are removed, changed rows are updated in place and new games are
+        appended in the order given.
+        """
+        if not self._games:
+            self.set_games(games)
+            return
+        incoming = {game.get('installer_uuid'): game for game in games}
+        for row in range(len(self._games) - 1, -1, -1):
+            if self._games[row].get('installer_uuid') not in incoming:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._games[row]
+                self.endRemoveRows()
+        known = set()
+        for row, game in enumerate(self._games):
+            uuid = game.get('installer_uuid')
+            known.add(uuid)
+            changed = dict(game) != dict(incoming[uuid])
+            self._games[row] = incoming[uuid]
+            if changed:
+                index = self.index(row, 0)
+                self.dataChanged.emit(index, index)
+        added = [game for game in games if game.get('installer_uuid') not in known]
+        if added:
+            first = len(self._games)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            self._games.extend(added)
+            self.endInsertRows()
+
+    def apply_changes(self, games):
+        """
+        Applies games that were written to games.db elsewhere: rows already in the model are updated in place,
+        keeping the local state the database does not hold (artwork, the new badge), and unknown games are
+        appended. Rows whose values did not change are left alone.
+        """
+        rows = {game.get('installer_uuid'): row for row, game in enumerate(self._games)}
+        added = []
+        for game in games:
+            row = rows.get(game.get('installer_uuid'))
+            if row is None:
+                added.append(game)
+                continue
+            current = self._games[row]
+            if any(current.get(key) != value for key, value in game.items()):
+                current.update(game)
+                index = self.index(row, 0)
+                self.dataChanged.emit(index, index)
+        if added:
+            first = len(self._games)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            self._games.extend(added)
+            self.endInsertRows()
+
+    def update_game(self, uuid, fields):
+        row = next((row for row, game in enumerate(self._games) if game.get('installer_uuid') == uuid), -1)
+        if row < 0:
+            return
+        self._games[row].update(fields)
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index)
+
+    def set_active(self, uuid, active):
+        if active:
+            self._active.add(uuid)
+        else:
+            self._active.discard(uuid)
+        row = next((row for row, game in enumerate(self._games) if game.get('installer_uuid') == uuid), -1)
+        if row >= 0:
+            index = self.index(row, 0)
+            self.dataChanged.emit(index, index, [self.ActiveRole])
+
 
 class GamesFilterModel(QSortFilterProxyModel):
     filterChanged = Signal()
@@ -141,18 +255,22 @@ class GuiController(QObject):
     statusMessageChanged = Signal()
     errorMessageChanged = Signal()
     settingsChanged = Signal()
-    progressChanged = Signal()
     operationFinished = Signal()
     _gamesLoaded = Signal(list)
-    _operationFailed = Signal(str)
+    _savedGamesLoaded = Signal(list)
+    _gameUpdated = Signal(str, dict)
     _operationStatus = Signal(str)
-    _operationProgress = Signal(float, str)
-    _operationDone = Signal()
+    _settingsLoaded = Signal(dict)
+    _configurationSaved = Signal()
+    _backgroundFailed = Signal(str)
+    _databaseChanged = Signal(list)
+    _libraryRefreshRequested = Signal()
 
     def __init__(self):
         super().__init__()
         self.games = GamesModel()
         self.filtered_games = GamesFilterModel(self.games)
+        self.jobs = JobManager()
         self._busy = False
         self._configured = CONFIG_FILE.is_file()
         self._status_message = 'Ready'
@@ -168,16 +286,31 @@ class GuiController(QObject):
         self._config_default_installation_method = '7zip'
         self._config_auto_add_steam = False
         self._config_auto_add_kde = False
-        self._progress = -1.0
-        self._progress_label = ''
+        self._library_cache_ttl = LIBRARY_CACHE_TTL
+        self._library_loaded_at = None
         self._heirloom = None
-
-        self._load_public_settings()
+        self._client_lock = threading.Lock()
+        self._artwork_http = None
+        # Config, keyring and games.db work that slots would otherwise do on the GUI thread, run in order.
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix='heirloom-gui-io')
+        # Watches games.db for writes from other processes; opened and polled on the I/O thread.
+        self._database_changes = None
+        self._database_poll_pending = False
+        self._database_poll = QTimer(self)
+        self._database_poll.setInterval(DATABASE_POLL_MS)
+        self._database_poll.timeout.connect(self._poll_database)
+
+        self._settingsLoaded.connect(self._apply_public_settings)
+        self._configurationSaved.connect(self._configuration_saved)
+        self._backgroundFailed.connect(self._set_error)
+        self._databaseChanged.connect(self.games.apply_changes)
+        self._in_background(self._load_public_settings)
         self._gamesLoaded.connect(self._apply_games)
-        self._operationFailed.connect(self._fail_operation)
+        self._savedGamesLoaded.connect(self._apply_saved_games)
+        self._gameUpdated.connect(self.games.update_game)
+        self._libraryRefreshRequested.connect(self.refreshLibrary)
         self._operationStatus.connect(self._set_status)
-        self._operationProgress.connect(self._set_progress)
-        self._operationDone.connect(self._finish_operation)
+        self.jobs.jobFinished.connect(self._job_finished)
 
     def _get_busy(self):
         return self._busy
@@ -189,6 +322,12 @@ class GuiController(QObject):
 
     busy = Property(bool, _get_busy, notify=busyChanged)
 
+    def _get_revalidating(self):
+        return self._busy and self.games.rowCount() > 0
+
+    # A library refresh while games are already on screen, which need not cover the grid.
+    revalidating = Property(bool, _get_revalidating, notify=busyChanged)
+
     def _get_configured(self):
         return self._configured
 
@@ -269,30 +408,14 @@ class GuiController(QObject):
 
     configAutoAddKde = Property(bool, _get_config_auto_add_kde, notify=settingsChanged)
 
-    def _get_progress(self):
-        return self._progress
-
-    progress = Property(float, _get_progress, notify=progressChanged)
-
-    def _get_progress_label(self):
-        return self._progress_label
-
-    progressLabel = Property(str, _get_progress_label, notify=progressChanged)
-
-    def _set_progress(self, value, label=''):
-        value = max(-1.0, min(1.0, value))
-        if self._progress != value or self._progress_label != label:
-            self._progress = value
-            self._progress_label = label
-            self.progressChanged.emit()
-
     @Slot()
     def bootstrap(self):
         if not CONFIG_FILE.is_file():
             self._set_status('Configuration needed')
             self._set_configured(False)
             return
-        self.refreshLibrary()
+        self._database_poll.start()
+        self._start_refresh(show_saved=True)
 
     @Slot(str)
     def setSearch(self, query):
@@ -307,16 +430,25 @@ class GuiController(QObject):
         if not user.strip():
             self._set_error('Username is required.')
             return
+        self._set_status('Saving configuration...')
+        self._in_background(
+            self._save_configuration, user, password, base_install_dir, wine_runner, wine_path, flatpak_path,
+            wine_flatpak_app, sevenzip_path, install_method, auto_add_steam, auto_add_kde,
+        )
+
+    def _save_configuration(self, user, password, base_install_dir, wine_runner, wine_path, flatpak_path, wine_flatpak_app, sevenzip_path, install_method, auto_add_steam, auto_add_kde):
         existing_password = self._read_saved_password_token()
         if not password and not existing_password:
-            self._set_error('Password is required.')
-            return
+            raise ValueError('Password is required.')
         CONFIG_DIR.mkdir(parents=True, exist_ok=True)
         if not get_encryption_key():
             set_encryption_key()
 
         parser = ConfigParser()
-        parser.add_section('HeirloomGM')
+        # Keep settings that are only edited by hand (prefixes, wineserver, cache TTL).
+        parser.read(CONFIG_FILE)
+        if not parser.has_section('HeirloomGM'):
+            parser.add_section('HeirloomGM')
         parser.set('HeirloomGM', 'user', user.strip())
         if password:
             parser.set('HeirloomGM', 'password', encrypt_password(password).decode('utf-8'))
@@ -334,50 +466,58 @@ class GuiController(QObject):
         with CONFIG_FILE.open('w') as config_file:
             parser.write(config_file)
         CONFIG_FILE.chmod(0o600)
-        self._set_configured(True)
-        self._heirloom = None
+        self._reset_client()
         self._load_public_settings()
+        self._configurationSaved.emit()
+
+    def _configuration_saved(self):
+        self._set_configured(True)
         self._set_error('')
         self._set_status('Configuration saved')
+        self._database_poll.start()
         self.refreshLibrary()
 
     @Slot()
     def refreshLibrary(self):
-        if self._busy:
+        self._start_refresh()
+
+    def _start_refresh(self, show_saved=False):
+        job = self.jobs.submit('refresh', LIBRARY_JOB_KEY, 'Refreshing library', lambda job: self._refresh_library_worker(job, show_saved))
+        if not job:
             return
         self._set_busy(True)
         self._set_error('')
-        self._set_progress(-1.0, '')
         self._set_status('Refreshing Legacy Games library...')
-        self._run(self._refresh_library_worker)
 
     @Slot(str)
     def installGame(self, uuid):
-        if self._busy:
-            return
         game = self.games.game_by_uuid(uuid)
         if not game:
             self._set_error('Game not found.')
             return
-        self._set_busy(True)
+        job = self.jobs.submit('install', uuid, f'Installing {game["game_name"]}', lambda job: self._install_worker(job, uuid))
+        if not job:
+            return
+        self.games.set_active(uuid, True)
         self._set_error('')
-        self._set_progress(-1.0, '')
         self._set_status(f'Installing {game["game_name"]}...')
-        self._run(lambda: self._install_worker(uuid))
 
     @Slot(str)
     def uninstallGame(self, uuid):
-        if self._busy:
-            return
         game = self.games.game_by_uuid(uuid)
         if not game:
             self._set_error('Game not found.')
             return
-        self._set_busy(True)
+        job = self.jobs.submit('uninstall', uuid, f'Uninstalling {game["game_name"]}', lambda job: self._uninstall_worker(job, uuid))
+        if not job:
+            return
+        self.games.set_active(uuid, True)
         self._set_error('')
-        self._set_progress(-1.0, '')
         self._set_status(f'Uninstalling {game["game_name"]}...')
-        self._run(lambda: self._uninstall_worker(uuid))
+
+    @Slot(int)
+    def cancelJob(self, job_id):
+        self.jobs.cancel(job_id)
 
     @Slot(str)
     def launchGame(self, uuid):
@@ -385,21 +525,30 @@ class GuiController(QObject):
         if not game:
             self._set_error('Game not found.')
             return
-        db = init_games_db(str(CONFIG_DIR), [])
+        self._in_background(self._launch_game, uuid, game['game_name'])
+
+    def _launch_game(self, uuid, name):
+        db = open_games_db(str(CONFIG_DIR))
         try:
             record = read_game_record(db, uuid=uuid)
         finally:
             db.close()
         if not record or record['executable'] == NOT_INSTALLED:
-            self._set_error(f'{game["game_name"]} does not have a launch executable recorded.')
-            return
-        heirloom = self._heirloom or Heirloom(**self._config, quiet=True)
-        subprocess.Popen(heirloom.launch_command(record['executable']), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        self._set_status(f'Launched {game["game_name"]}.')
-
-    def _run(self, target):
-        thread = threading.Thread(target=target, daemon=True)
-        thread.start()
+            raise ValueError(f'{name} does not have a launch executable recorded.')
+        self._ensure_client().launch_game(record['executable'], record['wine_prefix'])
+        self._operationStatus.emit(f'Launched {name}.')
+
+    def _in_background(self, func, *args):
+        """
+        Runs func(*args) on the controller's I/O thread, after anything queued before it. Exceptions are shown
+        as the error message.
+        """
+        def run():
+            try:
+                func(*args)
+            except Exception as e:
+                self._backgroundFailed.emit(str(e))
+        self._io.submit(run)
 
     def _read_saved_password_token(self):
         if not CONFIG_FILE.is_file():
@@ -411,25 +560,19 @@ class GuiController(QObject):
         return parser.get('HeirloomGM', 'password', fallback='')
 
     def _load_public_settings(self):
-        if not CONFIG_FILE.is_file():
-            self.settingsChanged.emit()
-            return
+        settings = {}
         parser = ConfigParser()
         parser.read(CONFIG_FILE)
-        if not parser.has_section('HeirloomGM'):
-            self.settingsChanged.emit()
-            return
-        section = parser['HeirloomGM']
-        self._config_user = section.get('user', self._config_user)
-        self._config_base_install_dir = section.get('base_install_dir', self._config_base_install_dir)
-        self._config_wine_runner = section.get('wine_runner', self._config_wine_runner)
-        self._config_wine_path = section.get('wine_path', self._config_wine_path)
-        self._config_flatpak_path = section.get('flatpak_path', self._config_flatpak_path)
-        self._config_wine_flatpak_app = section.get('wine_flatpak_app', self._config_wine_flatpak_app)
-        self._config_sevenzip_path = section.get('7zip_path', self._config_sevenzip_path)
-        self._config_default_installation_method = section.get('default_installation_method', self._config_default_installation_method)
-        self._config_auto_add_steam = section.getboolean('auto_add_steam', fallback=self._config_auto_add_steam)
-        self._config_auto_add_kde = section.getboolean('auto_add_kde', fallback=self._config_auto_add_kde)
+        if parser.has_section('HeirloomGM'):
+            section = parser['HeirloomGM']
+            for key, attribute, getter in PUBLIC_SETTINGS:
+                if key in section:
+                    settings[attribute] = getattr(section, getter)(key)
+        self._settingsLoaded.emit(settings)
+
+    def _apply_public_settings(self, settings):
+        for attribute, value in settings.items():
+            setattr(self, attribute, value)
         self.settingsChanged.emit()
 
     def _load_config(self):
@@ -437,116 +580,245 @@ class GuiController(QObject):
         self._config = dict(config_parser['HeirloomGM'])
 
     def _ensure_client(self):
-        if not self._heirloom:
-            self._load_config()
-            self._heirloom = Heirloom(**self._config, quiet=True)
-        return self._heirloom
+        with self._client_lock:
+            if not self._heirloom:
+                self._load_config()
+                self._heirloom = Heirloom(**self._config, quiet=True)
+                self._heirloom.operation_recorder = self._record_operation
+                self._heirloom.begin_wineserver_session()
+                self._heirloom.purge_trash()
+            return self._heirloom
+
+    def _record_operation(self, operation):
+        # Called from job threads, which each need their own connection.
+        db = open_games_db(str(CONFIG_DIR))
+        try:
+            record_operation(db, **operation)
+        finally:
+            db.close()
 
-    def _refresh_library_worker(self):
+    def _reset_client(self):
+        with self._client_lock:
+            heirloom, self._heirloom = self._heirloom, None
+            artwork_http, self._artwork_http = self._artwork_http, None
+        if heirloom:
+            heirloom.end_wineserver_session()
+        if artwork_http:
+            artwork_http.close()
+
+    def shutdown(self):
+        self._database_poll.stop()
+        self.jobs.shutdown()
+        # Let a configuration save that is under way finish writing; the connection closes on its own thread.
+        self._in_background(self._close_database_changes)
+        self._io.shutdown(wait=True)
+        self._reset_client()
+
+    def _poll_database(self):
+        # A library refresh applies the whole library when it finishes, so its own writes are not picked up twice.
+        if self._database_poll_pending or self.jobs.has_active(LIBRARY_JOB_KEY):
+            return
+        self._database_poll_pending = True
+        self._in_background(self._read_database_changes)
+
+    def _read_database_changes(self):
+        """
+        Passes the games written to games.db since the last poll, by this or any other process, to the model.
+        The first poll only notes where the database is.
+        """
         try:
-            heirloom = self._ensure_client()
-            self._operationStatus.emit('Logging in...')
-            heirloom.login()
-            self._operationStatus.emit('Loading library...')
-            heirloom.refresh_games_list()
-            db = init_games_db(str(CONFIG_DIR), heirloom.games)
-            try:
-                refresh_game_installation_status(db)
-                games = self._merge_database_records(db, heirloom.games)
-            finally:
-                db.close()
-            self._operationStatus.emit('Preparing artwork...')
-            self._cache_artwork(games)
-            self._gamesLoaded.emit(games)
-        except Exception as exc:
-            self._operationFailed.emit(str(exc))
-
-    def _install_worker(self, uuid):
+            if self._database_changes is None:
+                self._database_changes = GameChanges(str(CONFIG_DIR))
+                return
+            games = self._database_changes.poll()
+            if games:
+                self._cache_artwork(games, download=False)
+                self._databaseChanged.emit(games)
+        finally:
+            self._database_poll_pending = False
+
+    def _close_database_changes(self):
+        if self._database_changes is not None:
+            self._database_changes.close()
+            self._database_changes = None
+
+    def _show_saved_library(self):
+        """
+        Fills the model from games.db and the artwork already on disk, before logging in, so the grid shows
+        the library from the last refresh while the catalog is fetched again.
+        """
+        db = open_games_db(str(CONFIG_DIR))
         try:
-            heirloom = self._ensure_client()
-            game = next(game for game in heirloom.games if game.get('installer_uuid') == uuid)
-            result = heirloom.install_game(game['game_name'], progress_callback=self._download_progress_callback(game['game_name']))
-            if result.get('status') != 'success':
-                raise RuntimeError(result.get('stderr') or 'Installation failed.')
-            executable = self._select_executable(result.get('executable_files') or [], result['install_path'])
-            ui_game = self.games.game_by_uuid(uuid) or {}
-            db = init_games_db(str(CONFIG_DIR), heirloom.games)
+            games = read_catalog(db)
+        finally:
+            db.close()
+        if games:
+            self._cache_artwork(games, download=False)
+            self._savedGamesLoaded.emit(games)
+            self._operationStatus.emit('Checking for library changes...')
+
+    def _refresh_library_worker(self, job, show_saved=False):
+        if show_saved:
+            self._show_saved_library()
+            job.check_cancelled()
+        heirloom = self._ensure_client()
+        self._operationStatus.emit('Logging in...')
+        heirloom.login()
+        job.check_cancelled()
+        self._operationStatus.emit('Loading library...')
+        heirloom.refresh_games_list()
+        job.check_cancelled()
+        db = open_games_db(str(CONFIG_DIR))
+        try:
+            changes = sync_catalog(db, heirloom.games)
+            refresh_game_installation_status(db)
+            games = self._merge_database_records(db, heirloom.games)
+            if not changes['initial']:
+                added = set(changes['added'])
+                for game in games:
+                    if game['installer_uuid'] in added:
+                        game['is_new'] = True
+            sync_installed_game_integrations(db, self._config, library_uuids={g['installer_uuid'] for g in heirloom.games})
+        finally:
+            db.close()
+        self._operationStatus.emit('Preparing artwork...')
+        self._cache_artwork(games, job)
+        self._gamesLoaded.emit(games)
+
+    def _client_game(self, heirloom, uuid):
+        """
+        The client's catalog entry for uuid. The saved library can be on screen before the client has fetched
+        its own list (or after an offline refresh), so the list is loaded on demand here.
+        """
+        if not heirloom.games:
             try:
-                write_game_record(
-                    db,
-                    name=result['game'],
-                    uuid=result['uuid'],
-                    install_dir=result['install_path'],
-                    executable=executable,
-                )
-            finally:
-                db.close()
-            self._operationStatus.emit(f'Installed {result["game"]}.')
-            integrations = add_installed_game_integrations(
-                result['game'],
-                self._config,
-                executable,
-                install_dir=result.get('unix_install_path', ''),
-                icon_path=ui_game.get('coverart_local', ''),
+                heirloom.refresh_games_list()
+            except Exception as error:
+                raise RuntimeError(f'The library has not loaded yet; check your connection and refresh. ({error})') from error
+        game = next((game for game in heirloom.games if game.get('installer_uuid') == uuid), None)
+        if game is None:
+            raise RuntimeError('This game is no longer in your library; refresh the library and try again.')
+        return game
+
+    def _install_worker(self, job, uuid):
+        heirloom = self._ensure_client()
+        game = self._client_game(heirloom, uuid)
+        result = heirloom.install_game(
+            game['game_name'],
+            progress_callback=self._install_progress_callback(job),
+            cancel_event=job.cancel_event,
+        )
+        if result.get('status') != 'success':
+            raise RuntimeError(result.get('stderr') or 'Installation failed.')
+        executable = self._select_executable(result.get('executable_files') or [], result['install_path'])
+        ui_game = self.games.game_by_uuid(uuid) or {}
+        db = open_games_db(str(CONFIG_DIR))
+        try:
+            write_game_record(
+                db,
+                name=result['game'],
+                uuid=result['uuid'],
+                install_dir=result['install_path'],
+                executable=executable,
+                wine_prefix=result.get('wine_prefix', ''),
             )
-            if integrations:
-                labels = []
-                if integrations.get('steam'):
-                    labels.append('Steam')
-                if integrations.get('kde'):
-                    labels.append('KDE')
-                if labels:
-                    self._operationStatus.emit(f'Installed {result["game"]} and added it to {", ".join(labels)}.')
-            self._refresh_library_worker()
-        except Exception as exc:
-            self._operationFailed.emit(str(exc))
-
-    def _uninstall_worker(self, uuid):
+            dedupe_after_install(db, self._config, result.get('unix_install_path', ''))
+        finally:
+            db.close()
+        self._operationStatus.emit(f'Installed {result["game"]}.')
+        integrations = add_installed_game_integrations(
+            result['game'],
+            self._config,
+            executable,
+            install_dir=result.get('unix_install_path', ''),
+            icon_path=ui_game.get('coverart_local', ''),
+            wine_prefix=result.get('wine_prefix', ''),
+        )
+        if integrations:
+            labels = []
+            if integrations.get('steam'):
+                labels.append('Steam')
+            if integrations.get('kde'):
+                labels.append('KDE')
+            if labels:
+                self._operationStatus.emit(f'Installed {result["game"]} and added it to {", ".join(labels)}.')
+        self._refresh_game_worker(job, uuid)
+
+    def _uninstall_worker(self, job, uuid):
+        heirloom = self._ensure_client()
+        game = self._client_game(heirloom, uuid)
+        db = open_games_db(str(CONFIG_DIR))
         try:
-            heirloom = self._ensure_client()
-            game = next(game for game in heirloom.games if game.get('installer_uuid') == uuid)
-            db = init_games_db(str(CONFIG_DIR), heirloom.games)
-            try:
-                record = read_game_record(db, uuid=uuid)
-                if not record or record['install_dir'] == NOT_INSTALLED:
-                    raise RuntimeError(f'{game["game_name"]} is not recorded as installed.')
-                heirloom.uninstall_game(game['game_name'], record['install_dir'])
-                delete_game_record(db, uuid=uuid)
-            finally:
-                db.close()
-            self._operationStatus.emit(f'Uninstalled {game["game_name"]}.')
-            self._refresh_library_worker()
-        except Exception as exc:
-            self._operationFailed.emit(str(exc))
-
-    def _download_progress_callback(self, game_name):
-        def callback(downloaded, total):
-            if total:
-                value = downloaded / total
-                label = f'{downloaded / (1024 * 1024):.1f} MB of {total / (1024 * 1024):.1f} MB'
-            else:
-                value = -1.0
-                label = f'{downloaded / (1024 * 1024):.1f} MB downloaded'
-            self._operationStatus.emit(f'Downloading {game_name}...')
-            self._operationProgress.emit(value, label)
+            record = read_game_record(db, uuid=uuid)
+            if not record or record['install_dir'] == NOT_INSTALLED:
+                raise RuntimeError(f'{game["game_name"]} is not recorded as installed.')
+            heirloom.uninstall_game(game['game_name'], record['install_dir'], cancel_event=job.cancel_event, wine_prefix=record['wine_prefix'])
+            delete_game_record(db, uuid=uuid)
+            remove_installed_game_integrations(game['game_name'], self._config)
+            sync_installed_game_integrations(db, self._config)
+        finally:
+            db.close()
+        self._operationStatus.emit(f'Uninstalled {game["game_name"]}.')
+        self._refresh_game_worker(job, uuid)
+
+    def _library_cache_expired(self):
+        loaded_at = self._library_loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at > self._library_cache_ttl
+
+    def _refresh_game_worker(self, job, uuid):
+        """
+        Re-reads a single game's install state from games.db and updates its row in place. Once the cached
+        library is older than library_cache_ttl it also asks the GUI thread for a full refresh, which runs as
+        its own job under LIBRARY_JOB_KEY.
+        """
+        db = open_games_db(str(CONFIG_DIR))
+        try:
+            record = read_game_record(db, uuid=uuid)
+        finally:
+            db.close()
+        self._gameUpdated.emit(uuid, {
+            'install_dir': record.get('install_dir', NOT_INSTALLED) if record else NOT_INSTALLED,
+            'executable': record.get('executable', NOT_INSTALLED) if record else NOT_INSTALLED,
+        })
+        if self._library_cache_expired():
+            self._libraryRefreshRequested.emit()
+
+    def _install_progress_callback(self, job):
+        def callback(event):
+            if event.phase == DOWNLOAD:
+                job.report(event.fraction, format_progress(event))
+            elif event.phase == EXTRACT:
+                job.report(event.fraction, f'Installing... {event.fraction:.0%}' if event.fraction >= 0 else 'Installing...')
+            elif event.phase == REGISTER:
+                job.report(-1.0, 'Registering...')
         return callback
 
     def _merge_database_records(self, db, games):
-        merged = []
+        # The client's Game records are shared with the model rather than copied; only local state is set here.
         for game in games:
             record = read_game_record(db, uuid=game['installer_uuid'])
             if not record:
                 record = read_game_record(db, name=game['game_name'])
-            item = dict(game)
-            item['install_dir'] = record.get('install_dir', NOT_INSTALLED) if record else NOT_INSTALLED
-            item['executable'] = record.get('executable', NOT_INSTALLED) if record else NOT_INSTALLED
-            merged.append(item)
-        return merged
-
-    def _cache_artwork(self, games):
+            game['install_dir'] = record.get('install_dir', NOT_INSTALLED) if record else NOT_INSTALLED
+            game['executable'] = record.get('executable', NOT_INSTALLED) if record else NOT_INSTALLED
+        return games
+
+    def _artwork_session(self):
+        """
+        The session artwork is downloaded with, built once per controller with the client's transport
+        settings, so covers share its connection pool, retries and Retry-After handling across refreshes.
+        """
+        with self._client_lock:
+            if self._artwork_http is None:
+                self._artwork_http, _ = build_session(**transport_settings(self._config))
+            return self._artwork_http
+
+    def _cache_artwork(self, games, job=None, download=True):
         CACHE_DIR.mkdir(parents=True, exist_ok=True)
-        session = requests.Session()
+        session = None
         for game in games:
+            if job:
+                job.check_cancelled()
             source = game.get('game_coverart')
             game_id = game.get('game_id') or game.get('installer_uuid')
             if not source or not game_id:
@@ -554,6 +826,10 @@ class GuiController(QObject):
             suffix = Path(urlparse(source).path).suffix or '.jpg'
             artwork_path = CACHE_DIR / f'{game_id}{suffix}'
             if not artwork_path.exists():
+                if not download:
+                    continue
+                if session is None:
+                    session = self._artwork_session()
                 response = session.get(source, timeout=30)
                 response.raise_for_status()
                 artwork_path.write_bytes(response.content)
@@ -572,19 +848,32 @@ class GuiController(QObject):
         )[0]
         return f'{install_path}\\{Path(preferred).name}'
 
-    def _apply_games(self, games):
+    def _apply_saved_games(self, games):
         self.games.set_games(games)
-        self._finish_operation()
+        self.busyChanged.emit()
+
+    def _apply_games(self, games):
+        self.games.merge_games(games)
+        self._library_loaded_at = time.monotonic()
+
+    def _job_finished(self, kind, key, title, status, message):
+        if key == LIBRARY_JOB_KEY:
+            self._set_busy(self.jobs.has_active(LIBRARY_JOB_KEY))
+        else:
+            self.games.set_active(key, self.jobs.has_active(key))
+        if status == FAILED:
+            self._fail_operation(message)
+        elif status == CANCELLED:
+            self._set_status(f'Cancelled: {title}')
+            self.operationFinished.emit()
+        else:
+            self._finish_operation()
 
     def _finish_operation(self):
-        self._set_busy(False)
-        self._set_progress(-1.0, '')
         self._set_status(self._status_message if self._status_message else 'Ready')
         self.operationFinished.emit()
 
     def _fail_operation(self, message):
-        self._set_busy(False)
-        self._set_progress(-1.0, '')
         self._set_error(message)
         self._set_status('Something went wrong')
         self.operationFinished.emit()
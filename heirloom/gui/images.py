@@ -0,0 +1,190 @@
+import itertools
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import quote, unquote, urlparse
+
+from PySide6.QtCore import Q_ARG, QMetaObject, QRunnable, QSize, Qt, QThreadPool, Slot
+from PySide6.QtGui import QImage, QImageReader
+from PySide6.QtQuick import QQuickAsyncImageProvider, QQuickImageResponse, QQuickTextureFactory
+from shiboken6 import isValid
+
+
+PROVIDER_ID = 'covers'
+# About 400 decoded 196 px tiles.
+CACHE_BYTES = 64 * 1024 * 1024
+DECODE_THREADS = 2
+
+
+def cover_url(local_uri):
+    """The image:// URL the cover provider serves a cached artwork file:// URI under."""
+    name = Path(unquote(urlparse(local_uri).path)).name
+    return f'image://{PROVIDER_ID}/{quote(name)}'
+
+
+class DecodedImageCache(object):
+    """Least recently used decoded images, bounded by their total size in bytes. Safe to share between threads."""
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._images)
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        size = image.sizeInBytes()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.sizeInBytes()
+            self._images[key] = image
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.bytes -= evicted.sizeInBytes()
+
+
+def scaled_size(original, requested):
+    """
+    The size to decode an original-sized image at so it covers requested, as Image.PreserveAspectCrop draws it;
+    a requested dimension of 0 follows the aspect ratio. None when the image is already no larger.
+    """
+    width, height = requested.width(), requested.height()
+    if not original.isValid() or (width <= 0 and height <= 0):
+        return None
+    if width <= 0:
+        target = QSize(round(original.width() * height / original.height()), height)
+    elif height <= 0:
+        target = QSize(width, round(original.height() * width / original.width()))
+    else:
+        target = original.scaled(requested, Qt.KeepAspectRatioByExpanding)
+    if target.width() >= original.width() and target.height() >= original.height():
+        return None
+    return target
+
+
+def decode_image(path, requested):
+    """
+    Decodes path at the size requested. The reader scales while decoding where the format allows (JPEG), so
+    the full-resolution image is never held in memory. Returns a null QImage when the file cannot be read.
+    """
+    reader = QImageReader(str(path))
+    reader.setAutoTransform(True)
+    target = scaled_size(reader.size(), requested)
+    if target is not None:
+        reader.setScaledSize(target)
+    return reader.read()
+
+
+class _CoverResponse(QQuickImageResponse):
+    def __init__(self, provider, token):
+        super().__init__()
+        self._provider = provider
+        self._token = token
+        self._image = QImage()
+        self._error = ''
+
+    def textureFactory(self):
+        return QQuickTextureFactory.textureFactoryForImage(self._image)
+
+    def errorString(self):
+        return self._error
+
+    def cancel(self):
+        # Qt may delete a cancelled response as soon as it has finished, so the provider forgets it first.
+        if self._provider.forget(self._token):
+            self.finish(QImage(), 'Cancelled')
+
+    def finish(self, image, error):
+        self._image = image
+        self._error = error
+        self.finished.emit()
+
+
+class _DecodeJob(QRunnable):
+    # Holds the provider and a token, never the response, which Qt can delete while the job runs.
+    def __init__(self, cache, provider, token, path, requested):
+        super().__init__()
+        self._cache = cache
+        self._provider = provider
+        self._token = token
+        self._path = path
+        self._requested = requested
+
+    def run(self):
+        if not self._provider.pending(self._token):
+            return
+        key = (str(self._path), self._requested.width(), self._requested.height())
+        image = self._cache.get(key)
+        if image is None:
+            image = decode_image(self._path, self._requested)
+            if image.isNull():
+                self._provider.deliver_later(self._token, image, f'Unable to decode {self._path}')
+                return
+            self._cache.put(key, image)
+        self._provider.deliver_later(self._token, image)
+
+
+class CoverImageProvider(QQuickAsyncImageProvider):
+    """
+    Serves image://covers/<file> from the artwork cache directory. Images are decoded on a small thread pool
+    at the size the Image asks for (its sourceSize) and kept in a byte-bounded cache, so delegates recycled
+    while scrolling reuse the decoded tile instead of reading the file again.
+    """
+    def __init__(self, root, cache=None):
+        super().__init__()
+        self.root = Path(root)
+        self.cache = cache if cache is not None else DecodedImageCache()
+        self._pool = QThreadPool()
+        self._pool.setMaxThreadCount(DECODE_THREADS)
+        self._responses = {}
+        self._tokens = itertools.count()
+        self._lock = threading.Lock()
+
+    def requestImageResponse(self, image_id, requested_size):
+        # Only file names are served, so an id cannot reach outside the artwork directory.
+        path = self.root / Path(unquote(image_id)).name
+        with self._lock:
+            token = next(self._tokens)
+            response = self._responses[token] = _CoverResponse(self, token)
+        self._pool.start(_DecodeJob(self.cache, self, token, path, QSize(requested_size)))
+        return response
+
+    def pending(self, token):
+        with self._lock:
+            return token in self._responses
+
+    def forget(self, token):
+        """Drops a response that is no longer wanted; False when it was already delivered or dropped."""
+        with self._lock:
+            return self._responses.pop(token, None) is not None
+
+    def deliver_later(self, token, image, error=''):
+        # Called from a decode thread. Queued to the provider's thread, which also means Qt has connected to
+        # the response's finished signal by the time it runs.
+        if isValid(self):
+            QMetaObject.invokeMethod(self, '_deliver', Qt.QueuedConnection, Q_ARG(int, token), Q_ARG(QImage, image), Q_ARG(str, error))
+
+    @Slot(int, QImage, str)
+    def _deliver(self, token, image, error):
+        with self._lock:
+            response = self._responses.pop(token, None)
+        # A response that was cancelled, or deleted along with the engine, is not touched.
+        if response is not None and isValid(response):
+            response.finish(image, error)
@@ -0,0 +1,220 @@
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QObject, Qt, Signal, Slot
+
+from ..errors import OperationCancelled
+
+
+MAX_CONCURRENT_JOBS = 3
+LIBRARY_JOB_KEY = 'library'
+
+QUEUED = 'queued'
+RUNNING = 'running'
+CANCELLING = 'cancelling'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class Job(object):
+    """
+    A unit of background work. Jobs sharing a key (a game UUID, or the library itself) never run at the
+    same time; everything else runs concurrently on the manager's pool.
+    """
+    def __init__(self, manager, job_id, kind, key, title, target):
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        self.title = title
+        self.status = QUEUED
+        self.progress = -1.0
+        self.progress_label = ''
+        self.cancel_event = threading.Event()
+        self._manager = manager
+        self._target = target
+
+    def report(self, value, label=''):
+        self._manager._jobProgress.emit(self.id, float(value), label)
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise OperationCancelled('Operation cancelled.')
+
+
+class JobsModel(QAbstractListModel):
+    JobIdRole = Qt.UserRole + 1
+    TitleRole = Qt.UserRole + 2
+    KindRole = Qt.UserRole + 3
+    StatusRole = Qt.UserRole + 4
+    ProgressRole = Qt.UserRole + 5
+    ProgressLabelRole = Qt.UserRole + 6
+
+    def __init__(self):
+        super().__init__()
+        self._jobs = []
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._jobs)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() < 0 or index.row() >= len(self._jobs):
+            return None
+        job = self._jobs[index.row()]
+        if role == self.JobIdRole:
+            return job.id
+        if role == self.TitleRole:
+            return job.title
+        if role == self.KindRole:
+            return job.kind
+        if role == self.StatusRole:
+            return job.status
+        if role == self.ProgressRole:
+            return job.progress
+        if role == self.ProgressLabelRole:
+            return job.progress_label
+        return None
+
+    def roleNames(self):
+        return {
+            self.JobIdRole: b'jobId',
+            self.TitleRole: b'title',
+            self.KindRole: b'kind',
+            self.StatusRole: b'status',
+            self.ProgressRole: b'progress',
+            self.ProgressLabelRole: b'progressLabel',
+        }
+
+    def _row(self, job_id):
+        return next((row for row, job in enumerate(self._jobs) if job.id == job_id), -1)
+
+    def add_job(self, job):
+        row = len(self._jobs)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._jobs.append(job)
+        self.endInsertRows()
+
+    def remove_job(self, job_id):
+        row = self._row(job_id)
+        if row < 0:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._jobs[row]
+        self.endRemoveRows()
+
+    def job_changed(self, job_id):
+        row = self._row(job_id)
+        if row >= 0:
+            index = self.index(row, 0)
+            self.dataChanged.emit(index, index)
+
+
+class JobManager(QObject):
+    jobFinished = Signal(str, str, str, str, str)
+    _jobStarted = Signal(int)
+    _jobProgress = Signal(int, float, str)
+    _jobDone = Signal(int, str, str)
+
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS):
+        super().__init__()
+        self.model = JobsModel()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='heirloom-job')
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._running = {}
+        self._waiting = {}
+        self._jobStarted.connect(self._mark_started)
+        self._jobProgress.connect(self._update_progress)
+        self._jobDone.connect(self._complete)
+
+    def submit(self, kind, key, title, target):
+        """
+        Queues target(job) on the pool. Returns None if an identical job is already queued or running.
+        """
+        if any(job.kind == kind and job.key == key and job.status in (QUEUED, RUNNING) for job in self._jobs.values()):
+            return None
+        job = Job(self, next(self._ids), kind, key, title, target)
+        self._jobs[job.id] = job
+        self.model.add_job(job)
+        if key in self._running:
+            self._waiting.setdefault(key, deque()).append(job)
+        else:
+            self._start(job)
+        return job
+
+    def has_active(self, key):
+        return key in self._running or bool(self._waiting.get(key))
+
+    @Slot(int)
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if not job:
+            return
+        waiting = self._waiting.get(job.key)
+        if waiting and job in waiting:
+            waiting.remove(job)
+            self._finish(job, CANCELLED, '')
+            return
+        if self._running.get(job.key) is job:
+            job.cancel_event.set()
+            job.status = CANCELLING
+            self.model.job_changed(job.id)
+
+    def shutdown(self):
+        for job in self._jobs.values():
+            job.cancel_event.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _start(self, job):
+        self._running[job.key] = job
+        self._pool.submit(self._execute, job)
+
+    def _execute(self, job):
+        if job.cancel_event.is_set():
+            self._jobDone.emit(job.id, CANCELLED, '')
+            return
+        self._jobStarted.emit(job.id)
+        try:
+            job._target(job)
+        except OperationCancelled:
+            self._jobDone.emit(job.id, CANCELLED, '')
+        except Exception as exc:
+            self._jobDone.emit(job.id, FAILED, str(exc))
+        else:
+            self._jobDone.emit(job.id, DONE, '')
+
+    def _mark_started(self, job_id):
+        job = self._jobs.get(job_id)
+        if job and job.status == QUEUED:
+            job.status = RUNNING
+            self.model.job_changed(job_id)
+
+    def _update_progress(self, job_id, value, label):
+        job = self._jobs.get(job_id)
+        if job:
+            job.progress = max(-1.0, min(1.0, value))
+            job.progress_label = label
+            self.model.job_changed(job_id)
+
+    def _complete(self, job_id, status, message):
+        job = self._jobs.get(job_id)
+        if not job:
+            return
+        if self._running.get(job.key) is job:
+            del self._running[job.key]
+            waiting = self._waiting.get(job.key)
+            if waiting:
+                self._start(waiting.popleft())
+            if not waiting:
+                self._waiting.pop(job.key, None)
+        self._finish(job, status, message)
+
+    def _finish(self, job, status, message):
+        job.status = status
+        self._jobs.pop(job.id, None)
+        self.model.remove_job(job.id)
+        self.jobFinished.emit(job.kind, job.key, job.title, status, message)
@@ -323,7 +323,89 @@ ApplicationWindow {
                     }
                 }
 
-                Item { Layout.fillHeight: true }
+                SectionLabel {
+                    text: "ACTIVITY"
+                    visible: jobsList.count > 0
+                }
+
+                ListView {
+                    id: jobsList
+                    Layout.fillWidth: true
+                    Layout.fillHeight: true
+                    model: jobsModel
+                    spacing: 8
+                    clip: true
+                    boundsBehavior: Flickable.StopAtBounds
+
+                    delegate: Rectangle {
+                        width: jobsList.width
+                        height: 76
+                        radius: 7
+                        color: "#14191f"
+                        border.color: root.line
+                        border.width: 1
+
+                        ColumnLayout {
+                            anchors.fill: parent
+                            anchors.margins: 10
+                            spacing: 6
+
+                            RowLayout {
+                                Layout.fillWidth: true
+                                spacing: 8
+
+                                Text {
+                                    Layout.fillWidth: true
+                                    text: title
+                                    color: root.ink
+                                    elide: Text.ElideRight
+                                    font.pixelSize: 13
+                                    font.weight: Font.DemiBold
+                                }
+
+                                HButton {
+                                    implicitHeight: 26
+                                    padding: 4
+                                    leftPadding: 10
+                                    rightPadding: 10
+                                    font.pixelSize: 11
+                                    text: status === "cancelling" ? "Cancelling" : "Cancel"
+                                    enabled: status !== "cancelling"
+                                    fill: "#28191d"
+                                    fillHover: "#3a2026"
+                                    stroke: "#67333c"
+                                    labelColor: root.danger
+                                    onClicked: controller.cancelJob(jobId)
+                                }
+                            }
+
+                            Rectangle {
+                                Layout.fillWidth: true
+                                Layout.preferredHeight: 6
+                                radius: 3
+                                color: "#10151b"
+                                clip: true
+
+                                Rectangle {
+                                    anchors.left: parent.left
+                                    anchors.top: parent.top
+                                    anchors.bottom: parent.bottom
+                                    width: progress >= 0 ? Math.max(6, parent.width * progress) : parent.width
+                                    radius: 3
+                                    color: progress >= 0 ? root.accent : root.line
+                                }
+                            }
+
+                            Text {
+                                Layout.fillWidth: true
+                                text: status === "queued" ? "Waiting..." : (progress >= 0 ? Math.round(progress * 100) + "%  " + progressLabel : "Working...")
+                                color: root.muted
+                                elide: Text.ElideRight
+                                font.pixelSize: 11
+                            }
+                        }
+                    }
+                }
 
                 Rectangle {
                     Layout.fillWidth: true
@@ -436,6 +518,7 @@ ApplicationWindow {
 
                 GridView {
                     id: grid
+                    objectName: "gamesGrid"
                     anchors.fill: parent
                     anchors.margins: 22
                     model: gamesModel
@@ -473,8 +556,11 @@ ApplicationWindow {
                                 Image {
                                     anchors.fill: parent
                                     source: coverArt
+                                    sourceSize: Qt.size(width, height)
                                     fillMode: Image.PreserveAspectCrop
                                     asynchronous: true
+                                    // Decoded covers are cached by the image provider.
+                                    cache: false
                                     smooth: true
                                     mipmap: true
                                 }
@@ -491,7 +577,7 @@ ApplicationWindow {
                                     Text {
                                         id: statusText
                                         anchors.centerIn: parent
-                                        text: installed ? "INSTALLED" : "READY"
+                                        text: installed ? "INSTALLED" : (isNew ? "NEW" : "READY")
                                         color: "#07110f"
                                         font.pixelSize: 11
                                         font.weight: Font.Black
@@ -551,8 +637,8 @@ ApplicationWindow {
                                 HButton {
                                     Layout.fillWidth: true
                                     Layout.minimumWidth: 0
-                                    text: installed ? "Launch" : "Install"
-                                    enabled: !controller.busy
+                                    text: active ? "Working..." : (installed ? "Launch" : "Install")
+                                    enabled: !controller.busy && !active
                                     fill: installed ? "#15221f" : "#1c2028"
                                     fillHover: installed ? "#19342d" : "#252c35"
                                     stroke: installed ? "#2a6153" : root.line
@@ -565,7 +651,7 @@ ApplicationWindow {
                                     Layout.minimumWidth: 88
                                     text: "Uninstall"
                                     visible: installed
-                                    enabled: !controller.busy
+                                    enabled: !controller.busy && !active
                                     fill: "#28191d"
                                     fillHover: "#3a2026"
                                     stroke: "#67333c"
@@ -590,13 +676,13 @@ ApplicationWindow {
 
     Rectangle {
         anchors.fill: parent
-        visible: controller.busy
+        visible: controller.busy && !controller.revalidating
         color: "#99090c10"
 
         Rectangle {
             anchors.centerIn: parent
             width: 390
-            height: controller.progress >= 0 ? 236 : 188
+            height: 188
             radius: 8
             color: root.panelRaised
             border.color: root.line
@@ -619,40 +705,6 @@ ApplicationWindow {
                     wrapMode: Text.WordWrap
                     font.pixelSize: 14
                 }
-
-                ColumnLayout {
-                    Layout.fillWidth: true
-                    spacing: 7
-                    visible: controller.progress >= 0
-
-                    Rectangle {
-                        Layout.fillWidth: true
-                        Layout.preferredHeight: 10
-                        radius: 5
-                        color: "#10151b"
-                        border.color: root.line
-                        border.width: 1
-                        clip: true
-
-                        Rectangle {
-                            anchors.left: parent.left
-                            anchors.top: parent.top
-                            anchors.bottom: parent.bottom
-                            width: Math.max(8, parent.width * controller.progress)
-                            radius: 5
-                            color: root.accent
-                        }
-                    }
-
-                    Text {
-                        Layout.fillWidth: true
-                        text: Math.round(controller.progress * 100) + "%  " + controller.progressLabel
-                        color: root.muted
-                        horizontalAlignment: Text.AlignHCenter
-                        elide: Text.ElideRight
-                        font.pixelSize: 12
-                    }
-                }
             }
         }
     }
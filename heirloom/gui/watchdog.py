@@ -0,0 +1,99 @@
+import sys
+import threading
+import time
+import traceback
+
+from PySide6.QtCore import QObject, QTimer
+
+
+WATCHDOG_ENV = 'HEIRLOOM_WATCHDOG'
+WATCHDOG_OPTION = '--watchdog'
+DEFAULT_THRESHOLD_MS = 100
+# How often the GUI thread checks in; a stall is only noticed at this resolution.
+HEARTBEAT_MS = 20
+
+
+def watchdog_threshold(argv, environ):
+    """
+    The stall threshold in milliseconds asked for by --watchdog[=ms] in argv or HEIRLOOM_WATCHDOG=ms in the
+    environment; None when the watchdog is not wanted.
+    """
+    value = None
+    for arg in argv:
+        if arg == WATCHDOG_OPTION:
+            value = ''
+        elif arg.startswith(WATCHDOG_OPTION + '='):
+            value = arg.split('=', 1)[1]
+    if value is None:
+        value = environ.get(WATCHDOG_ENV)
+    if value is None or value.strip().lower() in ('0', 'false', 'no', 'off'):
+        return None
+    try:
+        return int(value) if value.strip() else DEFAULT_THRESHOLD_MS
+    except ValueError:
+        return DEFAULT_THRESHOLD_MS
+
+
+class StallWatchdog(QObject):
+    """
+    Reports when the GUI thread's event loop does not run for longer than threshold_ms. A timer on the GUI
+    thread records a heartbeat; a daemon thread watches it and, once per stall, prints where the GUI thread is
+    stuck to stream, then how long the stall lasted once the event loop runs again. Create and start it on the
+    GUI thread.
+    """
+    def __init__(self, threshold_ms=DEFAULT_THRESHOLD_MS, stream=None, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000
+        self.stream = stream if stream is not None else sys.stderr
+        self.stalls = []
+        self._gui_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stalled_since = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._monitor = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(HEARTBEAT_MS)
+        self._timer.timeout.connect(self._beat)
+
+    def start(self):
+        self._gui_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._timer.start()
+        self._monitor = threading.Thread(target=self._watch, name='heirloom-gui-watchdog', daemon=True)
+        self._monitor.start()
+
+    def stop(self):
+        self._timer.stop()
+        self._stopped.set()
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+
+    def _beat(self):
+        now = time.monotonic()
+        with self._lock:
+            stalled_since = self._stalled_since
+            self._stalled_since = None
+            last = self._heartbeat
+            self._heartbeat = now
+        if stalled_since is not None:
+            self._write(f'GUI thread stall ended after {(now - last) * 1000:.0f} ms\n')
+
+    def _watch(self):
+        interval = min(self.threshold, HEARTBEAT_MS / 1000) / 2
+        while not self._stopped.wait(interval):
+            with self._lock:
+                blocked = time.monotonic() - self._heartbeat
+                if blocked <= self.threshold or self._stalled_since is not None:
+                    continue
+                self._stalled_since = self._heartbeat
+            frame = sys._current_frames().get(self._gui_thread)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+            self.stalls.append(stack)
+            self._write(f'GUI thread blocked for more than {blocked * 1000:.0f} ms at:\n{stack}')
+
+    def _write(self, text):
+        self.stream.write(text)
+        self.stream.flush()
@@ -1,38 +1,66 @@
-import requests
-import base64
 import os
 import shutil
 import subprocess
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
 from pathlib import Path
-from urllib.parse import urlparse, unquote
-from rich.progress import Progress
 from rich.console import Console
 
+from .catalog import (
+    API_URL,
+    api_headers,
+    endpoint_urls,
+    find_game,
+    find_game_by_uuid,
+    find_product,
+    giveaway_download_params,
+    giveaway_games,
+    join_catalog,
+    parse_download_url,
+    parse_user_email,
+    parse_user_id,
+    product_games,
+    purchase_download_params,
+    purchased_products,
+    url_filename,
+)
 from .password_functions import *
 from .path_functions import *
-from .integrations import build_wine_command
-
-
+from .integrations import build_wine_command, flatpak_prefix_args, slugify, truthy
+from .prefixes import CLONE_AUTO, TEMPLATE_PREFIX_NAME, clone_tree
+from .errors import OperationCancelled
+from .diskspace import DEFAULT_MIN_FREE_SPACE, InsufficientSpace, filesystem_of, find_shortfalls, plan_installs, space_requirements
+from .extraction import ExtractionScheduler, seven_zip_extract_command
+from .process import RotatingLog, parse_percent, run_streamed
+from .transport import BODY_ERRORS, build_session, transport_settings
+from .trash import TRASH_LOG_NAME, move_to_trash, purge_trash_in_background
+from .profiling import span, timed
+from .progress import DOWNLOAD, EXTRACT, REGISTER, ProgressReporter, RichProgressBar, parse_size
+
+
+# Installer timeouts scale with the game size unless install_timeout is configured (0 disables it).
+MIN_INSTALL_TIMEOUT = 300
+MIN_INSTALL_RATE = 5 * 1024 * 1024
+# How many times a download whose body breaks off is resumed with a Range request.
+DOWNLOAD_RESUME_ATTEMPTS = 3
+
+
 class Heirloom(object):
     def __init__(self, user, password, base_install_dir, **kwargs) -> None:
-        self._session = requests.Session()
+        self._session, self._transport_stats = build_session(**transport_settings(kwargs))
         self._request_timeout = kwargs.get('request_timeout', 30)
-        self._encoded_password = base64.b64encode(f'{user}:{password}'.encode('utf-8')).decode('utf-8')
-        self._headers = {
-            'accept': 'application/json',
-            'accept-encoding': 'gzip,deflate',
-            'authorization': '?token?',
-            'content-type': 'application/json',
-            'usertoken': f'Basic {self._encoded_password}',
-        }
-        self._api_url = 'https://api.legacygames.com'
-        self._login_url = self._api_url + '/users/login'
-        self._giveaway_catalog_url = self._api_url + '/users/getgiveawaycatalogbyemail'
-        self._giveaway_download_url = self._api_url + '/products/giveawaydownload'
-        self._product_catalog_url = self._api_url + '/products/catalog'
-        self._purchased_games_url = self._api_url + '/users/downloads'
-        self._purchase_download_url = self._api_url + '/products/download'
-        self._profile_url = self._api_url + '/users/profile'
+        self._headers = api_headers(user, password)
+        self._api_url = kwargs.get('api_url') or API_URL
+        urls = endpoint_urls(self._api_url)
+        self._login_url = urls['login']
+        self._giveaway_catalog_url = urls['giveaway_catalog']
+        self._giveaway_download_url = urls['giveaway_download']
+        self._product_catalog_url = urls['product_catalog']
+        self._purchased_games_url = urls['purchased_games']
+        self._purchase_download_url = urls['purchase_download']
+        self._profile_url = urls['profile']
         self._user_id = None
         self._base_install_dir = Path(base_install_dir).expanduser()
         self._base_install_wine_path = convert_to_wine_path(self._base_install_dir.as_posix())
@@ -44,60 +72,143 @@ class Heirloom(object):
         self._default_installation_method = kwargs.get('default_installation_method', 'wine')
         self._quiet = kwargs.get('quiet', False)
         self._tmp_dir = Path(kwargs.get('temp_dir', '~/.heirloom.tmp/')).expanduser()
+        self._keep_wineserver_warm = truthy(kwargs.get('keep_wineserver_warm', False))
+        self._wineserver_lock = threading.Lock()
+        self._wineserver_sessions = 0
+        self._warm_prefixes = set()
+        self._launched_processes = []
+        self._per_game_prefixes = truthy(kwargs.get('per_game_prefixes', False))
+        self._prefix_dir = Path(kwargs.get('wine_prefix_dir') or '~/.local/share/heirloom/prefixes').expanduser()
+        self._prefix_clone_mode = kwargs.get('wine_prefix_clone') or CLONE_AUTO
+        self._prefix_lock = threading.Lock()
+        install_timeout = kwargs.get('install_timeout')
+        self._install_timeout = float(install_timeout) if install_timeout not in (None, '') else None
+        self._log_dir = Path(kwargs.get('log_dir') or '~/.config/heirloom/logs').expanduser()
+        self._extraction_scheduler = ExtractionScheduler(kwargs.get('extraction_threads'))
+        min_free_space = kwargs.get('min_free_space')
+        self._min_free_space = parse_size(min_free_space) if min_free_space not in (None, '') else DEFAULT_MIN_FREE_SPACE
+        self._space_lock = threading.Lock()
+        self._reserved_space = defaultdict(int)
+        # Called with a dict describing each finished refresh, download, extraction, install and uninstall.
+        self.operation_recorder = None
         self.games = []
 
 
     def _get_json(self, url, **kwargs):
-        response = self._session.get(
-            url,
-            headers=kwargs.pop('headers', self._headers),
-            timeout=self._request_timeout,
-            **kwargs,
-        )
-        response.raise_for_status()
-        return response.json()
+        with span('GET ' + url.removeprefix(self._api_url)):
+            response = self._session.get(
+                url,
+                headers=kwargs.pop('headers', self._headers),
+                timeout=self._request_timeout,
+                **kwargs,
+            )
+            response.raise_for_status()
+            return response.json()
+
+
+    def transport_stats(self):
+        return self._transport_stats.snapshot()
 
 
-    def _download_file(self, url, output_dir, description, progress_callback=None):
+    @contextmanager
+    def _operation(self, kind, game=None, method=None, size=None):
+        """
+        Times an operation and hands it to operation_recorder when it ends, whether it succeeded, failed,
+        was cancelled or raised. The body may set 'outcome', 'size' and 'detail' on the yielded dict.
+        """
+        operation = {
+            'kind': kind,
+            'name': game['game_name'] if game else None,
+            'uuid': game.get('installer_uuid') if game else None,
+            'method': method,
+            'size': size,
+            'started_at': time.time(),
+            'outcome': 'success',
+            'detail': None,
+        }
+        try:
+            yield operation
+        except OperationCancelled:
+            operation['outcome'] = 'cancelled'
+            raise
+        except BaseException as exc:
+            operation['outcome'] = 'error'
+            operation['detail'] = str(exc) or type(exc).__name__
+            raise
+        finally:
+            operation['finished_at'] = time.time()
+            if self.operation_recorder:
+                self.operation_recorder(operation)
+
+
+    def _check_cancelled(self, cancel_event):
+        if cancel_event is not None and cancel_event.is_set():
+            raise OperationCancelled('Operation cancelled.')
+
+
+    def _download_file(self, url, output_dir, description, progress_callback=None, cancel_event=None):
         output_path = Path(output_dir).expanduser()
         output_path.mkdir(parents=True, exist_ok=True)
-        filename = unquote(Path(urlparse(url).path).name)
-        if not filename:
-            raise AssertionError(f'Unable to determine filename from URL: {url}')
+        filename = url_filename(url)
         destination = output_path / filename
-        response = self._session.get(url, stream=True, timeout=self._request_timeout)
-        response.raise_for_status()
-        total_size = int(response.headers.get('content-length', 0))
-        block_size = 1024 * 128
-        downloaded = 0
-        with destination.open('wb') as f:
-            if not self._quiet:
-                with Progress() as progress_bar:
-                    download_task = progress_bar.add_task(description, total=total_size)
-                    for data in response.iter_content(block_size):
+        with span('download', file=filename):
+            response = self._session.get(url, stream=True, timeout=self._request_timeout)
+            response.raise_for_status()
+            total_size = int(response.headers.get('content-length', 0))
+            if total_size:
+                shortfalls = find_shortfalls([(output_path, total_size, False)], min_free=self._min_free_space)
+                if shortfalls:
+                    response.close()
+                    raise InsufficientSpace(shortfalls)
+            try:
+                with destination.open('wb') as f:
+                    if not self._quiet:
+                        with RichProgressBar(description) as progress_bar:
+                            self._write_response(url, response, f, ProgressReporter([progress_bar, progress_callback], DOWNLOAD, total_size, description), cancel_event)
+                    else:
+                        self._write_response(url, response, f, ProgressReporter(progress_callback, DOWNLOAD, total_size, description), cancel_event)
+            except BaseException:
+                destination.unlink(missing_ok=True)
+                raise
+        return filename
+
+
+    def _write_response(self, url, response, f, reporter, cancel_event):
+        """
+        Streams the body of response into f. When the body breaks off, the rest is asked for with a Range
+        request, up to DOWNLOAD_RESUME_ATTEMPTS times; a server that answers without the requested range
+        leaves the original error to be raised.
+        """
+        attempts = 0
+        try:
+            while True:
+                try:
+                    for data in response.iter_content(1024 * 128):
+                        self._check_cancelled(cancel_event)
                         if data:
-                            downloaded += len(data)
-                            progress_bar.update(download_task, advance=len(data))
                             f.write(data)
-                            if progress_callback:
-                                progress_callback(downloaded, total_size)
-            else:
-                for data in response.iter_content(block_size):
-                    if data:
-                        downloaded += len(data)
-                        f.write(data)
-                        if progress_callback:
-                            progress_callback(downloaded, total_size)
-        return filename
+                            reporter.advance(len(data))
+                    break
+                except BODY_ERRORS:
+                    response.close()
+                    attempts += 1
+                    if attempts > DOWNLOAD_RESUME_ATTEMPTS:
+                        raise
+                    offset = f.tell()
+                    resumed = self._session.get(url, stream=True, timeout=self._request_timeout, headers={'Range': f'bytes={offset}-'})
+                    if resumed.status_code != 206 or not resumed.headers.get('content-range', '').startswith(f'bytes {offset}-'):
+                        resumed.close()
+                        raise
+                    response = resumed
+        finally:
+            response.close()
+        reporter.finish()
 
 
     def _find_game(self, game_name):
         if not self.games:
             self.refresh_games_list()
-        try:
-            return next((g for g in self.games if g['game_name'].lower() == game_name.lower()))
-        except StopIteration:
-            raise AssertionError(f'Unable to find game with name "{game_name}"')
+        return find_game(self.games, game_name)
 
 
     def _install_folder_name(self, installer_filename):
@@ -131,27 +242,182 @@ class Heirloom(object):
         }
 
 
-    def _wine_command(self, *args):
+    def _wine_command(self, *args, prefix=None, env=None):
+        env = dict(env or {})
+        if prefix:
+            env['WINEPREFIX'] = str(prefix)
         if self._wine_runner == 'flatpak':
             if not self._flatpak_path or not (shutil.which(self._flatpak_path) or os.path.exists(self._flatpak_path)):
                 raise AssertionError('flatpak executable not found!')
-            return [self._flatpak_path, 'run', self._wine_flatpak_app, *args]
+            extra_env = [f'--env={key}={value}' for key, value in env.items() if key != 'WINEPREFIX']
+            return [self._flatpak_path, 'run', *flatpak_prefix_args(prefix), *extra_env, self._wine_flatpak_app, *args]
         if not self._wine_path or not (shutil.which(self._wine_path) or os.path.exists(self._wine_path)):
             raise AssertionError('wine executable not found!')
+        if env:
+            return ['env', *(f'{key}={value}' for key, value in env.items()), self._wine_path, *args]
         return [self._wine_path, *args]
 
 
-    def launch_command(self, executable):
-        return build_wine_command(self._wine_config(), executable)
+    def _wineserver_command(self, *args, prefix=None):
+        if self._wine_runner == 'flatpak':
+            flatpak = self._wine_command()[0]
+            return [flatpak, 'run', *flatpak_prefix_args(prefix), '--command=wineserver', self._wine_flatpak_app, *args]
+        wine_path = self._wine_command()[0]
+        sibling = Path(shutil.which(wine_path) or wine_path).with_name('wineserver')
+        command = [str(sibling) if sibling.exists() else 'wineserver', *args]
+        if prefix:
+            return ['env', f'WINEPREFIX={prefix}', *command]
+        return command
+
+
+    def _template_prefix(self):
+        return self._prefix_dir / TEMPLATE_PREFIX_NAME
+
+
+    def game_prefix_path(self, uuid):
+        return self._prefix_dir / uuid
+
+
+    @timed()
+    def ensure_template_prefix(self):
+        """
+        Creates the shared template prefix with wineboot the first time it is needed. Every per-game prefix
+        is cloned from it, so the slow prefix initialisation only ever happens once.
+        """
+        template = self._template_prefix()
+        with self._prefix_lock:
+            if (template / 'system.reg').is_file():
+                return template
+            staging = template.with_name(f'{template.name}.tmp')
+            if staging.exists():
+                shutil.rmtree(staging)
+            staging.mkdir(parents=True)
+            # Skip the Mono/Gecko install prompts; games that need them install their own runtimes.
+            env = {'WINEDLLOVERRIDES': 'mscoree,mshtml='}
+            subprocess.run(self._wine_command('wineboot', '-i', prefix=staging, env=env), capture_output=True, timeout=600, check=False)
+            # Wait for the prefix's wineserver to exit so the registry is flushed before it is cloned.
+            subprocess.run(self._wineserver_command('-w', prefix=staging), capture_output=True, timeout=120, check=False)
+            if not (staging / 'system.reg').is_file():
+                shutil.rmtree(staging, ignore_errors=True)
+                raise RuntimeError('Unable to initialise the template Wine prefix.')
+            os.replace(staging, template)
+            return template
+
+
+    @timed()
+    def create_game_prefix(self, uuid):
+        """
+        Returns the game's own Wine prefix, cloning it from the template (reflinks or hardlinks where the
+        filesystem allows, see wine_prefix_clone) if it does not exist yet.
+        """
+        prefix = self.game_prefix_path(uuid)
+        if (prefix / 'system.reg').is_file():
+            return prefix
+        template = self.ensure_template_prefix()
+        staging = prefix.with_name(f'{prefix.name}.tmp')
+        if staging.exists():
+            shutil.rmtree(staging)
+        clone_tree(template, staging, self._prefix_clone_mode)
+        os.replace(staging, prefix)
+        return prefix
+
+
+    def remove_game_prefix(self, prefix):
+        if not prefix:
+            return
+        prefix_dir = self._prefix_dir.resolve()
+        target = Path(prefix).expanduser().resolve()
+        if target == prefix_dir or prefix_dir not in target.parents or target == self._template_prefix().resolve():
+            raise AssertionError(f'Refusing to remove a Wine prefix outside the managed prefix directory: {target}')
+        with self._wineserver_lock:
+            self._warm_prefixes.difference_update({str(prefix), str(target)})
+        if target.exists():
+            subprocess.run(self._wineserver_command('-k', prefix=target), capture_output=True, timeout=30, check=False)
+            self._discard_directory(target, self._prefix_dir)
+
+
+    def _discard_directory(self, path, root):
+        """
+        Renames path into root's trash and leaves the deletion to a background process; falls back to
+        deleting in place when path lives on another filesystem.
+        """
+        try:
+            move_to_trash(path, root)
+        except OSError:
+            shutil.rmtree(path)
+            return
+        purge_trash_in_background(root, log_path=self._log_dir / TRASH_LOG_NAME)
+
+
+    def purge_trash(self):
+        """
+        Finishes deleting anything left in the trash by an uninstall that was interrupted or a purge that
+        failed; failures are logged to trash.log in the log directory.
+        """
+        return purge_trash_in_background(self._base_install_dir, self._prefix_dir, log_path=self._log_dir / TRASH_LOG_NAME)
+
+
+    def begin_wineserver_session(self):
+        """
+        Opts in to persistent wineservers (keep_wineserver_warm) until the matching
+        end_wineserver_session(). A server is started lazily for each prefix on its first Wine install or
+        launch, so 7-Zip-only batches never pay for it.
+        """
+        if not self._keep_wineserver_warm:
+            return
+        with self._wineserver_lock:
+            self._wineserver_sessions += 1
+
+
+    def end_wineserver_session(self):
+        if not self._keep_wineserver_warm:
+            return
+        with self._wineserver_lock:
+            self._wineserver_sessions = max(0, self._wineserver_sessions - 1)
+            if self._wineserver_sessions:
+                return
+            warm_prefixes, self._warm_prefixes = self._warm_prefixes, set()
+            busy_prefixes = {prefix for prefix, process in self._launched_processes if process.poll() is None}
+            for prefix in warm_prefixes - busy_prefixes:
+                # A launched game still needs its server, which then stays up until the game exits.
+                command = self._wineserver_command('-k', prefix=prefix or None)
+                subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30, check=False)
+
+
+    @contextmanager
+    def wineserver_session(self):
+        self.begin_wineserver_session()
+        try:
+            yield self
+        finally:
+            self.end_wineserver_session()
+
+
+    def _ensure_wineserver(self, prefix=None):
+        key = str(prefix or '')
+        with self._wineserver_lock:
+            if not self._wineserver_sessions or key in self._warm_prefixes:
+                return
+            subprocess.run(self._wineserver_command('-p', prefix=prefix), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60, check=False)
+            self._warm_prefixes.add(key)
+
+
+    def launch_command(self, executable, prefix=None):
+        return build_wine_command(self._wine_config(), executable, prefix or None)
+
+
+    def launch_game(self, executable, prefix=None):
+        self._ensure_wineserver(prefix or None)
+        process = subprocess.Popen(self.launch_command(executable, prefix), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._launched_processes = [(p, proc) for p, proc in self._launched_processes if proc.poll() is None]
+        self._launched_processes.append((str(prefix or ''), process))
+        return process
 
 
+    @timed()
     def login(self):
-        response_json = self._get_json(self._login_url)
-        if response_json.get('data') and type(response_json.get('data')) == dict and response_json['data'].get('userId'):
-            self._user_id = response_json['data'].get('userId')
-            return response_json['data'].get('userId')
-        else:
-            raise AssertionError('Did not find userId in login response!')
+        self._user_id = parse_user_id(self._get_json(self._login_url))
+        return self._user_id
     
     
     def get_user_email(self):
@@ -159,53 +425,34 @@ class Heirloom(object):
         params = {
             'userId': user_id
         }
-        response_json = self._get_json(self._profile_url, params=params)
-        if response_json.get('data') and response_json['data'].get('email'):
-            return response_json['data']['email']
-        else:
-            raise AssertionError(f'Could not get user profile for userId {user_id}!')
+        return parse_user_email(self._get_json(self._profile_url, params=params), user_id)
 
     
     def dump_game_data(self, game_name):
-        return self._find_game(game_name)
+        return dict(self._find_game(game_name))
     
     
     def get_game_from_uuid(self, uuid):
         if not self.games:
             self.refresh_games_list()
-        try:
-            game = next((g for g in self.games if g.get('installer_uuid').lower() == uuid.lower()))
-            return game['game_name']
-        except StopIteration:
-            raise AssertionError(f'Unable to find game with UUID "{uuid}"')
+        return find_game_by_uuid(self.games, uuid)['game_name']
 
 
     def get_uuid_from_name(self, game_name):
-        if not self.games:
-            self.refresh_games_list()
-        try:
-            game = next((g for g in self.games if g.get('game_name').lower() == game_name.lower()))
-            return game['installer_uuid']
-        except StopIteration:
-            raise AssertionError(f'Unable to find game with name "{game_name}"')
+        return self._find_game(game_name)['installer_uuid']
 
 
-    def get_purchased_games(self):
-        if not self._user_id:
-            self._user_id = self.login()
-        product_catalog = self.get_product_catalog()
-        params = {
-            'userId': self._user_id
-        }
-        data = self._get_json(self._purchased_games_url, params=params).get('data')
-        if data:
-            purchased_games = [p for p in product_catalog if 'product_id' in p and p['product_id'] in [d['product_id'] for d in data]]
-        else:
-            purchased_games = []
-        games = []
-        for each_purchase in purchased_games:
-            games += each_purchase['games']
-        return games
+    @timed()
+    def get_purchased_products(self):
+        product_catalog = self.get_product_catalog()
+        params = {
+            'userId': self._user_id
+        }
+        return purchased_products(product_catalog, self._get_json(self._purchased_games_url, params=params))
+
+
+    def get_purchased_games(self):
+        return product_games(self.get_purchased_products())
 
 
     def get_product_catalog(self):
@@ -214,66 +461,43 @@ class Heirloom(object):
         return self._get_json(self._product_catalog_url)
 
 
+    @timed()
     def get_giveaway_games(self):
         params = {
             'email': self.get_user_email()
         }
-        response_json = self._get_json(self._giveaway_catalog_url, params=params)
-        games = []
-        for data in response_json['data']:
-            existing_game_names = [g['game_name'] for g in games] if games else []
-            for each_game in [d for d in data['games'] if d['game_name'] not in existing_game_names]:
-                games.append(each_game)
-        return games
+        return giveaway_games(self._get_json(self._giveaway_catalog_url, params=params))
         
 
+    @timed()
     def refresh_games_list(self):
-        giveaway_games = self.get_giveaway_games()
-        for each in giveaway_games:
-            each['amazonprime_giveaway'] = True
-        purchased_games = self.get_purchased_games()
-        for each in purchased_games:
-            each['amazonprime_giveaway'] = False
-        self.games = purchased_games + [g for g in giveaway_games if g['game_name'] not in [p['game_name'] for p in purchased_games]]
+        with self._operation('refresh') as operation:
+            giveaway_games = self.get_giveaway_games()
+            self.games = join_catalog(self.get_purchased_games(), giveaway_games)
+            operation['detail'] = f'{len(self.games)} games'
 
 
-    def download_game(self, game_name, output_dir=None, progress_callback=None):
+    def download_game(self, game_name, output_dir=None, progress_callback=None, cancel_event=None):
         if not output_dir:
             output_dir = self._tmp_dir
         game = self._find_game(game_name)
-        if game['amazonprime_giveaway']:
-            params = {
-                'installerUuid': game['installer_uuid']
-            }
-            response_json = self._get_json(self._giveaway_download_url, params=params)
-        else:
-            product_catalog = self.get_product_catalog()
-            params = {
-                'userId': self._user_id
-            }
-            data = self._get_json(self._purchased_games_url, params=params).get('data')
-            if data:
-                purchased_games = [p for p in product_catalog if 'product_id' in p and p['product_id'] in [d['product_id'] for d in data]]
+        with self._operation('download', game) as operation:
+            if game['amazonprime_giveaway']:
+                params = giveaway_download_params(game)
+                response_json = self._get_json(self._giveaway_download_url, params=params)
             else:
-                purchased_games = []
-            try:
-                product = next((p for p in purchased_games if 'games' in p and game['game_name'] in [n['game_name'] for n in p['games']]))
-            except StopIteration:
-                raise AssertionError(f'Unable to find game with name "{game_name}"')
-            params = {
-                'productId': product['product_id'],
-                'gameId': game['game_id']
-            }
-            response_json = self._get_json(self._purchase_download_url, params=params)
-        if not response_json.get('data') or type(response_json.get('data')) != dict:
-            raise AssertionError(f'Got invalid data back from download request!\n{response_json.get("data")}\nParams:\n{params}')
-        cdn_url = response_json['data']['file']
-        return self._download_file(
-            cdn_url,
-            output_dir,
-            f'[green]Downloading[/green] [white italic]{game_name}[/white italic] ([yellow]{game["game_installed_size"]}[/yellow])',
-            progress_callback=progress_callback,
-        )
+                params = purchase_download_params(find_product(self.get_purchased_products(), game), game)
+                response_json = self._get_json(self._purchase_download_url, params=params)
+            cdn_url = parse_download_url(response_json, params)
+            filename = self._download_file(
+                cdn_url,
+                output_dir,
+                f'[green]Downloading[/green] [white italic]{game_name}[/white italic] ([yellow]{game["game_installed_size"]}[/yellow])',
+                progress_callback=progress_callback,
+                cancel_event=cancel_event,
+            )
+            operation['size'] = (Path(output_dir).expanduser() / filename).stat().st_size
+        return filename
 
 
     def download_artwork(self, game_name, output_dir=None):
@@ -288,49 +512,136 @@ class Heirloom(object):
         )
 
 
-    def install_game(self, game_name, installation_method=None, show_gui=False, progress_callback=None):
+    def _install_requirements(self, game):
+        return space_requirements(parse_size(game.get('game_installed_size')), self._tmp_dir, self._base_install_dir)
+
+
+    def check_disk_space(self, game_name):
+        """
+        Returns the filesystems that cannot take the game's download plus its installed files right now,
+        counting space held by installs already in progress. An empty list means the install can start.
+        """
+        requirements = self._install_requirements(self._find_game(game_name))
+        with self._space_lock:
+            return find_shortfalls(requirements, self._reserved_space, self._min_free_space)
+
+
+    def plan_installs(self, game_names):
+        candidates = [(name, parse_size(self._find_game(name).get('game_installed_size'))) for name in game_names]
+        return plan_installs(candidates, self._tmp_dir, self._base_install_dir, self._min_free_space)
+
+
+    @contextmanager
+    def _disk_space_reservation(self, game):
+        requirements = self._install_requirements(game)
+        reserved = defaultdict(int)
+        for path, size, _ in requirements:
+            reserved[filesystem_of(path)] += size
+        with self._space_lock:
+            shortfalls = find_shortfalls(requirements, self._reserved_space, self._min_free_space)
+            if shortfalls:
+                raise InsufficientSpace(shortfalls)
+            for device, size in reserved.items():
+                self._reserved_space[device] += size
+        try:
+            yield
+        finally:
+            with self._space_lock:
+                for device, size in reserved.items():
+                    self._reserved_space[device] -= size
+
+
+    @timed()
+    def install_game(self, game_name, installation_method=None, show_gui=False, progress_callback=None, cancel_event=None):
+        """
+        Downloads and installs a game after checking that the download and the installed files fit, with
+        that space held for the duration so concurrent installs cannot overcommit the disk.
+        """
+        game = self._find_game(game_name)
+        method = (installation_method or self._default_installation_method).lower()
+        with self._operation('install', game, method, parse_size(game.get('game_installed_size'))) as operation:
+            with self._disk_space_reservation(game):
+                response = self._install_game(game_name, installation_method, show_gui, progress_callback, cancel_event)
+            operation['outcome'] = response['status']
+            return response
+
+
+    def _install_game(self, game_name, installation_method=None, show_gui=False, progress_callback=None, cancel_event=None):
         if not installation_method:
             installation_method = self._default_installation_method
         if installation_method.lower() not in ('wine', '7zip'):
             raise AssertionError(f'Invalid installation method ("{installation_method}"); valid installation methods are: ["wine", "7zip"]')
         game = self._find_game(game_name)
-        fn = self.download_game(game_name, progress_callback=progress_callback)
+        fn = self.download_game(game_name, progress_callback=progress_callback, cancel_event=cancel_event)
         folder_name = self._install_folder_name(fn)
         unix_install_path = self._base_install_dir / folder_name
         wine_install_path = self._wine_install_path(folder_name)
         installer_path = self._tmp_dir / fn
-        if installation_method.lower() == 'wine':
-            if not show_gui:
-                cmd = self._wine_command('start', '/b', '/wait', '/unix', str(installer_path), '/S', f'/D={wine_install_path}')
-            else:
-                cmd = self._wine_command('start', '/b', '/wait', '/unix', str(installer_path), f'/D={wine_install_path}')
-        elif installation_method.lower() == '7zip':
-            if not self._7zip_path or not os.path.exists(self._7zip_path):
-                raise AssertionError(f'7z executable not found!')
-            cmd = [self._7zip_path, 'x', f'-o{unix_install_path}', '-y', str(installer_path)]
+        if cancel_event is not None and cancel_event.is_set():
+            installer_path.unlink(missing_ok=True)
+            raise OperationCancelled('Operation cancelled.')
+        if installation_method.lower() == '7zip' and (not self._7zip_path or not os.path.exists(self._7zip_path)):
+            raise AssertionError(f'7z executable not found!')
+        prefix = None
+        created_prefix = False
+        if self._per_game_prefixes:
+            created_prefix = not (self.game_prefix_path(game['installer_uuid']) / 'system.reg').is_file()
+            prefix = self.create_game_prefix(game['installer_uuid'])
         self._base_install_dir.mkdir(parents=True, exist_ok=True)
+        install_dir_existed = unix_install_path.exists()
+        size = parse_size(game.get('game_installed_size')) or installer_path.stat().st_size
+        log_path = self.install_log_path(game['game_name'])
 
-        if not self._quiet:
-            console = Console()
-            console.print(f'[green]Installation method[/green] is [blue bold]{installation_method}[/blue bold]')
-            with console.status(f'Running command: [yellow]{" ".join(cmd)}[/yellow]'):
-                result = subprocess.run(cmd, timeout=300, capture_output=True)
-        else:
-            result = subprocess.run(cmd, timeout=300, capture_output=True)
+        # Wine installers unpack on a single thread; 7-Zip gets its share of the extraction thread budget.
+        max_threads = 1 if installation_method.lower() == 'wine' else None
+        try:
+            with (
+                self._extraction_scheduler.reserve(max_threads, should_stop=lambda: self._check_cancelled(cancel_event)) as threads,
+                self._operation('extract', game, installation_method.lower(), size) as operation,
+            ):
+                if installation_method.lower() == 'wine':
+                    self._ensure_wineserver(prefix)
+                    if not show_gui:
+                        cmd = self._wine_command('start', '/b', '/wait', '/unix', str(installer_path), '/S', f'/D={wine_install_path}', prefix=prefix)
+                    else:
+                        cmd = self._wine_command('start', '/b', '/wait', '/unix', str(installer_path), f'/D={wine_install_path}', prefix=prefix)
+                else:
+                    cmd = seven_zip_extract_command(self._7zip_path, installer_path, unix_install_path, threads)
+                result = self._run_installer(cmd, game, installation_method, size, progress_callback, log_path, cancel_event)
+                operation['outcome'] = 'success' if result.returncode == 0 else 'fail'
+        except (OperationCancelled, subprocess.TimeoutExpired):
+            if prefix:
+                # Killing `wine start /wait` leaves the installer itself running inside the prefix.
+                subprocess.run(self._wineserver_command('-k', prefix=prefix), capture_output=True, timeout=30, check=False)
+            if not install_dir_existed and unix_install_path.exists():
+                shutil.rmtree(unix_install_path, ignore_errors=True)
+            if created_prefix:
+                self.remove_game_prefix(prefix)
+            raise
+        finally:
+            installer_path.unlink(missing_ok=True)
 
         installed = unix_install_path.is_dir()
         install_dir = unix_install_path
+        if created_prefix and not installed:
+            self.remove_game_prefix(prefix)
         response = {
             'status': 'success' if installed else 'fail',
             'cmd': cmd,
-            'stdout': result.stdout.decode('utf-8', errors='replace'),
-            'stderr': result.stderr.decode('utf-8', errors='replace'),
+            'returncode': result.returncode,
+            'stdout': result.stdout,
+            'stderr': result.stderr,
+            'log_file': log_path.as_posix(),
             'install_path': wine_install_path,
             'unix_install_path': install_dir.as_posix(),
+            'wine_prefix': prefix.as_posix() if prefix and installed else '',
             'game': game['game_name'],
             'uuid': game['installer_uuid'],
         }
         if installed:
+            # Registration starts here; front ends carry the phase on while they record the install.
+            reporter = ProgressReporter(progress_callback, REGISTER, description=game['game_name'])
+            reporter.update(0)
             response['executable_files'] = [
                 g.as_posix()
                 for g in install_dir.glob('**/*.exe')
@@ -339,17 +650,74 @@ class Heirloom(object):
         return response
 
 
-    def uninstall_game(self, game_name, install_dir):
+    def install_log_path(self, game_name):
+        return self._log_dir / f'{slugify(game_name)}.log'
+
+
+    def _installer_timeout(self, size):
+        if self._install_timeout is not None:
+            return self._install_timeout or None
+        return MIN_INSTALL_TIMEOUT + size / MIN_INSTALL_RATE
+
+
+    @timed()
+    def _run_installer(self, cmd, game, installation_method, size, progress_callback, log_path, cancel_event):
+        if self._quiet:
+            return self._stream_installer(cmd, game, size, [progress_callback], log_path, cancel_event)
+        console = Console()
+        console.print(f'[green]Installation method[/green] is [blue bold]{installation_method}[/blue bold]')
+        if installation_method.lower() == '7zip':
+            with RichProgressBar(f'Extracting {game["game_name"]}') as progress_bar:
+                return self._stream_installer(cmd, game, size, [progress_bar, progress_callback], log_path, cancel_event)
+        with console.status(f'Running command: [yellow]{" ".join(cmd)}[/yellow]'):
+            return self._stream_installer(cmd, game, size, [progress_callback], log_path, cancel_event)
+
+
+    def _stream_installer(self, cmd, game, size, sinks, log_path, cancel_event):
+        """
+        Streams the installer's output into the game's rotating log and turns 7-Zip's percentage lines into
+        EXTRACT progress events scaled to the installed size.
+        """
+        reporter = ProgressReporter(sinks, EXTRACT, total=size, description=game['game_name'])
+        reporter.update(0)
+
+        def on_line(stream, line):
+            percent = parse_percent(line) if stream == 'stdout' else None
+            if percent is not None:
+                reporter.update(size * percent // 100)
+
+        with RotatingLog(log_path) as log:
+            result = run_streamed(
+                cmd,
+                log=log,
+                on_line=on_line,
+                timeout=self._installer_timeout(size),
+                should_stop=lambda: self._check_cancelled(cancel_event),
+            )
+        reporter.finish()
+        return result
+
+
+    @timed()
+    def uninstall_game(self, game_name, install_dir, cancel_event=None, wine_prefix=None):
+        with self._operation('uninstall', self._find_game(game_name)):
+            return self._uninstall_game(game_name, install_dir, cancel_event, wine_prefix)
+
+
+    def _uninstall_game(self, game_name, install_dir, cancel_event=None, wine_prefix=None):
         game = self._find_game(game_name)
         target_dir = self._ensure_install_dir_is_safe(install_dir)
+        self._check_cancelled(cancel_event)
         if not self._quiet:
             console = Console()
             with console.status(f'[green]Uninstalling[/green] [white italic]{game_name}[/white italic]'):
                 if target_dir.exists():
-                    shutil.rmtree(target_dir)
+                    self._discard_directory(target_dir, self._base_install_dir)
+                self.remove_game_prefix(wine_prefix)
         else:
             if target_dir.exists():
-                shutil.rmtree(target_dir)
+                self._discard_directory(target_dir, self._base_install_dir)
+            self.remove_game_prefix(wine_prefix)
         return {
             'status': 'success',
             'install_path': str(install_dir),
@@ -0,0 +1,87 @@
+import statistics
+from collections import defaultdict
+
+
+# Estimates only look at the most recent successful runs, so a faster disk or connection shows up quickly.
+ESTIMATE_WINDOW = 10
+
+
+def percentile(values, fraction):
+    """Linear-interpolated percentile of values (fraction 0.5 is the median); None when empty."""
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _successful(operations, kind, method=None):
+    return [
+        op for op in operations
+        if op['kind'] == kind and op['outcome'] == 'success' and (method is None or op['method'] == method)
+    ]
+
+
+def _spread(values):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 0.5),
+        'p95': percentile(values, 0.95),
+    }
+
+
+def summarize_operations(operations):
+    """
+    Aggregates an operation history (see read_operations) into:
+    - download: p50/p95 throughput in bytes per second of successful downloads.
+    - refresh: p50/p95 duration in seconds.
+    - install and extract: per method, attempts, successes and p50/p95 duration (and, for extract,
+      throughput).
+    - games: per game, install count, last outcome, median install duration and median download rate.
+    """
+    downloads = _successful(operations, 'download')
+    summary = {
+        'download': _spread([op['throughput'] for op in downloads if op['throughput']]),
+        'refresh': _spread([op['duration'] for op in _successful(operations, 'refresh')]),
+        'install': {},
+        'extract': {},
+        'games': {},
+    }
+    for kind in ('install', 'extract'):
+        methods = sorted({op['method'] for op in operations if op['kind'] == kind and op['method']})
+        for method in methods:
+            attempts = [op for op in operations if op['kind'] == kind and op['method'] == method]
+            successes = _successful(operations, kind, method)
+            entry = _spread([op['duration'] for op in successes])
+            entry['attempts'] = len(attempts)
+            entry['successes'] = len(successes)
+            if kind == 'extract':
+                entry['throughput_p50'] = percentile([op['throughput'] for op in successes if op['throughput']], 0.5)
+            summary[kind][method] = entry
+
+    by_game = defaultdict(list)
+    for op in operations:
+        if op['name']:
+            by_game[op['name']].append(op)
+    for name, game_operations in sorted(by_game.items(), key=lambda item: item[0].lower()):
+        installs = [op for op in game_operations if op['kind'] == 'install']
+        summary['games'][name] = {
+            'installs': len(installs),
+            'last_outcome': installs[-1]['outcome'] if installs else None,
+            'install_p50': percentile([op['duration'] for op in _successful(installs, 'install')], 0.5),
+            'download_p50': percentile([op['throughput'] for op in _successful(game_operations, 'download') if op['throughput']], 0.5),
+        }
+    return summary
+
+
+def estimate_seconds(operations, kind, size, method=None):
+    """
+    How long an operation of size bytes should take, from the median throughput of the last few successful
+    operations of that kind (and method). None without enough history to go on.
+    """
+    rates = [op['throughput'] for op in _successful(operations, kind, method) if op['throughput']][-ESTIMATE_WINDOW:]
+    if not rates or not size:
+        return None
+    return size / statistics.median(rates)
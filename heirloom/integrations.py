@@ -1,22 +1,65 @@
 import os
 import shlex
+import shutil
 import struct
+import subprocess
+import tempfile
 import zlib
 from pathlib import Path
 from urllib.parse import urlparse
 
+from .database_functions import NOT_INSTALLED, read_installed_game_records
+from .path_functions import convert_to_unix_path
+from .profiling import timed
+
 
 def truthy(value):
     return str(value).strip().lower() in ('1', 'yes', 'true', 'on')
 
 
-def build_wine_command(config, executable):
+def flatpak_prefix_args(prefix):
+    if not prefix:
+        return []
+    return [f'--env=WINEPREFIX={prefix}', f'--filesystem={prefix}']
+
+
+def build_wine_command(config, executable, prefix=None):
     runner = config.get('wine_runner', 'native')
     if runner == 'flatpak':
         flatpak_path = config.get('flatpak_path') or 'flatpak'
         app_id = config.get('wine_flatpak_app') or 'org.winehq.Wine'
-        return [flatpak_path, 'run', app_id, executable]
-    return [config.get('wine_path') or 'wine', executable]
+        return [flatpak_path, 'run', *flatpak_prefix_args(prefix), app_id, executable]
+    command = [config.get('wine_path') or 'wine', executable]
+    if prefix:
+        return ['env', f'WINEPREFIX={prefix}', *command]
+    return command
+
+
+def atomic_write_bytes(path, data, mode=None):
+    """
+    Writes data to a temporary file next to path, fsyncs it and renames it over path, so readers only
+    ever see the old or the new contents.
+    """
+    path = Path(path)
+    if mode is None:
+        mode = path.stat().st_mode & 0o777 if path.exists() else 0o644
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_name, mode)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return path
 
 
 def desktop_quote(value):
@@ -42,32 +85,100 @@ def slugify(value):
     return '-'.join(parts) or 'game'
 
 
+KDE_DEFAULT_ICON = 'applications-games'
+KDE_ENTRY_MARKER = 'X-HeirloomGame=true'
+
+
+def kde_applications_dir():
+    return Path('~/.local/share/applications').expanduser()
+
+
+def kde_game_entry_path(desktop_dir, game_name):
+    return Path(desktop_dir) / f'heirloom-{slugify(game_name)}.desktop'
+
+
+def kde_game_entry_text(game_name, config, executable, icon_path='', prefix=None):
+    command = build_wine_command(config, executable, prefix)
+    return '\n'.join(
+        [
+            '[Desktop Entry]',
+            'Type=Application',
+            f'Name={game_name}',
+            f'Comment=Launch {game_name} with Heirloom Games Manager',
+            f'Exec={desktop_exec(command)}',
+            f'Icon={icon_path or KDE_DEFAULT_ICON}',
+            'Terminal=false',
+            'Categories=Game;',
+            'StartupNotify=true',
+            KDE_ENTRY_MARKER,
+            '',
+        ]
+    )
+
+
 def write_kde_game_entry(game_name, config, executable, icon_path=''):
-    desktop_dir = Path('~/.local/share/applications').expanduser()
+    desktop_dir = kde_applications_dir()
     desktop_dir.mkdir(parents=True, exist_ok=True)
-    desktop_file = desktop_dir / f'heirloom-{slugify(game_name)}.desktop'
-    command = build_wine_command(config, executable)
-    desktop_file.write_text(
-        '\n'.join(
-            [
-                '[Desktop Entry]',
-                'Type=Application',
-                f'Name={game_name}',
-                f'Comment=Launch {game_name} with Heirloom Games Manager',
-                f'Exec={desktop_exec(command)}',
-                f'Icon={icon_path}' if icon_path else 'Icon=applications-games',
-                'Terminal=false',
-                'Categories=Game;',
-                'StartupNotify=true',
-                'X-HeirloomGame=true',
-                '',
-            ]
-        )
-    )
-    desktop_file.chmod(0o644)
+    desktop_file = kde_game_entry_path(desktop_dir, game_name)
+    atomic_write_bytes(desktop_file, kde_game_entry_text(game_name, config, executable, icon_path).encode('utf-8'), mode=0o644)
+    refresh_desktop_database(desktop_dir)
     return desktop_file
 
 
+def existing_kde_game_entries(desktop_dir):
+    entries = {}
+    for path in Path(desktop_dir).glob('heirloom-*.desktop'):
+        try:
+            text = path.read_text(encoding='utf-8')
+        except (OSError, UnicodeDecodeError):
+            continue
+        if KDE_ENTRY_MARKER in text.splitlines():
+            entries[path] = text
+    return entries
+
+
+def _desktop_entry_icon(text):
+    return next((line[len('Icon='):] for line in text.splitlines() if line.startswith('Icon=')), '')
+
+
+def refresh_desktop_database(desktop_dir):
+    command = shutil.which('update-desktop-database')
+    if command:
+        subprocess.run([command, str(desktop_dir)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+
+
+def sync_kde_game_entries(entries, config, desktop_dir=None, prune=True):
+    """
+    Reconciles Heirloom's KDE menu entries with the given installed games: writes only entries whose
+    contents changed, removes X-HeirloomGame entries for games not in the list (when prune is set), and
+    refreshes the desktop database once if anything changed. Entries without an icon keep the icon of
+    the file they replace.
+    """
+    desktop_dir = Path(desktop_dir) if desktop_dir else kde_applications_dir()
+    desktop_dir.mkdir(parents=True, exist_ok=True)
+    existing = existing_kde_game_entries(desktop_dir)
+    desired = {}
+    for entry in entries:
+        path = kde_game_entry_path(desktop_dir, entry['game_name'])
+        icon_path = icon_path_from_uri(entry.get('icon_path', ''))
+        if not icon_path and path in existing:
+            icon_path = _desktop_entry_icon(existing[path])
+        desired[path] = kde_game_entry_text(entry['game_name'], config, entry['executable'], icon_path, entry.get('wine_prefix'))
+    written = []
+    removed = []
+    for path, text in desired.items():
+        if existing.get(path) != text:
+            atomic_write_bytes(path, text.encode('utf-8'), mode=0o644)
+            written.append(path)
+    if prune:
+        for path in existing.keys() - desired.keys():
+            path.unlink(missing_ok=True)
+            removed.append(path)
+    if written or removed:
+        refresh_desktop_database(desktop_dir)
+    return {'entries': list(desired), 'written': written, 'removed': removed}
+
+
 def steam_userdata_config_dirs():
     roots = [
         Path('~/.steam/steam/userdata').expanduser(),
@@ -85,65 +196,211 @@ def steam_userdata_config_dirs():
     return dirs
 
 
+VDF_MAP = 0x00
+VDF_STRING = 0x01
+VDF_INT32 = 0x02
+VDF_FLOAT32 = 0x03
+VDF_POINTER = 0x04
+VDF_WIDE_STRING = 0x05
+VDF_COLOR = 0x06
+VDF_UINT64 = 0x07
+VDF_END = 0x08
+VDF_INT64 = 0x0A
+VDF_END_ALT = 0x0B
+
+_INT32 = struct.Struct('<i')
+_UINT32 = struct.Struct('<I')
+_FLOAT32 = struct.Struct('<f')
+_UINT64 = struct.Struct('<Q')
+_INT64 = struct.Struct('<q')
+
+
+class VdfFloat(float):
+    pass
+
+
+class VdfPointer(int):
+    pass
+
+
+class VdfColor(int):
+    pass
+
+
+class VdfUInt64(int):
+    pass
+
+
+class VdfInt64(int):
+    pass
+
+
+class VdfWideString(str):
+    pass
+
+
 class BinaryVdfReader:
+    """
+    Decodes Steam's binary KeyValues format in a single pass over one immutable buffer, without
+    recursion or per-field method calls. Every field type is preserved so fields Heirloom does not use
+    survive a read/write round trip.
+    """
     def __init__(self, data):
-        self.data = data
+        self.data = data if isinstance(data, bytes) else bytes(data)
         self.offset = 0
 
-    def read_cstring(self):
-        end = self.data.index(b'\x00', self.offset)
-        value = self.data[self.offset:end].decode('utf-8', errors='replace')
-        self.offset = end + 1
-        return value
-
-    def read_int(self):
-        value = struct.unpack_from('<i', self.data, self.offset)[0]
-        self.offset += 4
-        return value
-
     def read_object(self):
-        result = {}
-        while self.offset < len(self.data):
-            kind = self.data[self.offset]
-            self.offset += 1
-            if kind == 0x08:
-                break
-            key = self.read_cstring()
-            if kind == 0x00:
-                result[key] = self.read_object()
-            elif kind == 0x01:
-                result[key] = self.read_cstring()
-            elif kind == 0x02:
-                result[key] = self.read_int()
-            else:
-                raise ValueError(f'Unsupported binary VDF field type: {kind}')
-        return result
+        data = self.data
+        find = data.find
+        size = len(data)
+        offset = self.offset
+        root = result = {}
+        stack = []
+        closed = False
+        try:
+            while offset < size:
+                kind = data[offset]
+                offset += 1
+                if kind == VDF_END or kind == VDF_END_ALT:
+                    if not stack:
+                        closed = True
+                        break
+                    result = stack.pop()
+                    continue
+                end = find(b'\x00', offset)
+                if end < 0:
+                    raise ValueError(f'Unterminated key at offset {offset}')
+                key = data[offset:end].decode('utf-8', 'surrogateescape')
+                offset = end + 1
+                if kind == VDF_STRING:
+                    end = find(b'\x00', offset)
+                    if end < 0:
+                        raise ValueError(f'Unterminated string at offset {offset}')
+                    result[key] = data[offset:end].decode('utf-8', 'surrogateescape')
+                    offset = end + 1
+                elif kind == VDF_INT32:
+                    result[key] = _INT32.unpack_from(data, offset)[0]
+                    offset += 4
+                elif kind == VDF_MAP:
+                    child = result[key] = {}
+                    stack.append(result)
+                    result = child
+                elif kind == VDF_FLOAT32:
+                    result[key] = VdfFloat(_FLOAT32.unpack_from(data, offset)[0])
+                    offset += 4
+                elif kind == VDF_POINTER:
+                    result[key] = VdfPointer(_UINT32.unpack_from(data, offset)[0])
+                    offset += 4
+                elif kind == VDF_COLOR:
+                    result[key] = VdfColor(_UINT32.unpack_from(data, offset)[0])
+                    offset += 4
+                elif kind == VDF_UINT64:
+                    result[key] = VdfUInt64(_UINT64.unpack_from(data, offset)[0])
+                    offset += 8
+                elif kind == VDF_INT64:
+                    result[key] = VdfInt64(_INT64.unpack_from(data, offset)[0])
+                    offset += 8
+                elif kind == VDF_WIDE_STRING:
+                    end = offset
+                    while True:
+                        end = find(b'\x00\x00', end)
+                        if end < 0:
+                            raise ValueError(f'Unterminated wide string at offset {offset}')
+                        if (end - offset) % 2 == 0:
+                            break
+                        end += 1
+                    result[key] = VdfWideString(data[offset:end].decode('utf-16-le', 'surrogatepass'))
+                    offset = end + 2
+                else:
+                    raise ValueError(f'Unsupported binary VDF field type {kind:#04x} at offset {offset - 1}')
+        except struct.error as exc:
+            raise ValueError(f'Truncated binary VDF data: {exc}') from exc
+        # Data that ends at a field boundary would otherwise come back as a partial object.
+        if stack or not closed:
+            raise ValueError(f'Truncated binary VDF data: {len(stack) + 1} map(s) still open at offset {offset}')
+        self.offset = offset
+        return root
+
+
+def read_binary_vdf(data):
+    return BinaryVdfReader(data).read_object()
 
 
 def read_shortcuts(path):
+    """
+    Reads a shortcuts.vdf file. Unreadable files are backed up once and reported with ValueError rather
+    than being treated as empty, so callers never overwrite shortcuts they could not parse.
+    """
     if not path.is_file() or path.stat().st_size == 0:
         return {'shortcuts': {}}
+    data = path.read_bytes()
     try:
-        reader = BinaryVdfReader(path.read_bytes())
-        return reader.read_object()
-    except Exception:
+        return read_binary_vdf(data)
+    except (ValueError, struct.error) as exc:
         backup = path.with_suffix('.vdf.heirloom-backup')
         if not backup.exists():
-            backup.write_bytes(path.read_bytes())
-        return {'shortcuts': {}}
+            backup.write_bytes(data)
+        raise ValueError(f'Unable to parse {path}: {exc}') from exc
+
+
+_VDF_KINDS = {
+    dict: VDF_MAP,
+    str: VDF_STRING,
+    int: VDF_INT32,
+    bool: VDF_INT32,
+    float: VDF_FLOAT32,
+    VdfFloat: VDF_FLOAT32,
+    VdfPointer: VDF_POINTER,
+    VdfWideString: VDF_WIDE_STRING,
+    VdfColor: VDF_COLOR,
+    VdfUInt64: VDF_UINT64,
+    VdfInt64: VDF_INT64,
+}
+
+
+def _vdf_kind(value):
+    kind = _VDF_KINDS.get(type(value))
+    if kind is not None:
+        return kind
+    for value_type, kind in reversed(_VDF_KINDS.items()):
+        if isinstance(value, value_type):
+            return kind
+    return None
+
+
+def _write_vdf_items(output, items):
+    for key, value in items.items():
+        kind = _vdf_kind(value)
+        if kind is None:
+            kind = VDF_STRING
+            value = str(value)
+        output.append(kind)
+        output += str(key).encode('utf-8', 'surrogateescape')
+        output.append(0)
+        if kind == VDF_STRING:
+            output += value.encode('utf-8', 'surrogateescape')
+            output.append(0)
+        elif kind == VDF_INT32:
+            output += _INT32.pack(value)
+        elif kind == VDF_MAP:
+            _write_vdf_items(output, value)
+        elif kind == VDF_FLOAT32:
+            output += _FLOAT32.pack(value)
+        elif kind == VDF_POINTER or kind == VDF_COLOR:
+            output += _UINT32.pack(value)
+        elif kind == VDF_WIDE_STRING:
+            output += value.encode('utf-16-le', 'surrogatepass')
+            output += b'\x00\x00'
+        elif kind == VDF_UINT64:
+            output += _UINT64.pack(value)
+        else:
+            output += _INT64.pack(value)
+    output.append(VDF_END)
 
 
 def write_binary_vdf_object(items):
     output = bytearray()
-    for key, value in items.items():
-        encoded_key = str(key).encode('utf-8') + b'\x00'
-        if isinstance(value, dict):
-            output.extend(b'\x00' + encoded_key + write_binary_vdf_object(value))
-        elif isinstance(value, int):
-            output.extend(b'\x02' + encoded_key + struct.pack('<i', value))
-        else:
-            output.extend(b'\x01' + encoded_key + str(value).encode('utf-8') + b'\x00')
-    output.extend(b'\x08')
+    _write_vdf_items(output, items)
     return bytes(output)
 
 
@@ -158,14 +415,26 @@ def shortcut_app_id(app_name, exe):
     return signed_int32(zlib.crc32((exe + app_name).encode('utf-8')) | 0x80000000)
 
 
-def steam_shortcut_fields(game_name, config, executable, start_dir='', icon_path=''):
+# Written to DevkitGameID on every shortcut Heirloom creates. Steam leaves DevkitGameID empty on the shortcuts users
+# add themselves, so an empty value alone says nothing about who owns an entry.
+STEAM_SHORTCUT_MARKER = 'heirloom'
+STEAM_SHORTCUT_TAG = 'Heirloom'
+
+
+def steam_shortcut_fields(game_name, config, executable, start_dir='', icon_path='', prefix=None):
     runner = config.get('wine_runner', 'native')
     if runner == 'flatpak':
         exe = config.get('flatpak_path') or 'flatpak'
-        launch_options = ' '.join(shlex.quote(part) for part in ['run', config.get('wine_flatpak_app') or 'org.winehq.Wine', executable])
+        launch_options = ' '.join(
+            shlex.quote(part)
+            for part in ['run', *flatpak_prefix_args(prefix), config.get('wine_flatpak_app') or 'org.winehq.Wine', executable]
+        )
     else:
         exe = config.get('wine_path') or 'wine'
         launch_options = shlex.quote(executable)
+        if prefix:
+            # Steam substitutes %command% with Exe, so the variable is set for Wine itself.
+            launch_options = f'WINEPREFIX={shlex.quote(str(prefix))} %command% {launch_options}'
     return {
         'appid': shortcut_app_id(game_name, exe),
         'AppName': game_name,
@@ -179,37 +448,158 @@ def steam_shortcut_fields(game_name, config, executable, start_dir='', icon_path
         'AllowOverlay': 1,
         'OpenVR': 0,
         'Devkit': 0,
-        'DevkitGameID': '',
+        'DevkitGameID': STEAM_SHORTCUT_MARKER,
         'LastPlayTime': 0,
-        'tags': {'0': 'Heirloom'},
+        'tags': {'0': STEAM_SHORTCUT_TAG},
     }
 
 
-def write_steam_shortcut(game_name, config, executable, start_dir='', icon_path=''):
+# The fields Heirloom sets on a shortcut it already manages; the launch command lives in LaunchOptions. Everything
+# else (collections in tags, hidden, overlay, play time, fields newer Steam versions add) belongs to Steam and the
+# user and is left as it is.
+STEAM_SHORTCUT_MANAGED_FIELDS = ('appid', 'AppName', 'Exe', 'StartDir', 'icon', 'LaunchOptions', 'DevkitGameID')
+
+
+def _is_managed_shortcut(shortcut):
+    devkit_game_id = shortcut.get('DevkitGameID', '')
+    if devkit_game_id == STEAM_SHORTCUT_MARKER:
+        return True
+    # Older versions left DevkitGameID empty; their shortcuts are recognised by the Heirloom tag instead.
+    tags = shortcut.get('tags')
+    return devkit_game_id == '' and isinstance(tags, dict) and STEAM_SHORTCUT_TAG in tags.values()
+
+
+@timed()
+def apply_steam_shortcut_changes(upserts=(), removals=(), config_dirs=None):
+    """
+    Applies a batch of shortcut upserts (field dicts from steam_shortcut_fields) and removals (app names)
+    to every Steam user's shortcuts.vdf with a single parse and a single atomic write per file. An upsert of
+    a shortcut that exists only updates STEAM_SHORTCUT_MANAGED_FIELDS, and a file nothing changed in is not
+    written.
+    """
+    upserts = list(upserts)
+    removals = set(removals)
     written = []
-    for config_dir in steam_userdata_config_dirs():
-        shortcuts_path = config_dir / 'shortcuts.vdf'
-        data = read_shortcuts(shortcuts_path)
+    if not upserts and not removals:
+        return written
+    for config_dir in (steam_userdata_config_dirs() if config_dirs is None else config_dirs):
+        shortcuts_path = Path(config_dir) / 'shortcuts.vdf'
+        try:
+            data = read_shortcuts(shortcuts_path)
+        except ValueError:
+            continue
         shortcuts = data.setdefault('shortcuts', {})
-        target = steam_shortcut_fields(game_name, config, executable, start_dir=start_dir, icon_path=icon_path)
-        existing_key = None
+        by_name = {}
+        by_appid = {}
         for key, shortcut in shortcuts.items():
-            if shortcut.get('AppName') == game_name and shortcut.get('DevkitGameID', '') in ('', 'heirloom'):
-                existing_key = key
-                break
-        if existing_key is None:
-            existing_key = str(max([int(key) for key in shortcuts.keys() if str(key).isdigit()] or [-1]) + 1)
-        shortcuts[existing_key] = target
-        shortcuts_path.write_bytes(write_binary_vdf_object(data))
+            if isinstance(shortcut, dict) and _is_managed_shortcut(shortcut):
+                by_name.setdefault(shortcut.get('AppName'), key)
+                by_appid.setdefault(shortcut.get('appid'), key)
+        changed = False
+        for app_name in removals:
+            key = by_name.pop(app_name, None)
+            if key is not None and key in shortcuts:
+                del shortcuts[key]
+                changed = True
+        next_key = max([int(key) for key in shortcuts.keys() if str(key).isdigit()] or [-1]) + 1
+        for target in upserts:
+            key = by_appid.get(target['appid'])
+            if key is None or key not in shortcuts:
+                key = by_name.get(target['AppName'])
+            if key is None or key not in shortcuts:
+                key = str(next_key)
+                next_key += 1
+            existing = shortcuts.get(key)
+            if existing:
+                target = dict(existing, **{field: target[field] for field in STEAM_SHORTCUT_MANAGED_FIELDS})
+            if existing != target:
+                shortcuts[key] = target
+                changed = True
+            by_name[target['AppName']] = key
+            by_appid[target['appid']] = key
+        if not changed:
+            continue
+        data['shortcuts'] = {str(index): shortcut for index, shortcut in enumerate(shortcuts.values())}
+        atomic_write_bytes(shortcuts_path, write_binary_vdf_object(data))
         written.append(shortcuts_path)
     return written
 
 
-def add_installed_game_integrations(game_name, config, executable, install_dir='', icon_path=''):
+def write_steam_shortcut(game_name, config, executable, start_dir='', icon_path='', prefix=None):
+    target = steam_shortcut_fields(game_name, config, executable, start_dir=start_dir, icon_path=icon_path, prefix=prefix)
+    return apply_steam_shortcut_changes(upserts=[target])
+
+
+def remove_steam_shortcuts(game_names):
+    return apply_steam_shortcut_changes(removals=game_names)
+
+
+@timed()
+def add_installed_games_integrations(entries, config):
+    """
+    Registers several installed games at once. Each entry is a dict with game_name, executable and
+    optionally install_dir, icon_path and wine_prefix.
+    """
     results = {}
-    icon_path = icon_path_from_uri(icon_path)
+    entries = [
+        dict(entry, icon_path=icon_path_from_uri(entry.get('icon_path', '')))
+        for entry in entries
+        if entry.get('executable') and entry['executable'] != NOT_INSTALLED
+    ]
+    if not entries:
+        return results
     if truthy(config.get('auto_add_kde')):
-        results['kde'] = [write_kde_game_entry(game_name, config, executable, icon_path=icon_path)]
+        results['kde'] = sync_kde_game_entries(entries, config, prune=False)['entries']
     if truthy(config.get('auto_add_steam')):
-        results['steam'] = write_steam_shortcut(game_name, config, executable, start_dir=install_dir, icon_path=icon_path)
+        results['steam'] = apply_steam_shortcut_changes(
+            upserts=[
+                steam_shortcut_fields(
+                    entry['game_name'],
+                    config,
+                    entry['executable'],
+                    start_dir=entry.get('install_dir', ''),
+                    icon_path=entry['icon_path'],
+                    prefix=entry.get('wine_prefix'),
+                )
+                for entry in entries
+            ]
+        )
+    return results
+
+
+def add_installed_game_integrations(game_name, config, executable, install_dir='', icon_path='', wine_prefix=''):
+    return add_installed_games_integrations(
+        [{'game_name': game_name, 'executable': executable, 'install_dir': install_dir, 'icon_path': icon_path, 'wine_prefix': wine_prefix}],
+        config,
+    )
+
+
+def remove_installed_game_integrations(game_name, config):
+    results = {}
+    if truthy(config.get('auto_add_steam')):
+        results['steam'] = remove_steam_shortcuts([game_name])
+    return results
+
+
+@timed()
+def sync_installed_game_integrations(db, config, library_uuids=None):
+    """
+    Brings menu entries in line with games.db: every installed game with a recorded executable gets an
+    entry, and stale Heirloom entries are removed. If library_uuids is given, games that are no longer
+    in the library are treated as gone.
+    """
+    results = {}
+    if not truthy(config.get('auto_add_kde')):
+        return results
+    entries = [
+        {
+            'game_name': record['name'],
+            'executable': record['executable'],
+            'install_dir': convert_to_unix_path(record['install_dir']),
+            'wine_prefix': record['wine_prefix'],
+        }
+        for record in read_installed_game_records(db)
+        if library_uuids is None or record['uuid'] in library_uuids
+    ]
+    results['kde'] = sync_kde_game_entries(entries, config)
     return results
@@ -2,10 +2,8 @@ from cryptography.fernet import Fernet
 import base64
 from pathlib import Path
 
-try:
-    import keyring
-except ModuleNotFoundError:
-    keyring = None
+from ..profiling import timed
+
 
 
 SERVICE_NAME = 'heirloom-gm'
@@ -15,6 +13,15 @@ LEGACY_KEY_NAME = 'heirloom-encryption-key'
 FALLBACK_KEY_FILE = Path('~/.config/heirloom/encryption.key').expanduser()
 
 
+def _keyring():
+    # keyring loads its backends on import, which is slow, so it is only imported once a key is needed.
+    try:
+        import keyring
+    except ModuleNotFoundError:
+        return None
+    return keyring
+
+
 def _store_key_file(key):
     FALLBACK_KEY_FILE.parent.mkdir(parents=True, exist_ok=True)
     FALLBACK_KEY_FILE.write_text(base64.b64encode(key).decode('utf-8'))
@@ -27,8 +34,10 @@ def _read_key_file():
     return None
 
 
+@timed()
 def set_encryption_key():
     key = Fernet.generate_key()
+    keyring = _keyring()
     try:
         if keyring is None:
             raise RuntimeError('keyring is not available')
@@ -37,7 +46,9 @@ def set_encryption_key():
         _store_key_file(key)
 
 
+@timed()
 def get_encryption_key():
+    keyring = _keyring()
     if keyring is not None:
         for service_name, key_name in (
             (SERVICE_NAME, KEY_NAME),
@@ -52,6 +63,7 @@ def get_encryption_key():
     return _read_key_file()
 
 
+@timed()
 def encrypt_password(password):
     key = get_encryption_key()
     f = Fernet(key)
@@ -59,6 +71,7 @@ def encrypt_password(password):
     return token
 
 
+@timed()
 def decrypt_password(password):
     key = get_encryption_key()
     f = Fernet(key)
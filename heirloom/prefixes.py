@@ -0,0 +1,86 @@
+import errno
+import fcntl
+import os
+import shutil
+from pathlib import Path
+
+
+# ioctl(dest_fd, FICLONE, src_fd) shares the source extents copy-on-write (btrfs, XFS, bcachefs).
+FICLONE = 0x40049409
+
+CLONE_AUTO = 'auto'
+CLONE_HARDLINK = 'hardlink'
+CLONE_COPY = 'copy'
+CLONE_MODES = (CLONE_AUTO, CLONE_HARDLINK, CLONE_COPY)
+
+TEMPLATE_PREFIX_NAME = '_template'
+
+UNSUPPORTED_REFLINK_ERRORS = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EPERM)
+
+
+def reflink_file(source, target):
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, target)
+
+
+def _is_private_file(relative_path):
+    """
+    Files that Wine or game installers modify in place must never share an inode with the template:
+    the registry hives and everything under the per-user profile.
+    """
+    parts = relative_path.parts
+    return relative_path.suffix == '.reg' or parts[:2] == ('drive_c', 'users')
+
+
+def clone_tree(source, target, mode=CLONE_AUTO):
+    """
+    Recreates the source tree at target. In auto mode every file is reflinked where the filesystem supports
+    it and copied otherwise; hardlink mode links every file except the private ones (see _is_private_file),
+    falling back to a copy across filesystems. Symlinks are recreated as-is. Returns how many files were
+    cloned each way.
+    """
+    if mode not in CLONE_MODES:
+        raise ValueError(f'Invalid prefix clone mode ("{mode}"); valid modes are: {list(CLONE_MODES)}')
+    source = Path(source)
+    target = Path(target)
+    counts = {'reflink': 0, 'hardlink': 0, 'copy': 0}
+    try_reflink = mode == CLONE_AUTO
+    try_hardlink = mode == CLONE_HARDLINK
+    for root, dirs, files in os.walk(source):
+        relative_root = Path(root).relative_to(source)
+        target_root = target / relative_root
+        target_root.mkdir(parents=True, exist_ok=True)
+        shutil.copymode(root, target_root)
+        for name in list(dirs):
+            if os.path.islink(os.path.join(root, name)):
+                dirs.remove(name)
+                files.append(name)
+        for name in files:
+            source_path = os.path.join(root, name)
+            target_path = target_root / name
+            if os.path.islink(source_path):
+                os.symlink(os.readlink(source_path), target_path)
+                continue
+            if try_hardlink and not _is_private_file(relative_root / name):
+                try:
+                    os.link(source_path, target_path)
+                    counts['hardlink'] += 1
+                    continue
+                except OSError as exc:
+                    if exc.errno != errno.EXDEV:
+                        raise
+                    try_hardlink = False
+            if try_reflink:
+                try:
+                    reflink_file(source_path, target_path)
+                    counts['reflink'] += 1
+                    continue
+                except OSError as exc:
+                    if exc.errno not in UNSUPPORTED_REFLINK_ERRORS:
+                        raise
+                    # One refusal means the filesystem cannot reflink; stop asking for the rest of the tree.
+                    try_reflink = False
+            shutil.copy2(source_path, target_path)
+            counts['copy'] += 1
+    return counts
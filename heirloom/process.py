@@ -0,0 +1,136 @@
+import os
+import re
+import selectors
+import shlex
+import subprocess
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from .profiling import timed
+
+
+DEFAULT_TAIL_LINES = 200
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 2
+
+# 7-Zip redraws its progress line with backspaces or carriage returns instead of newlines.
+_LINE_BREAKS = re.compile(rb'[\r\n\b]+')
+_PERCENT = re.compile(r'^\s*(\d{1,3})%')
+
+
+class RotatingLog(object):
+    """
+    An append-only text log that rolls over to path.1 .. path.N once it grows past max_bytes.
+    """
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        self.path = Path(path)
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open('ab')
+
+    def write_line(self, line):
+        data = line.encode('utf-8', errors='replace') + b'\n'
+        if self._file.tell() and self._file.tell() + len(data) > self._max_bytes:
+            self._rotate()
+        self._file.write(data)
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self._backups, 0, -1):
+            source = self.path if index == 1 else self.path.with_name(f'{self.path.name}.{index - 1}')
+            if source.exists():
+                os.replace(source, self.path.with_name(f'{self.path.name}.{index}'))
+        self._file = self.path.open('ab')
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StreamedResult(object):
+    __slots__ = ('args', 'returncode', 'stdout', 'stderr')
+
+    def __init__(self, args, returncode, stdout, stderr):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+def parse_percent(line):
+    match = _PERCENT.match(line)
+    return min(100, int(match.group(1))) if match else None
+
+
+@timed()
+def run_streamed(command, log=None, on_line=None, timeout=None, should_stop=None, tail_lines=DEFAULT_TAIL_LINES, poll_interval=0.2):
+    """
+    Runs command, reading stdout and stderr as they are produced instead of buffering them. Every line
+    goes to log (a RotatingLog) and to on_line(stream, line); only the last tail_lines lines of each
+    stream are kept for the result. should_stop() is polled between reads and may raise to abort the run;
+    the process is killed before the exception propagates, as it is on timeout (subprocess.TimeoutExpired).
+    """
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    tails = {'stdout': deque(maxlen=tail_lines), 'stderr': deque(maxlen=tail_lines)}
+    pending = {'stdout': b'', 'stderr': b''}
+    deadline = time.monotonic() + timeout if timeout else None
+    if log:
+        log.write_line(f'--- {datetime.now().isoformat(timespec="seconds")} {shlex.join(str(part) for part in command)}')
+    selector = selectors.DefaultSelector()
+    selector.register(process.stdout, selectors.EVENT_READ, 'stdout')
+    selector.register(process.stderr, selectors.EVENT_READ, 'stderr')
+
+    def emit(stream, raw):
+        line = raw.decode('utf-8', errors='replace').rstrip()
+        if not line:
+            return
+        tails[stream].append(line)
+        if log:
+            log.write_line(line if stream == 'stdout' else f'[stderr] {line}')
+        if on_line:
+            on_line(stream, line)
+
+    try:
+        while selector.get_map():
+            if should_stop:
+                should_stop()
+            if deadline is not None and time.monotonic() > deadline:
+                raise subprocess.TimeoutExpired(command, timeout, output='\n'.join(tails['stdout']), stderr='\n'.join(tails['stderr']))
+            for key, _ in selector.select(poll_interval):
+                stream = key.data
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    emit(stream, pending[stream])
+                    pending[stream] = b''
+                    continue
+                pieces = _LINE_BREAKS.split(pending[stream] + chunk)
+                pending[stream] = pieces.pop()
+                if len(pending[stream]) > 65536:
+                    pieces.append(pending[stream])
+                    pending[stream] = b''
+                for piece in pieces:
+                    emit(stream, piece)
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            returncode = process.wait(timeout=remaining)
+        except subprocess.TimeoutExpired:
+            raise subprocess.TimeoutExpired(command, timeout, output='\n'.join(tails['stdout']), stderr='\n'.join(tails['stderr']))
+    finally:
+        selector.close()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+        if log:
+            log.write_line(f'--- {datetime.now().isoformat(timespec="seconds")} exit status {process.returncode}')
+    return StreamedResult(command, returncode, '\n'.join(tails['stdout']), '\n'.join(tails['stderr']))
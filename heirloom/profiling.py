@@ -0,0 +1,164 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_roots = []
+_NULL_SPAN = nullcontext()
+
+
+class Span(object):
+    """One timed phase. Spans opened while another is open on the same thread become its children."""
+    __slots__ = ('name', 'attrs', 'start', 'end', 'thread', 'children')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+        self.end = None
+        self.thread = threading.get_ident()
+        self.children = []
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        if stack:
+            stack[-1].children.append(self)
+        else:
+            with _lock:
+                _roots.append(self)
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end = time.perf_counter()
+        stack = _local.stack
+        if stack and stack[-1] is self:
+            stack.pop()
+        return False
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        del _roots[:]
+    _local.stack = []
+
+
+def span(name, **attrs):
+    """
+    Times a block while profiling is enabled; otherwise returns a shared no-op context, so spans can stay
+    in hot paths.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def timed(name=None):
+    """Decorator form of span(), named after the function unless a name is given."""
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(label, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def root_spans():
+    with _lock:
+        return list(_roots)
+
+
+def _aggregate(spans):
+    groups = {}
+    for each in spans:
+        group = groups.setdefault(each.name, [0, 0.0, []])
+        group[0] += 1
+        group[1] += each.duration
+        group[2].extend(each.children)
+    return groups
+
+
+def report_lines(spans=None):
+    """
+    The span tree as (depth, name, count, total_seconds) rows, with same-named siblings merged (fifty
+    read_game_record calls become one row) and rows in the order they first started.
+    """
+    rows = []
+
+    def walk(spans, depth):
+        for name, (count, total, children) in _aggregate(spans).items():
+            rows.append((depth, name, count, total))
+            walk(children, depth + 1)
+
+    walk(root_spans() if spans is None else spans, 0)
+    return rows
+
+
+def format_report(spans=None):
+    lines = [f'{"time":>12} {"calls":>6}  phase']
+    for depth, name, count, total in report_lines(spans):
+        lines.append(f'{total * 1000:9.1f} ms {count:6}  {"  " * depth}{name}')
+    return '\n'.join(lines)
+
+
+def trace_events(spans=None):
+    """Spans as Chrome trace events, which Perfetto, speedscope and chrome://tracing can load."""
+    pid = os.getpid()
+    events = []
+
+    def walk(spans):
+        for each in spans:
+            events.append({
+                'name': each.name,
+                'ph': 'X',
+                'ts': round(each.start * 1e6, 3),
+                'dur': round(each.duration * 1e6, 3),
+                'pid': pid,
+                'tid': each.thread,
+                'args': {key: str(value) for key, value in each.attrs.items()},
+            })
+            walk(each.children)
+
+    walk(root_spans() if spans is None else spans)
+    return events
+
+
+def write_trace(path, spans=None):
+    path = Path(path).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('w') as f:
+        json.dump({'traceEvents': trace_events(spans), 'displayTimeUnit': 'ms'}, f)
+    return path
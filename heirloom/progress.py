@@ -0,0 +1,189 @@
+import re
+import time
+
+
+DOWNLOAD = 'download'
+EXTRACT = 'extract'
+REGISTER = 'register'
+
+DEFAULT_INTERVAL = 0.1
+DEFAULT_SMOOTHING = 0.3
+
+_SIZE = re.compile(r'^\s*([\d.,]+)\s*([KMGT]?i?B?)\s*$', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+class ProgressEvent(object):
+    __slots__ = ('phase', 'description', 'completed', 'total', 'rate', 'smoothed_rate', 'eta', 'finished')
+
+    def __init__(self, phase, description, completed, total, rate, smoothed_rate, eta, finished):
+        self.phase = phase
+        self.description = description
+        self.completed = completed
+        self.total = total
+        self.rate = rate
+        self.smoothed_rate = smoothed_rate
+        self.eta = eta
+        self.finished = finished
+
+    @property
+    def fraction(self):
+        if not self.total:
+            return -1.0
+        return min(1.0, self.completed / self.total)
+
+    def __repr__(self):
+        return (
+            f'ProgressEvent(phase={self.phase!r}, completed={self.completed}, total={self.total}, '
+            f'rate={self.rate:.0f}, smoothed_rate={self.smoothed_rate:.0f}, eta={self.eta}, finished={self.finished})'
+        )
+
+
+class ProgressReporter(object):
+    """
+    Turns raw per-chunk progress updates into ProgressEvents, delivered to every sink at most once per
+    interval (plus a final event from finish()). Throughput is tracked both as the rate since the previous
+    event and as an exponentially smoothed rate used for the ETA.
+    """
+    def __init__(self, sinks, phase, total=0, description='', interval=DEFAULT_INTERVAL, smoothing=DEFAULT_SMOOTHING, clock=time.monotonic):
+        if callable(sinks):
+            sinks = [sinks]
+        self._sinks = [s for s in (sinks or []) if s]
+        self._phase = phase
+        self._description = description
+        self._interval = interval
+        self._smoothing = smoothing
+        self._clock = clock
+        self.total = total or 0
+        self.completed = 0
+        self._started = clock()
+        self._last_emit = None
+        self._last_completed = 0
+        self._smoothed_rate = 0.0
+
+    def advance(self, amount):
+        self.update(self.completed + amount)
+
+    def update(self, completed, total=None):
+        self.completed = completed
+        if total is not None:
+            self.total = total
+        now = self._clock()
+        if self._last_emit is not None and now - self._last_emit < self._interval:
+            return
+        self._emit(now, finished=False)
+
+    def finish(self):
+        self._emit(self._clock(), finished=True)
+
+    def _emit(self, now, finished):
+        if not self._sinks:
+            return
+        since = now - (self._last_emit if self._last_emit is not None else self._started)
+        rate = (self.completed - self._last_completed) / since if since > 0 else 0.0
+        if self._last_emit is None or self._smoothed_rate == 0.0:
+            self._smoothed_rate = rate
+        else:
+            self._smoothed_rate = self._smoothing * rate + (1 - self._smoothing) * self._smoothed_rate
+        eta = None
+        if self.total and self._smoothed_rate > 0:
+            eta = max(0.0, (self.total - self.completed) / self._smoothed_rate)
+        self._last_emit = now
+        self._last_completed = self.completed
+        event = ProgressEvent(self._phase, self._description, self.completed, self.total, rate, self._smoothed_rate, eta, finished)
+        for sink in self._sinks:
+            sink(event)
+
+
+class RichProgressBar(object):
+    """
+    A ProgressReporter sink that renders events with a rich progress bar. Use as a context manager.
+    """
+    def __init__(self, description):
+        from rich.progress import BarColumn, Progress, TaskProgressColumn, TextColumn
+
+        self._progress = Progress(
+            TextColumn('[progress.description]{task.description}'),
+            BarColumn(),
+            TaskProgressColumn(),
+            TextColumn('{task.fields[rate]}'),
+            TextColumn('{task.fields[eta]}'),
+        )
+        self._task = self._progress.add_task(description, total=None, rate='', eta='')
+
+    def __enter__(self):
+        self._progress.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._progress.stop()
+
+    def __call__(self, event):
+        self._progress.update(
+            self._task,
+            completed=event.completed,
+            total=event.total or None,
+            rate=format_rate(event.smoothed_rate),
+            eta=format_eta(event.eta),
+        )
+
+
+def format_bytes(value):
+    value = float(value or 0)
+    if value < 1024:
+        return f'{int(value)} B'
+    for unit in ('KB', 'MB'):
+        value /= 1024
+        if value < 1024:
+            return f'{value:.1f} {unit}'
+    return f'{value / 1024:.1f} GB'
+
+
+def parse_size(value):
+    """
+    Parses catalog sizes such as '1.2 GB', '850MB' or '1,024 KB' into bytes. Returns 0 when the value is
+    missing or not understood.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _SIZE.match(str(value or ''))
+    if not match:
+        return 0
+    try:
+        number = float(match.group(1).replace(',', ''))
+    except ValueError:
+        return 0
+    return int(number * _SIZE_UNITS[match.group(2)[:1].upper()])
+
+
+def format_rate(rate):
+    if not rate:
+        return ''
+    return f'{format_bytes(rate)}/s'
+
+
+def format_duration(duration):
+    if duration is None:
+        return ''
+    minutes, seconds = divmod(int(duration), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes}:{seconds:02d}'
+
+
+def format_eta(eta):
+    if eta is None:
+        return ''
+    return f'{format_duration(eta)} left'
+
+
+def format_progress(event):
+    if event.total:
+        parts = [f'{format_bytes(event.completed)} of {format_bytes(event.total)}']
+    else:
+        parts = [f'{format_bytes(event.completed)}']
+    for extra in (format_rate(event.smoothed_rate), format_eta(event.eta)):
+        if extra:
+            parts.append(extra)
+    return '  '.join(parts)
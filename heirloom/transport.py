@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_BACKOFF_JITTER = 0.5
+DEFAULT_MAX_RETRY_AFTER = 60
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = frozenset({'GET', 'HEAD'})
+
+# What iter_content raises when a response body breaks off: a reset or dropped connection, or a read timeout.
+BODY_ERRORS = (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError)
+
+# Config keys and the build_session arguments they set.
+TRANSPORT_SETTINGS = {
+    'http_pool_size': ('pool_size', int),
+    'http_retries': ('retries', int),
+    'http_backoff': ('backoff', float),
+    'http_backoff_jitter': ('backoff_jitter', float),
+    'http_max_retry_after': ('max_retry_after', float),
+}
+
+
+class TransportStats(object):
+    """
+    Counters for diagnostics: requests sent, retries (and how many were answers to 429), and how often and
+    for how long a request waited for a free pooled connection.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            'requests': counts.get('requests', 0),
+            'retries': counts.get('retries', 0),
+            'rate_limited': counts.get('rate_limited', 0),
+            'pool_waits': counts.get('pool_waits', 0),
+            'pool_wait_seconds': round(counts.get('pool_wait_seconds', 0), 3),
+        }
+
+
+class CountingRetry(Retry):
+    """
+    urllib3's Retry with up to jitter seconds of random jitter added to each backoff (so parallel
+    downloads that failed together do not retry in lockstep), Retry-After capped at max_retry_after, and
+    every retry counted in stats.
+    """
+    def __init__(self, *args, stats=None, jitter=0.0, max_retry_after=DEFAULT_MAX_RETRY_AFTER, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+        self.jitter = jitter
+        self.max_retry_after = max_retry_after
+
+    def new(self, **kw):
+        kw.setdefault('stats', self.stats)
+        kw.setdefault('jitter', self.jitter)
+        kw.setdefault('max_retry_after', self.max_retry_after)
+        return super().new(**kw)
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return backoff
+        return backoff + random.uniform(0, self.jitter)
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response=response, error=error, _pool=_pool, _stacktrace=_stacktrace)
+        if self.stats is not None:
+            self.stats.add('retries')
+            if response is not None and response.status == 429:
+                self.stats.add('rate_limited')
+        return retry
+
+
+def _counting_pool_class(base, stats):
+    class CountingPool(base):
+        def _get_conn(self, timeout=None):
+            if not (self.block and self.pool is not None and self.pool.empty()):
+                return super()._get_conn(timeout)
+            started = time.monotonic()
+            try:
+                return super()._get_conn(timeout)
+            finally:
+                stats.add('pool_waits')
+                stats.add('pool_wait_seconds', time.monotonic() - started)
+
+    CountingPool.__name__ = f'Counting{base.__name__}'
+    return CountingPool
+
+
+class CountingAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter whose pools block when all pool_size connections to a host are busy, so the pool size
+    bounds parallel downloads, and count how often that happens.
+    """
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool_class(HTTPConnectionPool, self.stats),
+            'https': _counting_pool_class(HTTPSConnectionPool, self.stats),
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.add('requests')
+        return super().send(request, **kwargs)
+
+
+def build_session(pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                  backoff_jitter=DEFAULT_BACKOFF_JITTER, max_retry_after=DEFAULT_MAX_RETRY_AFTER, stats=None):
+    """
+    A requests session that retries idempotent requests on connection errors and on 429 and 5xx answers,
+    with exponential backoff (backoff * 2 ** retry, plus jitter) or the server's Retry-After. Once retries
+    run out the last answer is returned, so raise_for_status() reports it as before.
+    """
+    stats = stats if stats is not None else TransportStats()
+    retry = CountingRetry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=RETRY_METHODS,
+        raise_on_status=False,
+        respect_retry_after_header=True,
+        stats=stats,
+        jitter=backoff_jitter,
+        max_retry_after=max_retry_after,
+    )
+    adapter = CountingAdapter(stats, pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session, stats
+
+
+def transport_settings(config):
+    settings = {}
+    for key, (name, convert) in TRANSPORT_SETTINGS.items():
+        value = config.get(key)
+        if value not in (None, ''):
+            settings[name] = convert(value)
+    return settings
@@ -0,0 +1,161 @@
+import errno
+import fcntl
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+
+TRASH_DIR_NAME = '.heirloom-trash'
+LOCK_NAME = '.lock'
+DEFAULT_DELETE_WORKERS = 8
+# Written to the Heirloom log directory by the background purge, only when something could not be deleted.
+TRASH_LOG_NAME = 'trash.log'
+
+
+def trash_dir(root):
+    return Path(root).expanduser() / TRASH_DIR_NAME
+
+
+def move_to_trash(path, root):
+    """
+    Renames path into root's trash directory and returns its new location. Raises OSError (EXDEV) if path
+    is not on the same filesystem as root.
+    """
+    trash = trash_dir(root)
+    trash.mkdir(parents=True, exist_ok=True)
+    target = trash / f'{Path(path).name}.{uuid.uuid4().hex[:12]}'
+    os.rename(path, target)
+    return target
+
+
+def _clear_directory(directory):
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                    continue
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+    except FileNotFoundError:
+        pass
+    return subdirectories
+
+
+def delete_tree(path, workers=DEFAULT_DELETE_WORKERS):
+    """
+    Deletes a directory tree, clearing directories in parallel (most of the cost on SD cards and network
+    filesystems is per-file latency, not bandwidth), then removing the emptied directories deepest first.
+    Symlinks are removed, never followed.
+    """
+    path = str(path)
+    if os.path.islink(path) or not os.path.isdir(path):
+        Path(path).unlink(missing_ok=True)
+        return
+    order = [path]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='heirloom-trash') as pool:
+        pending = {pool.submit(_clear_directory, path)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for subdirectory in future.result():
+                    order.append(subdirectory)
+                    pending.add(pool.submit(_clear_directory, subdirectory))
+    # Children are always listed after their parent.
+    for directory in reversed(order):
+        try:
+            os.rmdir(directory)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def purge_trash_dir(trash, errors=None):
+    """
+    Empties one trash directory. Only one process purges a given trash directory at a time; others return
+    False straight away. What could not be deleted is described in errors, when a list is given, and left
+    for the next purge.
+    """
+    errors = errors if errors is not None else []
+    trash = Path(trash)
+    try:
+        lock = open(trash / LOCK_NAME, 'w')
+    except FileNotFoundError:
+        return True
+    with lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as exc:
+            if exc.errno in (errno.EAGAIN, errno.EACCES):
+                return False
+            raise
+        previous = None
+        while True:
+            entries = sorted(entry for entry in trash.iterdir() if entry.name != LOCK_NAME)
+            if not entries:
+                return True
+            if entries == previous:
+                # Nothing could be deleted in the last pass; leave it for the next start.
+                errors.append(f'Left in {trash} until the next start: {", ".join(entry.name for entry in entries)}')
+                return False
+            for entry in entries:
+                try:
+                    delete_tree(entry)
+                except OSError as exc:
+                    errors.append(f'Could not delete {entry}: {exc}')
+            previous = entries
+
+
+def has_trash(root):
+    trash = trash_dir(root)
+    return trash.is_dir() and any(entry.name != LOCK_NAME for entry in trash.iterdir())
+
+
+def purge_trash_in_background(*roots, log_path=None):
+    """
+    Starts a detached process that empties the trash of each root that has any. It outlives the CLI or
+    GUI, so a large uninstall keeps being deleted after the command returns. Failures, and anything the
+    process itself prints, are appended to log_path; whatever is left is retried by the next purge.
+    """
+    trashes = [str(trash_dir(root)) for root in roots if root and has_trash(root)]
+    if not trashes:
+        return None
+    if log_path:
+        Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+        log = open(log_path, 'ab')
+    else:
+        log = subprocess.DEVNULL
+    try:
+        return subprocess.Popen(
+            [sys.executable, '-m', 'heirloom.trash', *trashes],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+    finally:
+        if log is not subprocess.DEVNULL:
+            log.close()
+
+
+def main(argv=None):
+    errors = []
+    for trash in (sys.argv[1:] if argv is None else argv):
+        purge_trash_dir(trash, errors)
+    stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+    for error in errors:
+        print(f'{stamp} {error}', file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
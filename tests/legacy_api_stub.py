@@ -0,0 +1,245 @@
+"""
+A local stand-in for api.legacygames.com and its CDN, for tests and benchmarks.
+
+    python tests/legacy_api_stub.py [--giveaways 500] [--products 50] [--installer-size 256MB] [--latency 0.05]
+
+Point Heirloom at it with api_url (for example `api_url = http://127.0.0.1:8000` in config.ini). Any
+username and password are accepted.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from heirloom.progress import parse_size
+
+
+USER_ID = 42
+EMAIL = 'player@example.com'
+CHUNK_BYTES = 64 * 1024
+
+
+def stub_game(index, prefix='Game', installed_size='1 MB'):
+    name = f'{prefix} {index}'
+    return {
+        'game_name': name,
+        'game_id': f'{prefix.lower()}-{index}',
+        'installer_uuid': f'{prefix.lower()}-uuid-{index}',
+        'game_description': f'Synthetic game number {index}.',
+        'game_installed_size': installed_size,
+        'game_coverart': f'/covers/{prefix.lower()}-{index}.jpg',
+    }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class LegacyApiStub(object):
+    """
+    Serves a synthetic catalog: products purchased products of one game each (the first is also given
+    away), as many products that were not bought, and giveaway_count giveaway games. Installers are
+    installer_bytes of generated data, or the contents of installer_file, streamed in chunks.
+
+    latency delays every answer, bandwidth caps each response body in bytes per second, failure_rate answers
+    that share of requests with a 503 (seeded, so runs repeat), and fail() queues statuses for one path.
+    drop() makes installer downloads break off mid-body, and installers honour Range requests, which are
+    recorded in ranges. Requests are counted by path.
+    """
+    def __init__(self, giveaway_count=3, installer_bytes=256 * 1024, products=1, installed_size='1 MB',
+                 installer_file=None, latency=0, bandwidth=None, failure_rate=0, seed=0, port=0):
+        self.purchased = [stub_game(i, 'Bought', installed_size) for i in range(1, products + 1)]
+        self.not_purchased = [stub_game(i, 'Bought', installed_size) for i in range(products + 1, 2 * products + 1)]
+        self.giveaways = [dict(self.purchased[0])] + [stub_game(i, installed_size=installed_size) for i in range(1, giveaway_count)]
+        self.installer_bytes = installer_bytes
+        self.installer_file = Path(installer_file) if installer_file else None
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.requests = Counter()
+        self.ranges = []
+        self._failures = defaultdict(list)
+        self._drops = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', port), self._handler())
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail(self, path, *statuses):
+        with self._lock:
+            self._failures[path].extend(statuses)
+
+    def drop(self, *after_bytes):
+        """The next installer responses close the connection after sending this many body bytes each."""
+        with self._lock:
+            self._drops.extend(after_bytes)
+
+    def _injected_drop(self):
+        with self._lock:
+            return self._drops.pop(0) if self._drops else None
+
+    def _injected_failure(self, path):
+        with self._lock:
+            self.requests[path] += 1
+            if self._failures[path]:
+                return self._failures[path].pop(0)
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                return 503
+        return None
+
+    def _with_urls(self, games):
+        return [dict(game, game_coverart=self.url + game['game_coverart']) for game in games]
+
+    def _installer_size(self):
+        return self.installer_file.stat().st_size if self.installer_file else self.installer_bytes
+
+    def _installer_chunks(self, start=0):
+        if self.installer_file:
+            with self.installer_file.open('rb') as f:
+                f.seek(start)
+                yield from iter(lambda: f.read(CHUNK_BYTES), b'')
+            return
+        chunk = b'i' * CHUNK_BYTES
+        remaining = self.installer_bytes - start
+        while remaining > 0:
+            yield chunk[:remaining]
+            remaining -= CHUNK_BYTES
+
+    def _route(self, path, query, headers):
+        if path.startswith('/cdn/'):
+            return 200, 'application/octet-stream', None
+        if path.startswith('/covers/'):
+            return 200, 'image/jpeg', path.encode('utf-8')
+        if not headers.get('usertoken', '').startswith('Basic '):
+            return 401, 'application/json', b'{}'
+        if path == '/users/login':
+            body = {'data': {'userId': USER_ID}}
+        elif path == '/users/profile':
+            body = {'data': {'email': EMAIL}}
+        elif path == '/users/getgiveawaycatalogbyemail':
+            games = self._with_urls(self.giveaways)
+            body = {'data': [{'games': games}, {'games': games[:1]}]}
+        elif path == '/products/catalog':
+            body = [
+                {'product_id': index, 'games': self._with_urls([game])}
+                for index, game in enumerate(self.purchased + self.not_purchased, start=1)
+            ] + [{'name': 'A product without an id'}]
+        elif path == '/users/downloads':
+            body = {'data': [{'product_id': index} for index in range(1, len(self.purchased) + 1)]}
+        elif path == '/products/giveawaydownload':
+            body = {'data': {'file': f'{self.url}/cdn/{query["installerUuid"][0]}_setup.exe'}}
+        elif path == '/products/download':
+            body = {'data': {'file': f'{self.url}/cdn/{query["gameId"][0]}_setup.exe'}}
+        else:
+            return 404, 'application/json', b'{}'
+        return 200, 'application/json', json.dumps(body).encode('utf-8')
+
+    def _write_body(self, wfile, chunks, limit=None):
+        started = time.monotonic()
+        sent = 0
+        for chunk in chunks:
+            if limit is not None:
+                chunk = chunk[:limit - sent]
+            wfile.write(chunk)
+            sent += len(chunk)
+            if self.bandwidth:
+                ahead = sent / self.bandwidth - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+            if limit is not None and sent >= limit:
+                return
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; with Nagle on, keep-alive clients wait for a delayed ACK.
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                failure = stub._injected_failure(parsed.path)
+                if failure:
+                    status, content_type, body = failure, 'application/json', b'{}'
+                else:
+                    status, content_type, body = stub._route(parsed.path, parse_qs(parsed.query), self.headers)
+                start = 0
+                if body is None and self.headers.get('Range', '').startswith('bytes='):
+                    with stub._lock:
+                        stub.ranges.append((parsed.path, self.headers['Range']))
+                    start = int(self.headers['Range'][len('bytes='):].split('-')[0])
+                    status = 206
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(stub._installer_size() - start if body is None else len(body)))
+                if status == 206:
+                    self.send_header('Content-Range', f'bytes {start}-{stub._installer_size() - 1}/{stub._installer_size()}')
+                self.end_headers()
+                try:
+                    if body is None:
+                        limit = stub._injected_drop()
+                        stub._write_body(self.wfile, stub._installer_chunks(start), limit)
+                        if limit is not None:
+                            self.close_connection = True
+                    else:
+                        stub._write_body(self.wfile, [body])
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--giveaways', type=int, default=500)
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--installer-size', default='256 MB')
+    parser.add_argument('--installer-file')
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every answer')
+    parser.add_argument('--bandwidth', default=None, help='per-response cap, for example "20 MB" per second')
+    parser.add_argument('--failure-rate', type=float, default=0, help='share of requests answered with a 503')
+    args = parser.parse_args()
+
+    stub = LegacyApiStub(
+        giveaway_count=args.giveaways,
+        products=args.products,
+        installer_bytes=parse_size(args.installer_size),
+        installed_size=args.installer_size,
+        installer_file=args.installer_file,
+        latency=args.latency,
+        bandwidth=parse_size(args.bandwidth) if args.bandwidth else None,
+        failure_rate=args.failure_rate,
+        port=args.port,
+    )
+    with stub:
+        print(f'Serving a stand-in Legacy Games API at {stub.url}')
+        try:
+            stub._thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from legacy_api_stub import LegacyApiStub
+
+from heirloom.heirloom import Heirloom
+
+try:
+    import aiohttp  # noqa: F401
+except ModuleNotFoundError:
+    aiohttp = None
+else:
+    from heirloom.async_heirloom import AsyncHeirloom
+
+
+class SyncCatalogTest(unittest.TestCase):
+    def test_refresh_joins_purchases_and_giveaways(self):
+        with LegacyApiStub() as stub:
+            heirloom = Heirloom('user', 'password', '~/Games', api_url=stub.url, quiet=True)
+            heirloom.refresh_games_list()
+
+        self.assertEqual(
+            [(g['game_name'], g['amazonprime_giveaway']) for g in heirloom.games],
+            [('Bought 1', False), ('Game 1', True), ('Game 2', True)],
+        )
+        self.assertEqual(heirloom.games[0]['installed_size'], 1024 ** 2)
+
+    def test_refresh_rides_out_injected_server_errors(self):
+        with LegacyApiStub() as stub:
+            stub.fail('/products/catalog', 503, 502)
+            stub.fail('/users/login', 429)
+            heirloom = Heirloom('user', 'password', '~/Games', api_url=stub.url, quiet=True, http_backoff=0)
+            heirloom.refresh_games_list()
+
+        self.assertEqual(len(heirloom.games), 3)
+        self.assertEqual(stub.requests['/products/catalog'], 3)
+        self.assertEqual(heirloom.transport_stats()['retries'], 3)
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncHeirloomTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = Path(tmpdir.name)
+
+    def test_importing_the_async_client_does_not_load_the_sync_one(self):
+        script = (
+            'import sys\n'
+            'import heirloom.async_heirloom\n'
+            'print([m for m in ("heirloom.heirloom", "requests", "rich") if m in sys.modules])\n'
+        )
+        env = dict(os.environ, PYTHONPATH=str(Path(__file__).resolve().parents[1]))
+        result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, timeout=60)
+
+        self.assertEqual(result.stdout.strip(), '[]', result.stderr)
+
+    def client(self, stub):
+        return AsyncHeirloom('user', 'password', api_url=stub.url, temp_dir=self.tmpdir, min_free_space=0)
+
+    def test_refresh_matches_the_sync_client(self):
+        async def refresh(stub):
+            async with self.client(stub) as client:
+                return await client.refresh_games_list()
+
+        with LegacyApiStub() as stub:
+            games = asyncio.run(refresh(stub))
+            heirloom = Heirloom('user', 'password', '~/Games', api_url=stub.url, quiet=True)
+            heirloom.refresh_games_list()
+
+        self.assertEqual(games, heirloom.games)
+
+    def test_downloads_installers_for_purchases_and_giveaways(self):
+        async def download(stub):
+            async with self.client(stub) as client:
+                return await asyncio.gather(client.download_game('bought 1'), client.download_game('Game 2'))
+
+        with LegacyApiStub(installer_bytes=300 * 1024) as stub:
+            filenames = asyncio.run(download(stub))
+
+        self.assertEqual(filenames, ['bought-1_setup.exe', 'game-uuid-2_setup.exe'])
+        self.assertEqual((self.tmpdir / 'bought-1_setup.exe').stat().st_size, 300 * 1024)
+
+    def test_hundreds_of_concurrent_artwork_fetches_share_one_login(self):
+        async def fetch_all(stub):
+            async with self.client(stub) as client:
+                await client.refresh_games_list()
+                return await client.download_artworks([g['game_name'] for g in client.games] + ['Missing'])
+
+        with LegacyApiStub(giveaway_count=300) as stub:
+            results = asyncio.run(fetch_all(stub))
+
+        self.assertEqual(stub.requests['/users/login'], 1)
+        self.assertIsInstance(results.pop('Missing'), AssertionError)
+        self.assertEqual(len(results), 300)
+        self.assertEqual(results['Game 299'], 'game-299.jpg')
+        self.assertEqual((self.tmpdir / 'game-299.jpg').read_bytes(), b'/covers/game-299.jpg')
+
+
+    def test_concurrent_lookups_on_a_fresh_client_share_one_catalog_refresh(self):
+        async def fetch_all(stub):
+            async with self.client(stub) as client:
+                return await asyncio.gather(
+                    client.download_artworks([f'Game {index}' for index in range(1, 51)]),
+                    client.get_game_from_uuid('game-uuid-1'),
+                )
+
+        with LegacyApiStub(giveaway_count=50) as stub:
+            artworks, name = asyncio.run(fetch_all(stub))
+
+        self.assertEqual(len(artworks), 50)
+        self.assertEqual(name, 'Game 1')
+        for path in ('/users/login', '/users/profile', '/users/getgiveawaycatalogbyemail', '/products/catalog'):
+            self.assertEqual(stub.requests[path], 1, path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from heirloom.database_functions import init_games_db, write_game_record
+
+try:
+    import InquirerPy  # noqa: F401
+    import rich  # noqa: F401
+    import typer  # noqa: F401
+except ModuleNotFoundError:
+    typer = None
+else:
+    from heirloom.cli.completion import game_completer
+
+
+GAMES = [('Mahjong World', 'uuid-m'), ('match three', 'uuid-3'), ('Zoo Keeper', 'uuid-z')]
+
+
+@unittest.skipIf(typer is None, 'CLI dependencies are not installed')
+class CompletionTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.home = Path(tmpdir.name)
+        self.config_dir = self.home / '.config' / 'heirloom'
+        db = init_games_db(str(self.config_dir), [{'game_name': name, 'installer_uuid': uuid} for name, uuid in GAMES])
+        write_game_record(db, 'match three', 'uuid-3', 'Z:\\Games\\Match', 'Z:\\Games\\Match\\Match.exe')
+        db.close()
+        self.db_path = self.config_dir / 'games.db'
+
+    def test_names_and_uuids_are_filtered_by_prefix_and_install_state(self):
+        self.assertEqual(game_completer(self.db_path)(''), [('Mahjong World', 'uuid-m'), ('match three', 'uuid-3'), ('Zoo Keeper', 'uuid-z')])
+        self.assertEqual(game_completer(self.db_path, installed=True)('m'), [('match three', 'uuid-3')])
+        self.assertEqual(game_completer(self.db_path, installed=True)('M'), [])
+        self.assertEqual(game_completer(self.db_path, 'uuid', installed=False)('uuid-'), [('uuid-m', 'Mahjong World'), ('uuid-z', 'Zoo Keeper')])
+        self.assertEqual(game_completer(self.home / 'missing.db')(''), [])
+
+    def test_shell_completion_reads_the_database_without_loading_the_api_clients(self):
+        script = (
+            'import sys\n'
+            'sys.argv = ["heirloom-gm"]\n'
+            'from heirloom.cli import main\n'
+            'try:\n'
+            '    main()\n'
+            'finally:\n'
+            '    heavy = ("heirloom.heirloom", "requests", "aiohttp", "InquirerPy", "keyring")\n'
+            '    print("loaded:", [m for m in heavy if m in sys.modules], file=sys.stderr)\n'
+        )
+        env = dict(
+            os.environ,
+            HOME=str(self.home),
+            PYTHONPATH=str(Path(__file__).resolve().parents[1]),
+            _HEIRLOOM_GM_COMPLETE='complete_bash',
+            COMP_WORDS='heirloom-gm launch --game m',
+            COMP_CWORD='3',
+        )
+        result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, timeout=60)
+
+        self.assertEqual(result.stdout.splitlines(), ['match three'])
+        self.assertIn('loaded: []', result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
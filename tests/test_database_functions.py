@@ -1,13 +1,19 @@
+import sqlite3
 import tempfile
 import unittest
 from pathlib import Path
 
 from heirloom.database_functions.database_functions import (
     NOT_INSTALLED,
+    GameChanges,
     delete_game_record,
     init_games_db,
+    read_catalog,
     read_game_record,
+    read_operations,
+    record_operation,
     refresh_game_installation_status,
+    sync_catalog,
     write_game_record,
 )
 
@@ -71,6 +77,115 @@ class DatabaseFunctionsTest(unittest.TestCase):
             finally:
                 db.close()
 
+    def test_init_games_db_adds_columns_to_existing_databases(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            legacy = sqlite3.connect(Path(tmpdir) / 'games.db')
+            legacy.execute("CREATE TABLE games(name TEXT NOT NULL, uuid TEXT PRIMARY KEY UNIQUE, install_dir TEXT NOT NULL DEFAULT 'Not Installed', executable TEXT NOT NULL DEFAULT 'Not Installed')")
+            legacy.execute("INSERT INTO games VALUES('Game', 'uuid-1', 'Z:\\Games\\Game', 'Z:\\Games\\Game\\Game.exe')")
+            legacy.commit()
+            legacy.close()
+
+            db = init_games_db(tmpdir, [])
+            try:
+                self.assertEqual(read_game_record(db, uuid='uuid-1')['wine_prefix'], '')
+                write_game_record(db, 'Game', 'uuid-1', 'Z:\\Games\\Game', 'Z:\\Games\\Game\\Game.exe', '/prefixes/uuid-1')
+                self.assertEqual(read_game_record(db, uuid='uuid-1')['wine_prefix'], '/prefixes/uuid-1')
+            finally:
+                db.close()
+
+    def test_operations_are_recorded_with_their_throughput(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db = init_games_db(tmpdir, [])
+            try:
+                record_operation(db, 'download', 100.0, 104.0, 'success', name='Game', uuid='uuid-1', size=8 * 1024 ** 2)
+                record_operation(db, 'install', 100.0, 130.0, 'fail', name='Game', uuid='uuid-1', method='wine')
+                record_operation(db, 'refresh', 90.0, 91.5, 'success', detail='3 games')
+
+                downloads = read_operations(db, kind='download')
+                self.assertEqual(len(downloads), 1)
+                self.assertEqual(downloads[0]['throughput'], 2 * 1024 ** 2)
+                self.assertEqual(downloads[0]['duration'], 4.0)
+                self.assertEqual([op['kind'] for op in read_operations(db)], ['refresh', 'download', 'install'])
+                self.assertIsNone(read_operations(db, name='Game', kind='install')[0]['throughput'])
+            finally:
+                db.close()
+
+    def test_sync_catalog_only_writes_added_and_changed_games(self):
+        games = [
+            {'game_name': 'Game 1', 'installer_uuid': 'uuid-1', 'game_installed_size': '1 MB'},
+            {'game_name': 'Game 2', 'installer_uuid': 'uuid-2', 'game_installed_size': '2 MB'},
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db = init_games_db(tmpdir, [])
+            try:
+                first = sync_catalog(db, games)
+                self.assertEqual((first['added'], first['initial']), (['uuid-1', 'uuid-2'], True))
+
+                write_game_record(db, 'Game 1', 'uuid-1', 'Z:\\Games\\Game 1', 'Z:\\Games\\Game 1\\Game.exe')
+                statements = []
+                db.set_trace_callback(statements.append)
+                unchanged = sync_catalog(db, [dict(games[1], install_dir='/elsewhere'), games[0]])
+                db.set_trace_callback(None)
+                self.assertEqual((unchanged['added'], unchanged['changed'], unchanged['unchanged']), ([], [], 2))
+                self.assertFalse([sql for sql in statements if 'INSERT' in sql])
+
+                changes = sync_catalog(db, [
+                    dict(games[0], game_installed_size='3 MB'),
+                    games[1],
+                    {'game_name': 'Game 3', 'installer_uuid': 'uuid-3', 'amazonprime_giveaway': True},
+                ])
+                self.assertEqual(changes, {'added': ['uuid-3'], 'changed': ['uuid-1'], 'unchanged': 1, 'initial': False})
+                record = read_game_record(db, uuid='uuid-1')
+                self.assertEqual(record['installed_size'], 3 * 1024 ** 2)
+                self.assertEqual(record['install_dir'], 'Z:\\Games\\Game 1')
+            finally:
+                db.close()
+
+    def test_read_catalog_returns_the_last_synced_library_with_install_state(self):
+        games = [
+            {'game_name': 'Zoo', 'installer_uuid': 'uuid-z', 'game_coverart': 'https://example.com/zoo.jpg'},
+            {'game_name': 'Ant', 'installer_uuid': 'uuid-a', 'amazonprime_giveaway': True},
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db = init_games_db(tmpdir, games)
+            try:
+                write_game_record(db, 'Ant', 'uuid-a', 'Z:\\Games\\Ant', 'Z:\\Games\\Ant\\Ant.exe')
+                sync_catalog(db, games + [{'game_name': 'New', 'installer_uuid': 'uuid-n'}])
+
+                saved = read_catalog(db)
+                self.assertEqual([game['game_name'] for game in saved], ['Zoo', 'Ant', 'New'])
+                self.assertEqual(saved[0]['game_coverart'], 'https://example.com/zoo.jpg')
+                self.assertEqual(saved[0]['install_dir'], NOT_INSTALLED)
+                self.assertTrue(saved[1]['amazonprime_giveaway'])
+                self.assertEqual(saved[1]['executable'], 'Z:\\Games\\Ant\\Ant.exe')
+            finally:
+                db.close()
+
+    def test_game_changes_reports_games_written_by_other_connections(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db = init_games_db(tmpdir, [
+                {'game_name': 'Game 1', 'installer_uuid': 'uuid-1'},
+                {'game_name': 'Game 2', 'installer_uuid': 'uuid-2'},
+            ])
+            changes = GameChanges(tmpdir)
+            try:
+                self.assertEqual(changes.poll(), [])
+
+                write_game_record(db, 'Game 2', 'uuid-2', 'Z:\\Games\\Game 2', 'Z:\\Games\\Game 2\\Game.exe')
+                games = changes.poll()
+                self.assertEqual([game['installer_uuid'] for game in games], ['uuid-2'])
+                self.assertEqual(games[0]['install_dir'], 'Z:\\Games\\Game 2')
+                self.assertEqual(changes.poll(), [])
+
+                delete_game_record(db, uuid='uuid-2')
+                sync_catalog(db, [{'game_name': 'Game 1', 'installer_uuid': 'uuid-1'}, {'game_name': 'Game 3', 'installer_uuid': 'uuid-3'}])
+                games = changes.poll()
+                self.assertEqual([game['installer_uuid'] for game in games], ['uuid-2', 'uuid-3'])
+                self.assertEqual(games[0]['install_dir'], NOT_INSTALLED)
+            finally:
+                changes.close()
+                db.close()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,89 @@
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from heirloom.database_functions import delete_game_record, init_games_db, read_file_hashes, write_game_record
+from heirloom.dedupe import DEDUPE_AUTO, DEDUPE_HARDLINK, ReflinkUnavailable, dedupe_after_install, dedupe_files
+
+
+MB = 1024 * 1024
+
+
+class DedupeTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.root = Path(tmpdir.name) / 'games'
+        self.db = init_games_db(tmpdir.name, [{'game_name': 'One', 'installer_uuid': 'uuid-1'}])
+        self.addCleanup(self.db.close)
+        runtime = os.urandom(2 * MB)
+        self.write('One/engine/runtime.dll', runtime)
+        self.write('Two/bin/runtime.dll', runtime)
+        # Same size and same first/last 64 KB, different middle: only a full hash tells them apart.
+        self.write('Two/bin/almost.dll', runtime[:MB] + bytes([runtime[MB] ^ 0xFF]) + runtime[MB + 1:])
+        self.write('Two/config.ini', b'small')
+
+    def write(self, relative, data):
+        path = self.root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return path
+
+    def test_identical_files_are_linked_and_later_runs_are_incremental(self):
+        stats = dedupe_files(self.db, self.root, mode=DEDUPE_HARDLINK)
+
+        self.assertEqual((stats['scanned'], stats['linked'], stats['saved_bytes']), (3, 1, 2 * MB))
+        self.assertTrue(os.path.samefile(self.root / 'One/engine/runtime.dll', self.root / 'Two/bin/runtime.dll'))
+        self.assertFalse(os.path.samefile(self.root / 'One/engine/runtime.dll', self.root / 'Two/bin/almost.dll'))
+
+        again = dedupe_files(self.db, self.root, mode=DEDUPE_HARDLINK)
+        self.assertEqual((again['hashed'], again['linked']), (0, 0))
+
+    def test_reflinked_files_are_not_linked_again_by_later_runs(self):
+        # A copy stands in for a reflink: the duplicate keeps an inode of its own either way.
+        with mock.patch('heirloom.dedupe.reflink_file', side_effect=lambda source, target: shutil.copyfile(source, target)):
+            first = dedupe_files(self.db, self.root, mode=DEDUPE_AUTO)
+            second = dedupe_files(self.db, self.root, mode=DEDUPE_AUTO)
+            dry_run = dedupe_files(self.db, self.root, mode=DEDUPE_AUTO, dry_run=True)
+
+        self.assertEqual((first['linked'], first['saved_bytes']), (1, 2 * MB))
+        self.assertEqual((second['hashed'], second['linked'], second['saved_bytes']), (0, 0, 0))
+        self.assertEqual(dry_run['linked'], 0)
+
+    def test_dry_run_changes_nothing(self):
+        stats = dedupe_files(self.db, self.root, mode=DEDUPE_HARDLINK, dry_run=True)
+
+        self.assertEqual(stats['linked'], 1)
+        self.assertFalse(os.path.samefile(self.root / 'One/engine/runtime.dll', self.root / 'Two/bin/runtime.dll'))
+
+    def test_uninstalling_a_game_keeps_shared_files_of_other_games(self):
+        dedupe_files(self.db, self.root, mode=DEDUPE_HARDLINK)
+        expected = (self.root / 'Two/bin/runtime.dll').read_bytes()
+        write_game_record(self.db, 'One', 'uuid-1', str(self.root / 'One'), str(self.root / 'One/One.exe'))
+
+        shutil.rmtree(self.root / 'One')
+        delete_game_record(self.db, uuid='uuid-1')
+
+        self.assertEqual((self.root / 'Two/bin/runtime.dll').read_bytes(), expected)
+        self.assertEqual(read_file_hashes(self.db, self.root / 'One'), {})
+        self.assertIn(str(self.root / 'Two/bin/runtime.dll'), read_file_hashes(self.db, self.root))
+
+    def test_auto_mode_stops_instead_of_hardlinking_without_reflinks(self):
+        unsupported = OSError(errno.EOPNOTSUPP, 'Operation not supported')
+        with mock.patch('heirloom.dedupe.reflink_file', side_effect=unsupported):
+            with self.assertRaises(ReflinkUnavailable):
+                dedupe_files(self.db, self.root, mode=DEDUPE_AUTO)
+            stats = dedupe_after_install(self.db, {'auto_dedupe': 'true', 'base_install_dir': str(self.root)}, str(self.root / 'Two'))
+
+        self.assertFalse(os.path.samefile(self.root / 'One/engine/runtime.dll', self.root / 'Two/bin/runtime.dll'))
+        self.assertEqual(stats['linked'], 0)
+        self.assertIn('Reflinks unavailable', stats['unavailable'])
+        self.assertIn(str(self.root / 'Two/bin/runtime.dll'), read_file_hashes(self.db, self.root))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import tempfile
+import unittest
+from collections import namedtuple
+from unittest import mock
+
+from heirloom import diskspace
+from heirloom.diskspace import InsufficientSpace, find_shortfalls, plan_installs, space_requirements
+
+
+GB = 1024 ** 3
+Usage = namedtuple('Usage', 'total used free')
+
+
+class DiskSpaceTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmp_dir = f'{tmpdir.name}/tmp'
+        self.install_dir = f'{tmpdir.name}/games'
+
+    def free(self, free_bytes):
+        return mock.patch.object(diskspace.shutil, 'disk_usage', return_value=Usage(100 * GB, 0, free_bytes))
+
+    def test_download_and_install_on_one_filesystem_are_added_together(self):
+        requirements = space_requirements(3 * GB, self.tmp_dir, self.install_dir)
+        with self.free(7 * GB):
+            self.assertEqual(find_shortfalls(requirements, min_free=0), [])
+            shortfalls = find_shortfalls(requirements, reserved={diskspace.filesystem_of(self.tmp_dir): 2 * GB}, min_free=0)
+
+        self.assertEqual(len(shortfalls), 1)
+        self.assertEqual(shortfalls[0]['required'], 8 * GB)
+        self.assertIn('needs 8.0 GB', str(InsufficientSpace(shortfalls)))
+
+    def test_planner_fits_smallest_games_first_and_reports_the_rest(self):
+        candidates = [('Big', 6 * GB), ('Small', 1 * GB), ('Unknown', 0), ('Medium', 2 * GB)]
+        with self.free(8 * GB):
+            planned, skipped = plan_installs(candidates, self.tmp_dir, self.install_dir, min_free=0)
+
+        # Small leaves 1 GB behind, Medium then needs 1 + 2 + 2 = 5 GB, Big would need 3 + 12 GB.
+        self.assertEqual(planned, ['Small', 'Medium', 'Unknown'])
+        self.assertEqual([name for name, _ in skipped], ['Big'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from heirloom.extraction import ExtractionScheduler, SevenZipCapabilities, probe_7zip, seven_zip_extract_command
+
+
+FAKE_7ZIP = '''#!{python}
+import sys
+args = sys.argv[1:]
+if not args:
+    print('7-Zip (a) 9.20  Copyright (c) 1999-2010 Igor Pavlov  2010-11-18')
+elif args[0] == 'a':
+    open(args[-2], 'w').close()
+elif args[0] == 't' and '-mmt2' in args:
+    print('Error: Unsupported switch', file=sys.stderr)
+    sys.exit(7)
+'''
+
+
+class SevenZipTest(unittest.TestCase):
+    def test_probe_detects_rejected_switches(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fake = Path(tmpdir) / '7z'
+            fake.write_text(FAKE_7ZIP.format(python=sys.executable))
+            fake.chmod(fake.stat().st_mode | stat.S_IXUSR)
+
+            capabilities = probe_7zip(str(fake))
+            self.assertIs(probe_7zip(str(fake)), capabilities)
+
+        self.assertEqual(capabilities.version, (9, 20))
+        self.assertFalse(capabilities.multithreading)
+        self.assertTrue(capabilities.progress)
+
+    def test_extract_command_only_uses_supported_switches(self):
+        full = SevenZipCapabilities((23, 1), True, True)
+        legacy = SevenZipCapabilities((9, 20), False, False)
+
+        self.assertEqual(
+            seven_zip_extract_command('7z', 'game.exe', '/games/Game', 4, full),
+            ['7z', 'x', '-o/games/Game', '-y', '-bsp1', '-mmt4', 'game.exe'],
+        )
+        self.assertEqual(seven_zip_extract_command('7z', 'game.exe', '/games/Game', 4, legacy), ['7z', 'x', '-o/games/Game', '-y', 'game.exe'])
+
+
+class ExtractionSchedulerTest(unittest.TestCase):
+    def test_concurrent_extractions_stay_within_the_thread_budget(self):
+        scheduler = ExtractionScheduler(4, poll_interval=0.01)
+        peak = []
+        granted = []
+        lock = threading.Lock()
+
+        def extract():
+            with scheduler.reserve() as threads:
+                with lock:
+                    granted.append(threads)
+                    peak.append(scheduler.in_use)
+                time.sleep(0.05)
+
+        workers = [threading.Thread(target=extract) for _ in range(6)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(5)
+
+        self.assertEqual(len(granted), 6)
+        self.assertLessEqual(max(peak), 4)
+        self.assertEqual(scheduler.in_use, 0)
+
+    def test_a_lone_extraction_uses_the_whole_budget_and_shares_it_otherwise(self):
+        scheduler = ExtractionScheduler(8)
+        with scheduler.reserve() as threads:
+            self.assertEqual(threads, 8)
+        with scheduler.reserve(max_threads=2) as first:
+            with scheduler.reserve() as second:
+                self.assertEqual((first, second), (2, 4))
+
+    def test_single_threaded_installers_take_one_thread(self):
+        scheduler = ExtractionScheduler(8)
+        with scheduler.reserve(max_threads=1) as threads:
+            self.assertEqual(threads, 1)
+
+    def test_waiting_reservation_can_be_cancelled(self):
+        scheduler = ExtractionScheduler(1, poll_interval=0.01)
+
+        def should_stop():
+            raise RuntimeError('cancelled')
+
+        with scheduler.reserve():
+            with self.assertRaises(RuntimeError):
+                with scheduler.reserve(should_stop=should_stop):
+                    pass
+        self.assertEqual(scheduler.in_use, 0)
+
+    def test_budget_defaults_to_cpu_count(self):
+        self.assertEqual(ExtractionScheduler('').budget, os.cpu_count() or 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import sys
+import unittest
+
+from heirloom.catalog import catalog_payload, join_catalog
+from heirloom.game import Game
+
+
+def api_game(index, size='1 MB'):
+    return {
+        'game_name': f'Game {index}',
+        'game_id': f'game-{index}',
+        'installer_uuid': f'uuid-{index}',
+        'game_description': f'Synthetic game number {index}.',
+        'game_installed_size': size,
+        'game_coverart': f'https://example.com/covers/{index}.jpg',
+    }
+
+
+class GameTest(unittest.TestCase):
+    def test_behaves_like_the_api_dict(self):
+        raw = dict(api_game(1), game_rating='E')
+        game = Game(raw)
+
+        self.assertEqual(game, raw)
+        self.assertEqual(dict(game), raw)
+        self.assertEqual(game['game_rating'], 'E')
+        self.assertIsNone(game.get('install_dir'))
+        self.assertNotIn('install_dir', game)
+        game['install_dir'] = 'Z:\\Games\\Game 1'
+        game.update(executable='Z:\\Games\\Game 1\\Game.exe')
+        self.assertEqual(len(game), len(raw) + 2)
+        del game['install_dir']
+        with self.assertRaises(KeyError):
+            game['install_dir']
+        self.assertEqual(json.loads(catalog_payload(game)), raw)
+
+    def test_repeated_strings_are_shared_and_records_are_smaller_than_dicts(self):
+        first = Game(api_game(1, ''.join(['1', ' MB'])))
+        second = Game(api_game(2, ''.join(['1 ', 'MB'])))
+
+        self.assertIs(first['game_installed_size'], second['game_installed_size'])
+        self.assertFalse(hasattr(first, '__dict__'))
+        self.assertLess(sys.getsizeof(first), sys.getsizeof(dict(first)))
+
+    def test_join_catalog_returns_game_records(self):
+        games = join_catalog([api_game(1)], [api_game(1), api_game(2)])
+
+        self.assertTrue(all(isinstance(game, Game) for game in games))
+        self.assertEqual([(g['game_name'], g['amazonprime_giveaway']) for g in games], [('Game 1', False), ('Game 2', True)])
+        self.assertEqual(games[1]['installed_size'], 1024 ** 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
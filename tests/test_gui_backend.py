@@ -0,0 +1,244 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+try:
+    from PySide6.QtCore import QCoreApplication
+except ModuleNotFoundError:
+    QCoreApplication = None
+
+
+@unittest.skipIf(QCoreApplication is None, 'PySide6 is not installed')
+class GuiBackendTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def test_update_game_changes_only_the_matching_row(self):
+        from heirloom.gui.backend import GamesModel
+
+        model = GamesModel()
+        model.set_games([
+            {'game_name': 'One', 'installer_uuid': 'uuid-1', 'install_dir': 'Not Installed'},
+            {'game_name': 'Two', 'installer_uuid': 'uuid-2', 'install_dir': 'Not Installed'},
+        ])
+        changed = []
+        model.dataChanged.connect(lambda top, bottom, roles=None: changed.append((top.row(), bottom.row())))
+        resets = []
+        model.modelReset.connect(lambda: resets.append(True))
+
+        model.update_game('uuid-2', {'install_dir': 'Z:\\Games\\Two'})
+
+        self.assertEqual(changed, [(1, 1)])
+        self.assertEqual(resets, [])
+        self.assertTrue(model.data(model.index(1, 0), GamesModel.InstalledRole))
+        self.assertFalse(model.data(model.index(0, 0), GamesModel.InstalledRole))
+
+    def test_refresh_game_worker_reads_local_database_without_network(self):
+        from heirloom.database_functions import init_games_db, write_game_record
+        from heirloom.gui import backend
+
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch.object(backend, 'CONFIG_DIR', backend.Path(tmpdir)):
+            db = init_games_db(tmpdir, [{'game_name': 'One', 'installer_uuid': 'uuid-1'}])
+            write_game_record(db, 'One', 'uuid-1', 'Z:\\Games\\One', 'Z:\\Games\\One\\One.exe')
+            db.close()
+            controller = backend.GuiController()
+            controller.games.set_games([{'game_name': 'One', 'installer_uuid': 'uuid-1', 'install_dir': 'Not Installed'}])
+            controller._library_loaded_at = time.monotonic()
+            controller._refresh_library_worker = mock.Mock()
+
+            controller._refresh_game_worker(mock.Mock(), 'uuid-1')
+            self.app.processEvents()
+
+            controller._refresh_library_worker.assert_not_called()
+            self.assertEqual(controller.games.game_by_uuid('uuid-1')['executable'], 'Z:\\Games\\One\\One.exe')
+            controller.jobs.shutdown()
+
+    def test_refresh_game_worker_queues_an_expired_library_refresh_as_a_library_job(self):
+        import threading
+
+        from heirloom.database_functions import init_games_db
+        from heirloom.gui import backend
+
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch.object(backend, 'CONFIG_DIR', backend.Path(tmpdir)):
+            init_games_db(tmpdir, [{'game_name': 'One', 'installer_uuid': 'uuid-1'}]).close()
+            controller = backend.GuiController()
+            controller._library_loaded_at = None
+            controller._refresh_library_worker = mock.Mock()
+            controller._start_refresh = mock.Mock()
+
+            worker = threading.Thread(target=controller._refresh_game_worker, args=(mock.Mock(), 'uuid-1'))
+            worker.start()
+            worker.join()
+            controller._start_refresh.assert_not_called()
+            self.app.processEvents()
+
+            controller._refresh_library_worker.assert_not_called()
+            controller._start_refresh.assert_called_once_with()
+            controller.jobs.shutdown()
+
+    def test_merge_games_applies_only_the_differences(self):
+        from heirloom.gui.backend import GamesModel
+
+        model = GamesModel()
+        model.set_games([
+            {'game_name': 'One', 'installer_uuid': 'uuid-1'},
+            {'game_name': 'Two', 'installer_uuid': 'uuid-2'},
+            {'game_name': 'Gone', 'installer_uuid': 'uuid-3'},
+        ])
+        events = []
+        model.modelReset.connect(lambda: events.append('reset'))
+        model.rowsRemoved.connect(lambda parent, first, last: events.append(('removed', first, last)))
+        model.rowsInserted.connect(lambda parent, first, last: events.append(('inserted', first, last)))
+        model.dataChanged.connect(lambda top, bottom, roles=None: events.append(('changed', top.row())))
+
+        model.merge_games([
+            {'game_name': 'One', 'installer_uuid': 'uuid-1'},
+            {'game_name': 'Two (Remastered)', 'installer_uuid': 'uuid-2'},
+            {'game_name': 'Three', 'installer_uuid': 'uuid-4'},
+        ])
+
+        self.assertEqual(events, [('removed', 2, 2), ('changed', 1), ('inserted', 2, 2)])
+        self.assertEqual([model.data(model.index(row, 0), GamesModel.TitleRole) for row in range(3)], ['One', 'Two (Remastered)', 'Three'])
+
+    def test_bootstrap_shows_the_saved_library_before_logging_in(self):
+        from heirloom.database_functions import init_games_db
+        from heirloom.gui import backend
+
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch.object(backend, 'CONFIG_DIR', backend.Path(tmpdir)), \
+                mock.patch.object(backend, 'CACHE_DIR', backend.Path(tmpdir) / 'artwork'):
+            init_games_db(tmpdir, [
+                {'game_name': 'One', 'game_id': 'one', 'installer_uuid': 'uuid-1', 'game_coverart': 'https://example.com/one.jpg'},
+                {'game_name': 'Two', 'game_id': 'two', 'installer_uuid': 'uuid-2', 'game_coverart': 'https://example.com/two.jpg'},
+            ]).close()
+            (backend.Path(tmpdir) / 'artwork').mkdir()
+            (backend.Path(tmpdir) / 'artwork' / 'one.jpg').write_bytes(b'jpeg')
+            controller = backend.GuiController()
+            controller._ensure_client = mock.Mock(side_effect=ConnectionError('offline'))
+
+            with self.assertRaises(ConnectionError):
+                controller._refresh_library_worker(mock.Mock(), show_saved=True)
+            self.app.processEvents()
+
+            self.assertEqual(controller.games.rowCount(), 2)
+            self.assertTrue(controller.games.game_by_uuid('uuid-1')['coverart_local'].endswith('/artwork/one.jpg'))
+            self.assertNotIn('coverart_local', controller.games.game_by_uuid('uuid-2'))
+            self.assertIsNone(controller._library_loaded_at)
+            controller.jobs.shutdown()
+
+    def test_install_worker_loads_the_client_library_on_demand(self):
+        from heirloom.gui import backend
+
+        controller = backend.GuiController()
+        client = mock.Mock(games=[])
+        controller._ensure_client = mock.Mock(return_value=client)
+        client.refresh_games_list.side_effect = lambda: setattr(client, 'games', [{'game_name': 'One', 'installer_uuid': 'uuid-1'}])
+        client.install_game.return_value = {'status': 'failed', 'stderr': 'disk full'}
+
+        with self.assertRaisesRegex(RuntimeError, 'disk full'):
+            controller._install_worker(mock.Mock(), 'uuid-1')
+
+        client.refresh_games_list.assert_called_once_with()
+        self.assertEqual(client.install_game.call_args.args, ('One',))
+
+        client.games = []
+        client.refresh_games_list.side_effect = ConnectionError('offline')
+        with self.assertRaisesRegex(RuntimeError, 'library has not loaded yet'):
+            controller._uninstall_worker(mock.Mock(), 'uuid-1')
+        controller.jobs.shutdown()
+
+    def test_launch_game_reads_the_database_off_the_calling_thread(self):
+        import threading
+
+        from heirloom.gui import backend
+
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch.object(backend, 'CONFIG_DIR', backend.Path(tmpdir)):
+            controller = backend.GuiController()
+            controller.games.set_games([{'game_name': 'One', 'installer_uuid': 'uuid-1'}])
+            client = mock.Mock()
+            controller._ensure_client = mock.Mock(return_value=client)
+            threads = []
+
+            def read_game_record(db, uuid):
+                threads.append(threading.get_ident())
+                return {'executable': '/games/one/one.exe', 'wine_prefix': '/prefixes/one'}
+
+            with mock.patch.object(backend, 'read_game_record', side_effect=read_game_record):
+                controller.launchGame('uuid-1')
+                deadline = time.monotonic() + 5
+                while controller.statusMessage != 'Launched One.' and time.monotonic() < deadline:
+                    self.app.processEvents()
+                    time.sleep(0.01)
+
+            self.assertEqual(controller.statusMessage, 'Launched One.')
+            self.assertNotIn(threading.get_ident(), threads)
+            client.launch_game.assert_called_once_with('/games/one/one.exe', '/prefixes/one')
+            controller.shutdown()
+
+    def test_games_written_by_another_process_are_applied_to_their_rows(self):
+        from heirloom.database_functions import init_games_db, read_catalog, write_game_record
+        from heirloom.gui import backend
+
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch.object(backend, 'CONFIG_DIR', backend.Path(tmpdir)), \
+                mock.patch.object(backend, 'CACHE_DIR', backend.Path(tmpdir) / 'artwork'):
+            games = [
+                {'game_name': 'One', 'installer_uuid': 'uuid-1'},
+                {'game_name': 'Two', 'installer_uuid': 'uuid-2'},
+            ]
+            cli = init_games_db(tmpdir, games)
+            controller = backend.GuiController()
+            saved = read_catalog(cli)
+            saved[0]['coverart_local'] = 'file:///artwork/one.jpg'
+            controller.games.set_games(saved)
+            changed = []
+            controller.games.dataChanged.connect(lambda first, last: changed.append(first.row()))
+
+            def poll():
+                controller._poll_database()
+                deadline = time.monotonic() + 5
+                while controller._database_poll_pending and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.app.processEvents()
+
+            poll()
+            write_game_record(cli, 'One', 'uuid-1', 'Z:\\Games\\One', 'Z:\\Games\\One\\One.exe')
+            poll()
+            poll()
+
+            self.assertEqual(changed, [0])
+            one = controller.games.game_by_uuid('uuid-1')
+            self.assertEqual(one['executable'], 'Z:\\Games\\One\\One.exe')
+            self.assertEqual(one['coverart_local'], 'file:///artwork/one.jpg')
+            cli.close()
+            controller.shutdown()
+
+    def test_artwork_downloads_share_one_retrying_session(self):
+        from legacy_api_stub import LegacyApiStub
+
+        from heirloom.gui import backend
+
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch.object(backend, 'CACHE_DIR', backend.Path(tmpdir) / 'artwork'), \
+                LegacyApiStub() as stub:
+            controller = backend.GuiController()
+            controller._config = {'http_backoff': '0', 'http_backoff_jitter': '0'}
+            stub.fail('/covers/game-1.jpg', 503)
+            games = [{'game_id': f'game-{index}', 'game_coverart': f'{stub.url}/covers/game-{index}.jpg'} for index in (1, 2)]
+
+            controller._cache_artwork(games[:1])
+            session = controller._artwork_session()
+            controller._cache_artwork(games[1:])
+
+            self.assertIs(controller._artwork_session(), session)
+            self.assertEqual(stub.requests['/covers/game-1.jpg'], 2)
+            self.assertTrue(all(game['coverart_local'].startswith('file://') for game in games))
+            controller.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+try:
+    from PySide6.QtCore import QCoreApplication, QSize
+    from PySide6.QtGui import QColor, QImage
+except ModuleNotFoundError:
+    QCoreApplication = None
+
+
+@unittest.skipIf(QCoreApplication is None, 'PySide6 is not installed')
+class CoverImageProviderTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.root = Path(tmpdir.name)
+
+    def cover(self, name, width, height):
+        image = QImage(width, height, QImage.Format_RGB32)
+        image.fill(QColor('teal'))
+        image.save(str(self.root / name))
+        return self.root / name
+
+    def wait(self, response):
+        finished = []
+        response.finished.connect(lambda: finished.append(True))
+        deadline = time.monotonic() + 10
+        while not finished and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+        self.assertTrue(finished)
+
+    def test_cache_evicts_least_recently_used_images_by_size(self):
+        from heirloom.gui.images import DecodedImageCache
+
+        tile = QImage(64, 64, QImage.Format_RGB32)
+        cache = DecodedImageCache(max_bytes=tile.sizeInBytes() * 2)
+        cache.put('a', tile)
+        cache.put('b', QImage(tile))
+        self.assertIsNotNone(cache.get('a'))
+        cache.put('c', QImage(tile))
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual((len(cache), cache.bytes), (2, tile.sizeInBytes() * 2))
+        cache.put('huge', QImage(256, 256, QImage.Format_RGB32))
+        self.assertIsNone(cache.get('huge'))
+
+    def test_decodes_at_the_requested_size_and_serves_repeats_from_memory(self):
+        from heirloom.gui.images import CoverImageProvider, cover_url, scaled_size
+
+        self.cover('tall cover.png', 400, 800)
+        provider = CoverImageProvider(self.root)
+        url = cover_url((self.root / 'tall cover.png').as_uri())
+        self.assertEqual(url, 'image://covers/tall%20cover.png')
+        image_id = url.removeprefix('image://covers/')
+
+        first = provider.requestImageResponse(image_id, QSize(196, 196))
+        self.wait(first)
+        self.assertEqual(first.errorString(), '')
+        second = provider.requestImageResponse(image_id, QSize(196, 196))
+        self.wait(second)
+
+        self.assertEqual((provider.cache.misses, provider.cache.hits), (1, 1))
+        self.assertEqual(provider.cache.bytes, 196 * 392 * 4)
+        self.assertEqual(scaled_size(QSize(400, 800), QSize(0, 100)), QSize(50, 100))
+        self.assertIsNone(scaled_size(QSize(100, 100), QSize(196, 196)))
+
+    def test_missing_and_escaping_ids_fail_without_reading_outside_the_root(self):
+        from heirloom.gui.images import CoverImageProvider
+
+        self.cover('secret.png', 10, 10)
+        provider = CoverImageProvider(self.root / 'artwork')
+
+        response = provider.requestImageResponse('../secret.png', QSize(10, 10))
+        self.wait(response)
+
+        self.assertIn('Unable to decode', response.errorString())
+        self.assertEqual(len(provider.cache), 0)
+
+    def test_a_cancelled_and_deleted_response_is_never_delivered_to(self):
+        from shiboken6 import delete
+
+        from heirloom.gui.images import CoverImageProvider
+
+        self.cover('cover.png', 400, 400)
+        provider = CoverImageProvider(self.root)
+        response = provider.requestImageResponse('cover.png', QSize(100, 100))
+        finished = []
+        response.finished.connect(lambda: finished.append(response.errorString()))
+
+        response.cancel()
+        delete(response)
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.005)
+
+        self.assertEqual(finished, ['Cancelled'])
+        self.assertFalse(provider.pending(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+import unittest
+
+try:
+    from PySide6.QtCore import QCoreApplication
+except ModuleNotFoundError:
+    QCoreApplication = None
+
+
+def wait_until(app, predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        app.processEvents()
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@unittest.skipIf(QCoreApplication is None, 'PySide6 is not installed')
+class JobManagerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        from heirloom.gui.jobs import JobManager
+
+        self.manager = JobManager(max_workers=4)
+        self.finished = []
+        self.manager.jobFinished.connect(lambda kind, key, title, status, message: self.finished.append((key, status)))
+
+    def tearDown(self):
+        self.manager.shutdown()
+
+    def test_jobs_for_the_same_game_run_one_at_a_time(self):
+        running = []
+        overlaps = []
+        lock = threading.Lock()
+
+        def work(job):
+            with lock:
+                if job.key in running:
+                    overlaps.append(job.key)
+                running.append(job.key)
+            time.sleep(0.05)
+            with lock:
+                running.remove(job.key)
+
+        self.manager.submit('install', 'uuid-1', 'Install 1', work)
+        self.manager.submit('uninstall', 'uuid-1', 'Uninstall 1', work)
+        self.manager.submit('install', 'uuid-2', 'Install 2', work)
+
+        self.assertTrue(wait_until(self.app, lambda: len(self.finished) == 3))
+        self.assertEqual(overlaps, [])
+        self.assertEqual(self.manager.model.rowCount(), 0)
+
+    def test_cancel_stops_running_job(self):
+        from heirloom.gui.jobs import CANCELLED
+
+        started = threading.Event()
+
+        def work(job):
+            started.set()
+            while True:
+                job.check_cancelled()
+                time.sleep(0.01)
+
+        job = self.manager.submit('install', 'uuid-1', 'Install 1', work)
+        self.assertTrue(started.wait(5))
+        self.manager.cancel(job.id)
+
+        self.assertTrue(wait_until(self.app, lambda: self.finished))
+        self.assertEqual(self.finished, [('uuid-1', CANCELLED)])
+        self.assertFalse(self.manager.has_active('uuid-1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
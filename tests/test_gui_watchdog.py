@@ -0,0 +1,58 @@
+import io
+import os
+import time
+import unittest
+
+try:
+    from PySide6.QtCore import QCoreApplication
+except ModuleNotFoundError:
+    QCoreApplication = None
+
+
+def block_the_event_loop(seconds):
+    time.sleep(seconds)
+
+
+@unittest.skipIf(QCoreApplication is None, 'PySide6 is not installed')
+class StallWatchdogTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def spin(self, seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.005)
+
+    def test_reports_where_the_gui_thread_is_blocked(self):
+        from heirloom.gui.watchdog import StallWatchdog
+
+        stream = io.StringIO()
+        watchdog = StallWatchdog(50, stream=stream)
+        watchdog.start()
+        try:
+            self.spin(0.1)
+            self.assertEqual(watchdog.stalls, [])
+            block_the_event_loop(0.3)
+            self.spin(0.1)
+        finally:
+            watchdog.stop()
+
+        self.assertEqual(len(watchdog.stalls), 1)
+        self.assertIn('block_the_event_loop', watchdog.stalls[0])
+        self.assertIn('GUI thread stall ended after', stream.getvalue())
+
+    def test_threshold_from_arguments_and_environment(self):
+        from heirloom.gui.watchdog import DEFAULT_THRESHOLD_MS, watchdog_threshold
+
+        self.assertIsNone(watchdog_threshold(['heirloom-gui'], {}))
+        self.assertEqual(watchdog_threshold(['heirloom-gui', '--watchdog'], {}), DEFAULT_THRESHOLD_MS)
+        self.assertEqual(watchdog_threshold(['heirloom-gui', '--watchdog=250'], {}), 250)
+        self.assertEqual(watchdog_threshold(['heirloom-gui'], {'HEIRLOOM_WATCHDOG': '40'}), 40)
+        self.assertIsNone(watchdog_threshold(['heirloom-gui'], {'HEIRLOOM_WATCHDOG': '0'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
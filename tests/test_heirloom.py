@@ -0,0 +1,177 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from legacy_api_stub import LegacyApiStub
+
+from heirloom import heirloom as heirloom_module
+from heirloom.heirloom import Heirloom
+
+
+class WineserverSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def client(self, **kwargs):
+        return Heirloom('user', 'password', self.tmpdir.name, wine_runner='native', wine_path='/bin/sh', quiet=True, **kwargs)
+
+    def test_warm_session_starts_one_server_and_stops_it_at_the_end(self):
+        heirloom = self.client(keep_wineserver_warm='true')
+        with mock.patch.object(heirloom_module.subprocess, 'run') as run:
+            with heirloom.wineserver_session():
+                heirloom._ensure_wineserver()
+                heirloom._ensure_wineserver()
+            commands = [call.args[0][-1] for call in run.call_args_list]
+        self.assertEqual(commands, ['-p', '-k'])
+
+    def test_server_stays_up_while_a_launched_game_runs(self):
+        heirloom = self.client(keep_wineserver_warm='true')
+        game = mock.Mock()
+        game.poll.return_value = None
+        with mock.patch.object(heirloom_module.subprocess, 'run') as run, \
+                mock.patch.object(heirloom_module.subprocess, 'Popen', return_value=game):
+            with heirloom.wineserver_session():
+                heirloom.launch_game('C:\\Game\\Game.exe')
+            commands = [call.args[0][-1] for call in run.call_args_list]
+        self.assertEqual(commands, ['-p'])
+
+    def test_sessions_are_a_no_op_unless_enabled(self):
+        heirloom = self.client()
+        with mock.patch.object(heirloom_module.subprocess, 'run') as run:
+            with heirloom.wineserver_session():
+                heirloom._ensure_wineserver()
+        run.assert_not_called()
+
+
+class GamePrefixTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.prefix_dir = Path(self.tmpdir.name) / 'prefixes'
+        self.heirloom = Heirloom(
+            'user', 'password', self.tmpdir.name, wine_path='/bin/sh', quiet=True,
+            per_game_prefixes='true', wine_prefix_dir=str(self.prefix_dir), wine_prefix_clone='copy',
+        )
+
+    def fake_wineboot(self, command, **kwargs):
+        if 'wineboot' in command:
+            prefix = next(part.split('=', 1)[1] for part in command if part.startswith('WINEPREFIX='))
+            Path(prefix, 'system.reg').write_text('registry')
+        return mock.Mock(returncode=0)
+
+    def test_template_prefix_is_built_once_and_cloned_per_game(self):
+        with mock.patch.object(heirloom_module.subprocess, 'run', side_effect=self.fake_wineboot) as run:
+            first = self.heirloom.create_game_prefix('uuid-1')
+            second = self.heirloom.create_game_prefix('uuid-2')
+
+        wineboots = [call for call in run.call_args_list if 'wineboot' in call.args[0]]
+        self.assertEqual(len(wineboots), 1)
+        self.assertEqual(first, self.prefix_dir / 'uuid-1')
+        self.assertTrue((second / 'system.reg').is_file())
+        self.assertEqual(
+            self.heirloom.launch_command('C:\\Game.exe', first),
+            ['env', f'WINEPREFIX={first}', '/bin/sh', 'C:\\Game.exe'],
+        )
+
+    def test_remove_game_prefix_refuses_paths_outside_the_prefix_directory(self):
+        with self.assertRaises(AssertionError):
+            self.heirloom.remove_game_prefix(self.tmpdir.name)
+
+
+
+class DiskSpacePreflightTest(unittest.TestCase):
+    def test_install_stops_before_downloading_when_the_game_cannot_fit(self):
+        from heirloom import diskspace
+        from heirloom.diskspace import InsufficientSpace
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            heirloom = Heirloom('user', 'password', tmpdir, temp_dir=tmpdir, quiet=True, min_free_space='0')
+            heirloom.games = [{'game_name': 'Game', 'installer_uuid': 'uuid-1', 'game_installed_size': '2 GB'}]
+            heirloom.download_game = mock.Mock()
+            usage = mock.Mock(free=3 * 1024 ** 3)
+            with mock.patch.object(diskspace.shutil, 'disk_usage', return_value=usage):
+                with self.assertRaises(InsufficientSpace):
+                    heirloom.install_game('Game', '7zip')
+
+        heirloom.download_game.assert_not_called()
+        self.assertEqual(sum(heirloom._reserved_space.values()), 0)
+
+
+class InstallProgressTest(unittest.TestCase):
+    def test_install_reports_registration_through_the_progress_callback(self):
+        from heirloom.progress import REGISTER
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            heirloom = Heirloom(
+                'user', 'password', str(Path(tmpdir) / 'Games'), temp_dir=tmpdir,
+                wine_runner='native', wine_path='/bin/true', quiet=True, min_free_space='0',
+            )
+            heirloom.games = [{'game_name': 'Game', 'installer_uuid': 'uuid-1', 'game_installed_size': '1 MB'}]
+            (Path(tmpdir) / 'Game_setup.exe').write_bytes(b'installer')
+            heirloom.download_game = mock.Mock(return_value='Game_setup.exe')
+            # The installer is a no-op here, so the game's folder is put in place up front.
+            (Path(tmpdir) / 'Games' / 'Game').mkdir(parents=True)
+            (Path(tmpdir) / 'Games' / 'Game' / 'Game.exe').write_bytes(b'game')
+            events = []
+
+            result = heirloom.install_game('Game', 'wine', progress_callback=events.append)
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(events[-1].phase, REGISTER)
+        self.assertEqual(events[-1].description, 'Game')
+
+
+class OperationHistoryTest(unittest.TestCase):
+    def test_refreshes_and_downloads_are_reported_to_the_recorder(self):
+        operations = []
+        with tempfile.TemporaryDirectory() as tmpdir, LegacyApiStub(installer_bytes=512 * 1024) as stub:
+            heirloom = Heirloom('user', 'password', tmpdir, temp_dir=tmpdir, api_url=stub.url, quiet=True, min_free_space='0')
+            heirloom.operation_recorder = operations.append
+            heirloom.refresh_games_list()
+            heirloom.download_game('Game 1')
+            stub.fail('/products/giveawaydownload', 404, 404, 404, 404)
+            with self.assertRaises(Exception):
+                heirloom.download_game('Game 2')
+
+        self.assertEqual(
+            [(op['kind'], op['name'], op['outcome']) for op in operations],
+            [('refresh', None, 'success'), ('download', 'Game 1', 'success'), ('download', 'Game 2', 'error')],
+        )
+        self.assertEqual(operations[1]['size'], 512 * 1024)
+        self.assertEqual(operations[1]['uuid'], 'game-uuid-1')
+        self.assertGreaterEqual(operations[1]['finished_at'], operations[1]['started_at'])
+
+
+
+class DownloadResumeTest(unittest.TestCase):
+    def test_a_download_that_breaks_off_is_resumed_from_where_it_stopped(self):
+        with tempfile.TemporaryDirectory() as tmpdir, LegacyApiStub(installer_bytes=512 * 1024) as stub:
+            heirloom = Heirloom('user', 'password', tmpdir, temp_dir=tmpdir, api_url=stub.url, quiet=True, min_free_space='0')
+            stub.drop(300 * 1024)
+            filename = heirloom.download_game('Game 1')
+            size = (Path(tmpdir) / filename).stat().st_size
+
+        self.assertEqual(size, 512 * 1024)
+        self.assertEqual(len(stub.ranges), 1)
+        offset = int(stub.ranges[0][1][len('bytes='):-1])
+        self.assertTrue(0 < offset <= 300 * 1024, offset)
+
+    def test_a_download_that_keeps_breaking_off_leaves_no_partial_file(self):
+        from heirloom.transport import BODY_ERRORS
+
+        with tempfile.TemporaryDirectory() as tmpdir, LegacyApiStub(installer_bytes=512 * 1024) as stub:
+            heirloom = Heirloom('user', 'password', tmpdir, temp_dir=tmpdir, api_url=stub.url, quiet=True, min_free_space='0')
+            heirloom.refresh_games_list()
+            stub.drop(*[64 * 1024] * (heirloom_module.DOWNLOAD_RESUME_ATTEMPTS + 1))
+            downloads = Path(tmpdir) / 'downloads'
+            with self.assertRaises(BODY_ERRORS):
+                heirloom.download_game('Game 1', output_dir=downloads)
+            leftovers = list(downloads.iterdir())
+
+        self.assertEqual(leftovers, [])
+        self.assertEqual(len(stub.ranges), heirloom_module.DOWNLOAD_RESUME_ATTEMPTS)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from heirloom.history import estimate_seconds, percentile, summarize_operations
+
+
+def operation(kind, duration, outcome='success', name=None, method=None, size=None):
+    return {
+        'kind': kind,
+        'name': name,
+        'method': method,
+        'duration': duration,
+        'outcome': outcome,
+        'throughput': size / duration if size else None,
+    }
+
+
+MB = 1024 * 1024
+
+
+class HistoryTest(unittest.TestCase):
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([4, 1, 3, 2], 0.5), 2.5)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 0.95), 4.8)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_summary_splits_installs_by_method_and_game(self):
+        operations = [
+            operation('refresh', 2),
+            operation('download', 10, name='A', size=100 * MB),
+            operation('download', 10, name='B', size=300 * MB),
+            operation('download', 1, outcome='cancelled', name='B', size=1 * MB),
+            operation('install', 60, name='A', method='wine'),
+            operation('install', 30, name='B', method='7zip'),
+            operation('install', 5, outcome='fail', name='B', method='7zip'),
+        ]
+
+        summary = summarize_operations(operations)
+
+        self.assertEqual(summary['download']['count'], 2)
+        self.assertEqual(summary['download']['p50'], 20 * MB)
+        self.assertEqual(summary['install']['7zip'], {'count': 1, 'p50': 30, 'p95': 30, 'attempts': 2, 'successes': 1})
+        self.assertEqual(summary['games']['B']['installs'], 2)
+        self.assertEqual(summary['games']['B']['last_outcome'], 'fail')
+        self.assertEqual(summary['games']['B']['download_p50'], 30 * MB)
+
+    def test_estimate_uses_recent_successful_throughput(self):
+        operations = [
+            operation('install', 100, method='wine', size=100 * MB),
+            operation('install', 10, method='7zip', size=100 * MB),
+            operation('install', 1, method='7zip', outcome='fail', size=100 * MB),
+        ]
+
+        self.assertEqual(estimate_seconds(operations, 'install', 50 * MB, '7zip'), 5)
+        self.assertEqual(estimate_seconds(operations, 'install', 50 * MB, 'wine'), 50)
+        self.assertIsNone(estimate_seconds(operations, 'download', 50 * MB))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,50 @@
+import random
 import tempfile
 import unittest
 from pathlib import Path
 
 from heirloom.integrations import (
+    VdfColor,
+    VdfFloat,
+    VdfInt64,
+    VdfPointer,
+    VdfUInt64,
+    VdfWideString,
+    apply_steam_shortcut_changes,
     build_wine_command,
+    read_binary_vdf,
     read_shortcuts,
     steam_shortcut_fields,
+    sync_kde_game_entries,
     write_binary_vdf_object,
 )
 
 
+def random_vdf_value(rng, depth):
+    choice = rng.randrange(9 if depth < 3 else 8)
+    if choice == 0:
+        return ''.join(rng.choice('abcXYZ019 _-/\\éß漢') for _ in range(rng.randrange(40)))
+    if choice == 1:
+        return rng.randrange(-2 ** 31, 2 ** 31)
+    if choice == 2:
+        return VdfFloat(rng.choice([0.0, 1.5, -2.25, 1024.0]))
+    if choice == 3:
+        return VdfPointer(rng.randrange(2 ** 32))
+    if choice == 4:
+        return VdfWideString(''.join(rng.choice('wide文字 ') for _ in range(rng.randrange(12))))
+    if choice == 5:
+        return VdfColor(rng.randrange(2 ** 32))
+    if choice == 6:
+        return VdfUInt64(rng.randrange(2 ** 64))
+    if choice == 7:
+        return VdfInt64(rng.randrange(-2 ** 63, 2 ** 63))
+    return random_vdf_object(rng, depth + 1, rng.randrange(6))
+
+
+def random_vdf_object(rng, depth, size):
+    return {f'key{index}-{rng.randrange(1000)}': random_vdf_value(rng, depth) for index in range(size)}
+
+
 class IntegrationsTest(unittest.TestCase):
     def test_build_wine_command_supports_flatpak_runner(self):
         command = build_wine_command(
@@ -23,6 +58,40 @@ class IntegrationsTest(unittest.TestCase):
 
         self.assertEqual(command, ['flatpak', 'run', 'org.winehq.Wine', 'Z:\\Games\\Game\\Game.exe'])
 
+    def test_build_wine_command_uses_game_prefix(self):
+        native = build_wine_command({'wine_path': '/usr/bin/wine'}, 'Z:\\Game.exe', '/prefixes/uuid-1')
+        flatpak = build_wine_command({'wine_runner': 'flatpak'}, 'Z:\\Game.exe', '/prefixes/uuid-1')
+
+        self.assertEqual(native, ['env', 'WINEPREFIX=/prefixes/uuid-1', '/usr/bin/wine', 'Z:\\Game.exe'])
+        self.assertEqual(
+            flatpak,
+            ['flatpak', 'run', '--env=WINEPREFIX=/prefixes/uuid-1', '--filesystem=/prefixes/uuid-1', 'org.winehq.Wine', 'Z:\\Game.exe'],
+        )
+
+    def test_sync_kde_game_entries_writes_changes_and_removes_stale_entries(self):
+        config = {'wine_runner': 'native', 'wine_path': '/usr/bin/wine'}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            desktop_dir = Path(tmpdir)
+            stale = desktop_dir / 'heirloom-removed-game.desktop'
+            stale.write_text('[Desktop Entry]\nName=Removed Game\nX-HeirloomGame=true\n')
+            unrelated = desktop_dir / 'heirloom-something-else.desktop'
+            unrelated.write_text('[Desktop Entry]\nName=Something Else\n')
+            entries = [
+                {'game_name': 'Kept Game', 'executable': 'Z:\\Games\\Kept\\Kept.exe', 'icon_path': 'file:///tmp/kept.png'},
+                {'game_name': 'New Game', 'executable': 'Z:\\Games\\New\\New.exe'},
+            ]
+
+            first = sync_kde_game_entries(entries, config, desktop_dir=desktop_dir)
+            second = sync_kde_game_entries([dict(entries[0], icon_path=''), entries[1]], config, desktop_dir=desktop_dir)
+
+            self.assertEqual(len(first['written']), 2)
+            self.assertEqual(first['removed'], [stale])
+            self.assertFalse(stale.exists())
+            self.assertTrue(unrelated.exists())
+            self.assertEqual(second['written'], [])
+            self.assertEqual(second['removed'], [])
+            self.assertIn('Icon=/tmp/kept.png', (desktop_dir / 'heirloom-kept-game.desktop').read_text())
+
     def test_steam_shortcut_round_trip_preserves_fields(self):
         shortcut = steam_shortcut_fields(
             'Example Game',
@@ -42,6 +111,168 @@ class IntegrationsTest(unittest.TestCase):
         self.assertEqual(loaded['shortcuts']['0']['Exe'], '/usr/bin/wine')
         self.assertEqual(loaded['shortcuts']['0']['tags']['0'], 'Heirloom')
 
+    def test_binary_vdf_preserves_every_field_type(self):
+        data = {
+            'shortcuts': {
+                '0': {
+                    'AppName': 'Typed',
+                    'appid': -123,
+                    'Scale': VdfFloat(1.5),
+                    'Handle': VdfPointer(0xDEADBEEF),
+                    'Title': VdfWideString('Wide Title'),
+                    'Tint': VdfColor(0xFF00FF00),
+                    'LastPlayTime64': VdfUInt64(2 ** 63 + 5),
+                    'Offset': VdfInt64(-2 ** 40),
+                },
+            }
+        }
+        encoded = write_binary_vdf_object(data)
+        decoded = read_binary_vdf(encoded)
+
+        self.assertEqual(decoded, data)
+        self.assertIsInstance(decoded['shortcuts']['0']['LastPlayTime64'], VdfUInt64)
+        self.assertEqual(write_binary_vdf_object(decoded), encoded)
+
+    def test_binary_vdf_round_trips_random_large_shortcut_files(self):
+        rng = random.Random(1234)
+        for _ in range(25):
+            data = {
+                'shortcuts': {
+                    str(index): random_vdf_object(rng, 1, rng.randrange(1, 16))
+                    for index in range(rng.randrange(50, 400))
+                }
+            }
+            encoded = write_binary_vdf_object(data)
+
+            self.assertEqual(read_binary_vdf(encoded), data)
+            self.assertEqual(write_binary_vdf_object(read_binary_vdf(encoded)), encoded)
+
+    def test_unparseable_shortcuts_are_not_overwritten(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'shortcuts.vdf'
+            path.write_bytes(b'\x00shortcuts\x00\x09broken')
+
+            written = apply_steam_shortcut_changes(
+                upserts=[steam_shortcut_fields('Game', {'wine_path': 'wine'}, 'Z:\\Game.exe')],
+                config_dirs=[tmpdir],
+            )
+
+            self.assertEqual(written, [])
+            self.assertEqual(path.read_bytes(), b'\x00shortcuts\x00\x09broken')
+            self.assertTrue(path.with_suffix('.vdf.heirloom-backup').is_file())
+
+    def test_shortcuts_truncated_at_a_field_boundary_are_not_overwritten(self):
+        config = {'wine_runner': 'native', 'wine_path': '/usr/bin/wine'}
+        encoded = write_binary_vdf_object({
+            'shortcuts': {
+                '0': steam_shortcut_fields('First Game', config, 'Z:\\Games\\First\\First.exe'),
+                '1': steam_shortcut_fields('Second Game', config, 'Z:\\Games\\Second\\Second.exe'),
+            }
+        })
+        # Cut right after the second shortcut's map header, and right before the closing root marker.
+        before_second = encoded[:encoded.index(b'\x001\x00') + 3]
+        for truncated in (before_second, encoded[:-1]):
+            with self.assertRaises(ValueError):
+                read_binary_vdf(truncated)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'shortcuts.vdf'
+            path.write_bytes(before_second)
+
+            written = apply_steam_shortcut_changes(
+                upserts=[steam_shortcut_fields('Third Game', config, 'Z:\\Games\\Third\\Third.exe')],
+                config_dirs=[tmpdir],
+            )
+
+            self.assertEqual(written, [])
+            self.assertEqual(path.read_bytes(), before_second)
+
+    def test_apply_steam_shortcut_changes_upserts_and_removes_in_one_write(self):
+        config = {'wine_runner': 'native', 'wine_path': '/usr/bin/wine'}
+        existing = {
+            'shortcuts': {
+                '0': {'AppName': 'Not Ours', 'Exe': '/usr/bin/foo', 'DevkitGameID': 'other-tool'},
+                '1': steam_shortcut_fields('Old Game', config, 'Z:\\Games\\Old\\Old.exe'),
+                '2': steam_shortcut_fields('Kept Game', config, 'Z:\\Games\\Kept\\Old.exe'),
+            }
+        }
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'shortcuts.vdf'
+            path.write_bytes(write_binary_vdf_object(existing))
+
+            written = apply_steam_shortcut_changes(
+                upserts=[
+                    steam_shortcut_fields('Kept Game', config, 'Z:\\Games\\Kept\\New.exe'),
+                    steam_shortcut_fields('New Game', config, 'Z:\\Games\\New\\New.exe'),
+                ],
+                removals=['Old Game', 'Not Ours'],
+                config_dirs=[tmpdir],
+            )
+            loaded = read_shortcuts(path)
+            leftovers = [p.name for p in Path(tmpdir).iterdir() if p.name != 'shortcuts.vdf']
+
+        self.assertEqual(written, [path])
+        self.assertEqual(leftovers, [])
+        shortcuts = loaded['shortcuts']
+        self.assertEqual(sorted(shortcuts), ['0', '1', '2'])
+        self.assertEqual([s['AppName'] for s in shortcuts.values()], ['Not Ours', 'Kept Game', 'New Game'])
+        self.assertIn('New.exe', shortcuts['1']['LaunchOptions'])
+
+    def test_user_added_shortcuts_are_never_treated_as_managed(self):
+        config = {'wine_runner': 'native', 'wine_path': '/usr/bin/wine'}
+        users_own = {'AppName': 'Game', 'Exe': '/usr/bin/game', 'StartDir': '/usr/bin', 'DevkitGameID': '', 'tags': {}}
+        legacy = dict(steam_shortcut_fields('Legacy Game', config, 'Z:\\Games\\Legacy\\Old.exe'), DevkitGameID='')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'shortcuts.vdf'
+            path.write_bytes(write_binary_vdf_object({'shortcuts': {'0': users_own, '1': legacy}}))
+
+            apply_steam_shortcut_changes(removals=['Game'], config_dirs=[tmpdir])
+            apply_steam_shortcut_changes(
+                upserts=[
+                    steam_shortcut_fields('Game', config, 'Z:\\Games\\Game\\Game.exe'),
+                    steam_shortcut_fields('Legacy Game', config, 'Z:\\Games\\Legacy\\New.exe'),
+                ],
+                config_dirs=[tmpdir],
+            )
+            shortcuts = list(read_shortcuts(path)['shortcuts'].values())
+
+        self.assertEqual([s['AppName'] for s in shortcuts], ['Game', 'Legacy Game', 'Game'])
+        self.assertEqual(shortcuts[0], users_own)
+        self.assertIn('New.exe', shortcuts[1]['LaunchOptions'])
+        self.assertEqual(shortcuts[1]['DevkitGameID'], 'heirloom')
+        self.assertEqual(shortcuts[2]['DevkitGameID'], 'heirloom')
+
+    def test_steam_shortcut_sync_keeps_fields_steam_and_the_user_set(self):
+        config = {'wine_runner': 'native', 'wine_path': '/usr/bin/wine'}
+        customised = dict(
+            steam_shortcut_fields('Game', config, 'Z:\\Games\\Game\\Old.exe'),
+            IsHidden=1,
+            LastPlayTime=1700000000,
+            tags={'0': 'Heirloom', '1': 'Favorites'},
+            sortas='Game, The',
+            FlatpakAppID='',
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'shortcuts.vdf'
+            path.write_bytes(write_binary_vdf_object({'shortcuts': {'0': customised}}))
+
+            written = apply_steam_shortcut_changes(
+                upserts=[steam_shortcut_fields('Game', config, 'Z:\\Games\\Game\\New.exe')],
+                config_dirs=[tmpdir],
+            )
+            shortcut = read_shortcuts(path)['shortcuts']['0']
+            unchanged = apply_steam_shortcut_changes(
+                upserts=[steam_shortcut_fields('Game', config, 'Z:\\Games\\Game\\New.exe')],
+                config_dirs=[tmpdir],
+            )
+
+        self.assertEqual(written, [path])
+        self.assertIn('New.exe', shortcut['LaunchOptions'])
+        self.assertEqual(shortcut['sortas'], 'Game, The')
+        self.assertEqual(shortcut['tags'], {'0': 'Heirloom', '1': 'Favorites'})
+        self.assertEqual((shortcut['IsHidden'], shortcut['LastPlayTime']), (1, 1700000000))
+        self.assertEqual(unchanged, [])
+
 
 if __name__ == '__main__':
     unittest.main()
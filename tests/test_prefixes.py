@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from heirloom.prefixes import CLONE_COPY, CLONE_HARDLINK, clone_tree
+
+
+class ClonePrefixTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.root = Path(tmpdir.name)
+        self.template = self.root / 'template'
+        (self.template / 'drive_c' / 'windows' / 'system32').mkdir(parents=True)
+        (self.template / 'drive_c' / 'users' / 'steamuser').mkdir(parents=True)
+        (self.template / 'dosdevices').mkdir()
+        (self.template / 'system.reg').write_text('registry')
+        (self.template / 'drive_c' / 'windows' / 'system32' / 'kernel32.dll').write_bytes(b'MZ')
+        (self.template / 'drive_c' / 'users' / 'steamuser' / 'settings.ini').write_text('user')
+        os.symlink('../drive_c', self.template / 'dosdevices' / 'c:')
+
+    def test_hardlink_mode_shares_system_files_but_copies_private_ones(self):
+        counts = clone_tree(self.template, self.root / 'game', CLONE_HARDLINK)
+
+        game = self.root / 'game'
+        dll = game / 'drive_c' / 'windows' / 'system32' / 'kernel32.dll'
+        self.assertTrue(os.path.samefile(dll, self.template / 'drive_c' / 'windows' / 'system32' / 'kernel32.dll'))
+        self.assertFalse(os.path.samefile(game / 'system.reg', self.template / 'system.reg'))
+        self.assertFalse(os.path.samefile(
+            game / 'drive_c' / 'users' / 'steamuser' / 'settings.ini',
+            self.template / 'drive_c' / 'users' / 'steamuser' / 'settings.ini',
+        ))
+        self.assertEqual(os.readlink(game / 'dosdevices' / 'c:'), '../drive_c')
+        self.assertEqual(counts, {'reflink': 0, 'hardlink': 1, 'copy': 2})
+
+    def test_copy_mode_produces_independent_files(self):
+        clone_tree(self.template, self.root / 'game', CLONE_COPY)
+
+        (self.root / 'game' / 'system.reg').write_text('changed')
+
+        self.assertEqual((self.template / 'system.reg').read_text(), 'registry')
+
+    def test_invalid_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            clone_tree(self.template, self.root / 'game', 'symlink')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from heirloom.process import RotatingLog, parse_percent, run_streamed
+
+
+def python_command(source):
+    return [sys.executable, '-c', source]
+
+
+class RunStreamedTest(unittest.TestCase):
+    def test_output_is_streamed_to_log_and_only_a_tail_is_kept(self):
+        lines = []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_path = Path(tmpdir) / 'game.log'
+            with RotatingLog(log_path) as log:
+                result = run_streamed(
+                    python_command('import sys\nfor i in range(500): print(f"line {i}")\nprint("oops", file=sys.stderr)'),
+                    log=log,
+                    on_line=lambda stream, line: lines.append((stream, line)),
+                    tail_lines=10,
+                )
+            log_text = log_path.read_text()
+
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout.splitlines(), [f'line {i}' for i in range(490, 500)])
+        self.assertEqual(result.stderr, 'oops')
+        self.assertEqual(len(lines), 501)
+        self.assertIn('line 0\n', log_text)
+        self.assertIn('[stderr] oops\n', log_text)
+
+    def test_seven_zip_progress_redraws_are_split_into_lines(self):
+        percents = []
+        source = 'import sys\nfor p in (0, 42, 100): sys.stdout.write(f"{p:3d}% - file.bin" + "\\b" * 14); sys.stdout.flush()\n'
+        run_streamed(python_command(source), on_line=lambda stream, line: percents.append(parse_percent(line)))
+
+        self.assertEqual(percents, [0, 42, 100])
+
+    def test_should_stop_kills_the_process(self):
+        stop = threading.Event()
+
+        def should_stop():
+            if stop.is_set():
+                raise RuntimeError('stopped')
+            stop.set()
+
+        with self.assertRaises(RuntimeError):
+            run_streamed(python_command('import time\ntime.sleep(30)'), should_stop=should_stop, poll_interval=0.01)
+
+    def test_rotating_log_rolls_over(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_path = Path(tmpdir) / 'game.log'
+            with RotatingLog(log_path, max_bytes=100, backups=2) as log:
+                for index in range(30):
+                    log.write_line(f'line {index:02d}')
+
+            self.assertTrue(log_path.with_name('game.log.1').exists())
+            self.assertTrue(log_path.with_name('game.log.2').exists())
+            self.assertFalse(log_path.with_name('game.log.3').exists())
+            self.assertIn('line 29', log_path.read_text())
+
+
+if __name__ == '__main__':
+    unittest.main()
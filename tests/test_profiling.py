@@ -0,0 +1,63 @@
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from heirloom import profiling
+
+
+@profiling.timed()
+def read_record(index):
+    return index
+
+
+class ProfilingTest(unittest.TestCase):
+    def setUp(self):
+        profiling.reset()
+        profiling.enable()
+        self.addCleanup(profiling.reset)
+        self.addCleanup(profiling.disable)
+
+    def test_spans_nest_and_same_named_siblings_merge(self):
+        with profiling.span('list'):
+            with profiling.span('GET /users/login'):
+                pass
+            for index in range(50):
+                read_record(index)
+
+        rows = [(depth, name, count) for depth, name, count, _ in profiling.report_lines()]
+        self.assertEqual(rows, [(0, 'list', 1), (1, 'GET /users/login', 1), (1, 'read_record', 50)])
+        self.assertIn('read_record', profiling.format_report())
+
+    def test_spans_on_other_threads_are_separate_roots(self):
+        with profiling.span('main'):
+            worker = threading.Thread(target=read_record, args=(1,))
+            worker.start()
+            worker.join()
+
+        self.assertEqual(sorted(span.name for span in profiling.root_spans()), ['main', 'read_record'])
+
+    def test_disabled_spans_record_nothing(self):
+        profiling.disable()
+        with profiling.span('ignored'):
+            read_record(1)
+
+        self.assertEqual(profiling.root_spans(), [])
+
+    def test_trace_is_chrome_trace_json(self):
+        with profiling.span('download', file='game.exe'):
+            read_record(1)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            trace = json.loads(profiling.write_trace(Path(tmpdir) / 'trace.json').read_text())
+
+        events = trace['traceEvents']
+        self.assertEqual([event['name'] for event in events], ['download', 'read_record'])
+        self.assertEqual(events[0]['ph'], 'X')
+        self.assertEqual(events[0]['args'], {'file': 'game.exe'})
+        self.assertLessEqual(events[0]['ts'], events[1]['ts'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from heirloom.progress import DOWNLOAD, ProgressReporter, format_progress, parse_size
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ProgressReporterTest(unittest.TestCase):
+    def test_updates_are_coalesced_to_the_interval(self):
+        clock = FakeClock()
+        events = []
+        reporter = ProgressReporter(events.append, DOWNLOAD, total=1000, interval=0.1, clock=clock)
+
+        for _ in range(100):
+            clock.now += 0.001
+            reporter.advance(10)
+        reporter.finish()
+
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[-1].completed, 1000)
+        self.assertTrue(events[-1].finished)
+
+    def test_events_carry_throughput_and_eta(self):
+        clock = FakeClock()
+        events = []
+        reporter = ProgressReporter(events.append, DOWNLOAD, total=1000, interval=0.1, clock=clock)
+
+        clock.now = 1.0
+        reporter.update(100)
+        clock.now = 2.0
+        reporter.update(200)
+
+        self.assertEqual(events[-1].rate, 100)
+        self.assertEqual(events[-1].smoothed_rate, 100)
+        self.assertEqual(events[-1].eta, 8)
+        self.assertAlmostEqual(events[-1].fraction, 0.2)
+        self.assertIn('left', format_progress(events[-1]))
+
+    def test_parse_size_understands_catalog_sizes(self):
+        self.assertEqual(parse_size('850 MB'), 850 * 1024 ** 2)
+        self.assertEqual(parse_size('1.5GB'), int(1.5 * 1024 ** 3))
+        self.assertEqual(parse_size('1,024 KB'), 1024 ** 2)
+        self.assertEqual(parse_size('unknown'), 0)
+        self.assertEqual(parse_size(None), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from heirloom.transport import build_session, transport_settings
+
+
+class FlakyServer(object):
+    """Answers each path with the queued statuses first, then 200."""
+    def __init__(self, answers=None, delay=0):
+        self.answers = {path: list(statuses) for path, statuses in (answers or {}).items()}
+        self.delay = delay
+        self.hits = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.hits += 1
+                queued = server.answers.get(self.path)
+                status = queued.pop(0) if queued else 200
+                time.sleep(server.delay)
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'ok')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class TransportTest(unittest.TestCase):
+    def test_retries_server_errors_and_rate_limits(self):
+        session, stats = build_session(retries=3, backoff=0.01, backoff_jitter=0.01)
+        with FlakyServer({'/catalog': [503, 429, 502]}) as server:
+            response = session.get(server.url + '/catalog', timeout=5)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.hits, 4)
+        self.assertEqual(stats.snapshot()['retries'], 3)
+        self.assertEqual(stats.snapshot()['rate_limited'], 1)
+
+    def test_returns_the_last_error_once_retries_run_out(self):
+        session, stats = build_session(retries=1, backoff=0)
+        with FlakyServer({'/catalog': [500, 500, 500]}) as server:
+            response = session.get(server.url + '/catalog', timeout=5)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(server.hits, 2)
+
+    def test_pool_size_bounds_parallel_requests(self):
+        session, stats = build_session(pool_size=1)
+        with FlakyServer(delay=0.1) as server:
+            threads = [threading.Thread(target=session.get, args=(server.url,), kwargs={'timeout': 5}) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['requests'], 3)
+        self.assertGreaterEqual(snapshot['pool_waits'], 1)
+        self.assertGreater(snapshot['pool_wait_seconds'], 0)
+
+    def test_settings_come_from_config_strings(self):
+        self.assertEqual(
+            transport_settings({'http_pool_size': '4', 'http_backoff': '0.25', 'http_retries': ''}),
+            {'pool_size': 4, 'backoff': 0.25},
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
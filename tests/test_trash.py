@@ -0,0 +1,63 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from heirloom import trash as trash_module
+from heirloom.trash import TRASH_DIR_NAME, delete_tree, has_trash, move_to_trash, purge_trash_dir, trash_dir
+
+
+class TrashTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.root = Path(tmpdir.name) / 'games'
+        self.outside = Path(tmpdir.name) / 'outside'
+        self.outside.mkdir()
+        (self.outside / 'keep.txt').write_text('keep')
+        game = self.root / 'Game'
+        for index in range(20):
+            directory = game / f'data{index}' / 'nested'
+            directory.mkdir(parents=True)
+            (directory / 'file.bin').write_bytes(b'x' * 100)
+        os.symlink(self.outside, game / 'link-to-outside')
+
+    def test_uninstall_renames_into_trash_and_purge_deletes_it(self):
+        trashed = move_to_trash(self.root / 'Game', self.root)
+
+        self.assertFalse((self.root / 'Game').exists())
+        self.assertEqual(trashed.parent, self.root / TRASH_DIR_NAME)
+        self.assertTrue(has_trash(self.root))
+
+        self.assertTrue(purge_trash_dir(trash_dir(self.root)))
+
+        self.assertFalse(has_trash(self.root))
+        self.assertFalse(trashed.exists())
+        self.assertEqual((self.outside / 'keep.txt').read_text(), 'keep')
+
+    def test_delete_tree_removes_links_without_following_them(self):
+        delete_tree(self.root / 'Game', workers=4)
+
+        self.assertFalse((self.root / 'Game').exists())
+        self.assertTrue((self.outside / 'keep.txt').exists())
+
+    def test_failed_purges_are_reported_and_left_for_the_next_start(self):
+        trashed = move_to_trash(self.root / 'Game', self.root)
+        stderr = io.StringIO()
+
+        with mock.patch.object(trash_module, 'delete_tree', side_effect=PermissionError(13, 'Permission denied')), \
+                contextlib.redirect_stderr(stderr):
+            status = trash_module.main([str(trash_dir(self.root))])
+
+        self.assertEqual(status, 1)
+        self.assertIn(f'Could not delete {trashed}: [Errno 13] Permission denied', stderr.getvalue())
+        self.assertIn('until the next start', stderr.getvalue())
+        self.assertTrue(has_trash(self.root))
+        self.assertTrue(purge_trash_dir(trash_dir(self.root)))
+
+
+if __name__ == '__main__':
+    unittest.main()